@@ -0,0 +1,213 @@
+"""
+Benchmark suite for Walker, on synthetic interactomes
+
+For each network size, a synthetic network is generated (see synthetic.py),
+and each engine is timed on:
+
+    build          : building the Walker matrices from the HIPPIE-style
+                     edge list
+    build_weighted : the same, from the 3-column weighted edge list
+    single_seed    : one walk from a single-node seed
+    multi_seed     : one walk from a 20-node seed
+    tissue_build   : building the matrices with a low list
+    tissue         : one tissue-specific walk (with the low list)
+    all_pairs      : walks from a sample of single-node seeds (the time per
+                     seed is also reported, to extrapolate to every node)
+
+along with the peak memory of the benchmark process so far. Networks are
+benchmarked from smallest to largest, so this is roughly the peak for the
+current size.
+
+The engines are 'dense' (the default Walker matrices), 'sparse' (Walker with
+sparse=True), and 'batched' (sparse, with the all-pairs seeds solved together
+by Walker.run_batch). Dense runs are skipped above --max_dense nodes.
+
+Results are written as JSON (labelled with the current git commit, if any),
+and two results files can be compared with --compare:
+
+    python run_benchmarks.py [-s 1000 5000 ...] [-o results.json]
+    python run_benchmarks.py --compare old.json new.json
+
+Everything runs offline.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+
+# Walker lives in the top-level directory of the repo
+REPO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.append(REPO_DIR)
+from walker import Walker
+import synthetic
+
+ENGINES = ('dense', 'sparse', 'batched')
+DEFAULT_SIZES = (1000, 5000, 10000, 20000, 50000)
+RESTART_PROB = 0.7
+OG_PROB = 0.1
+
+def git_commit():
+    """ Return the current commit of the repo, or None outside git. """
+    try:
+        with open(os.devnull, 'w') as devnull:
+            return subprocess.check_output(['git', 'rev-parse', 'HEAD'],
+                                           cwd=REPO_DIR,
+                                           stderr=devnull).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def timed(func, repeat):
+    """ Run func repeat times, and return the best wall time (in seconds)
+    and the last return value.
+    """
+    best = None
+    for _ in xrange(repeat):
+        start = time.time()
+        result = func()
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def read_seed(seed_file):
+    with open(seed_file, 'r') as fp:
+        return fp.read().split()
+
+def bench_engine(engine, files, opts):
+    """ Time every benchmark for one engine on one network. """
+    sparse = engine != 'dense'
+    results = {}
+
+    results['build_weighted'], _ = timed(
+            lambda: Walker(files['weighted'], None, sparse=sparse),
+            opts.repeat)
+    results['build'], wk = timed(
+            lambda: Walker(files['hippie'], None, sparse=sparse), opts.repeat)
+    single, _, multi = [read_seed(f) for f in files['seeds']]
+    results['single_seed'], _ = timed(
+            lambda: wk.solve(single, RESTART_PROB, OG_PROB), opts.repeat)
+    results['multi_seed'], _ = timed(
+            lambda: wk.solve(multi, RESTART_PROB, OG_PROB), opts.repeat)
+
+    tissue_build, tissue_wk = timed(
+            lambda: Walker(files['hippie'], files['low_list'], sparse=sparse),
+            1)
+    results['tissue_build'] = tissue_build
+    results['tissue'], _ = timed(
+            lambda: tissue_wk.solve(multi, RESTART_PROB, OG_PROB),
+            opts.repeat)
+
+    seeds = [[node] for node in wk.nodes[:opts.all_pairs_seeds]]
+    if engine == 'batched':
+        all_pairs = lambda: wk.run_batch(seeds, RESTART_PROB, OG_PROB)
+    else:
+        all_pairs = lambda: [wk.solve(seed, RESTART_PROB, OG_PROB)
+                             for seed in seeds]
+    results['all_pairs'], _ = timed(all_pairs, 1)
+    results['all_pairs_per_seed'] = results['all_pairs'] / len(seeds)
+    results['all_pairs_estimate'] = (results['all_pairs_per_seed'] *
+                                     len(wk.nodes))
+    results['peak_memory'] = wk.metrics.peak_memory()
+    return results
+
+def run(opts):
+    data_dir = tempfile.mkdtemp()
+    report = {
+        'commit': git_commit(),
+        'time': time.time(),
+        'python': platform.python_version(),
+        'machine': platform.platform(),
+        'all_pairs_seeds': opts.all_pairs_seeds,
+        'results': {},
+    }
+
+    try:
+        for size in opts.sizes:
+            files = synthetic.generate(data_dir, size, opts.random_seed)
+            report['results'][str(size)] = {}
+            for engine in opts.engines:
+                if engine == 'dense' and size > opts.max_dense:
+                    continue
+                sys.stderr.write('{} nodes, {} engine\n'.format(size, engine))
+                report['results'][str(size)][engine] = bench_engine(
+                        engine, files, opts)
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    with open(opts.output, 'w') as fp:
+        json.dump(report, fp, indent=2, sort_keys=True)
+        fp.write('\n')
+    print_report(report)
+
+def print_report(report):
+    for size in sorted(report['results'], key=int):
+        for engine, results in sorted(report['results'][size].items()):
+            print '{}\t{}\t{}'.format(size, engine, '\t'.join(
+                  '{}={:.4f}'.format(name, results[name])
+                  for name in sorted(results) if name != 'peak_memory'))
+
+def compare(old_file, new_file):
+    """ Print the new/old time ratio of every benchmark in both files. """
+    with open(old_file, 'r') as fp:
+        old = json.load(fp)
+    with open(new_file, 'r') as fp:
+        new = json.load(fp)
+
+    print 'old: {}\nnew: {}'.format(old['commit'], new['commit'])
+    print 'size\tengine\tbenchmark\told\tnew\tnew/old'
+    for size in sorted(set(old['results']) & set(new['results']), key=int):
+        engines = set(old['results'][size]) & set(new['results'][size])
+        for engine in sorted(engines):
+            old_results = old['results'][size][engine]
+            new_results = new['results'][size][engine]
+            for name in sorted(set(old_results) & set(new_results)):
+                if name == 'peak_memory' or not old_results[name]:
+                    continue
+                print '{}\t{}\t{}\t{:.4f}\t{:.4f}\t{:.2f}'.format(
+                      size, engine, name, old_results[name],
+                      new_results[name], new_results[name] / old_results[name])
+
+def main(argv):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-s', '--sizes', type=int, nargs='+',
+                        default=list(DEFAULT_SIZES),
+                        help='Network sizes (number of nodes) to benchmark')
+    parser.add_argument('-e', '--engines', nargs='+', choices=ENGINES,
+                        default=list(ENGINES), help='Engines to benchmark')
+    parser.add_argument('-o', '--output', default=None,
+                        help='Results file (defaults to\
+                              benchmarks/results/<commit>.json)')
+    parser.add_argument('--max_dense', type=int, default=10000,
+                        help='Largest network to run the dense engine on')
+    parser.add_argument('--all_pairs_seeds', type=int, default=200,
+                        help='Number of single-node seeds in the all-pairs\
+                              benchmark')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Number of times to repeat each timing (the\
+                              best time is reported)')
+    parser.add_argument('--random_seed', type=int, default=0,
+                        help='Random seed for the synthetic networks')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'),
+                        help='Compare two results files, instead of running\
+                              the benchmarks')
+    opts = parser.parse_args()
+
+    if opts.compare:
+        compare(*opts.compare)
+        return
+
+    if opts.output is None:
+        results_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                   'results')
+        if not os.path.isdir(results_dir):
+            os.makedirs(results_dir)
+        opts.output = os.path.join(results_dir, '{}.json'.format(
+                                   git_commit() or 'results'))
+    run(opts)
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,133 @@
+"""
+Startup benchmark for run_walker.py
+
+When run_walker.py is called once per seed from a shell loop, the cost of
+starting Python and importing modules dominates on small graphs. This
+benchmark generates a small synthetic network (see synthetic.py), compiles
+it into a graph cache, and then times run_walker.py from launch to its first
+line of output, as a shell loop would see it. The time to start Python and
+import numpy, which no run can avoid, is timed too, and the difference is
+the startup overhead of run_walker.py itself.
+
+It also lists the modules run_walker.py imports. The budget file
+(startup_budget.json, by default) sets the largest allowed overhead, and
+the modules that must not be imported on this path (e.g. sklearn). The
+benchmark exits with status 1 if either is exceeded, so it can guard
+against startup regressions:
+
+    python startup.py [-b <budget.json>] [-o <results.json>]
+
+Everything runs offline.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+import synthetic
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.join(BENCHMARK_DIR, '..')
+DEFAULT_BUDGET = os.path.join(BENCHMARK_DIR, 'startup_budget.json')
+
+def time_to_first_line(command, repeat):
+    """ Run command repeat times, and return the best time (in seconds)
+    from launching it to reading the first line of its output.
+    """
+    best = None
+    with open(os.devnull, 'w') as devnull:
+        for _ in xrange(repeat):
+            start = time.time()
+            process = subprocess.Popen(command, stdout=subprocess.PIPE,
+                                       stderr=devnull)
+            line = process.stdout.readline()
+            elapsed = time.time() - start
+            process.communicate()
+            if not line or process.returncode:
+                sys.exit('Command failed: {}'.format(' '.join(command)))
+            best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def imported_modules():
+    """ Return the modules imported by importing run_walker. """
+    script = ('import sys; sys.path.insert(0, {!r}); import run_walker; '
+              'print "\\n".join(sorted(sys.modules))'.format(REPO_DIR))
+    output = subprocess.check_output([sys.executable, '-c', script])
+    return output.split()
+
+def read_budget(budget_file):
+    try:
+        with open(budget_file, 'r') as fp:
+            return json.load(fp)
+    except (IOError, ValueError):
+        sys.exit('Could not read budget file: {}'.format(budget_file))
+
+def run(opts):
+    budget = read_budget(opts.budget)
+    data_dir = tempfile.mkdtemp()
+    try:
+        files = synthetic.generate(data_dir, opts.size, opts.random_seed)
+        cache_dir = os.path.join(data_dir, 'cache')
+        command = [sys.executable, os.path.join(REPO_DIR, 'run_walker.py'),
+                   files['weighted'], files['seeds'][0], '-c', cache_dir,
+                   '-k', '10']
+        # the first run compiles the graph into the cache
+        with open(os.devnull, 'w') as devnull:
+            subprocess.check_call(command, stdout=devnull)
+
+        floor = time_to_first_line(
+                [sys.executable, '-c', 'import numpy; print 1'], opts.repeat)
+        first_output = time_to_first_line(command, opts.repeat)
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    modules = imported_modules()
+    forbidden = sorted(module for module in modules
+                       for prefix in budget['forbidden_modules']
+                       if module == prefix or module.startswith(prefix + '.'))
+    report = {
+        'time': time.time(),
+        'size': opts.size,
+        'numpy_startup': floor,
+        'first_output': first_output,
+        'overhead': first_output - floor,
+        'budget': budget['max_overhead'],
+        'forbidden_imports': forbidden,
+    }
+    if opts.output:
+        with open(opts.output, 'w') as fp:
+            json.dump(report, fp, indent=2, sort_keys=True)
+            fp.write('\n')
+
+    print 'numpy startup\t{:.4f}'.format(floor)
+    print 'first output\t{:.4f}'.format(first_output)
+    print 'overhead\t{:.4f}\t(budget {:.4f})'.format(report['overhead'],
+                                                     budget['max_overhead'])
+    if forbidden:
+        print 'forbidden imports\t{}'.format(', '.join(forbidden))
+    return report['overhead'] <= budget['max_overhead'] and not forbidden
+
+def main(argv):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-b', '--budget', default=DEFAULT_BUDGET,
+                        help='Budget file (JSON)')
+    parser.add_argument('-o', '--output', default=None,
+                        help='<Optional> Results file')
+    parser.add_argument('-s', '--size', type=int, default=500,
+                        help='Number of nodes in the synthetic network')
+    parser.add_argument('--repeat', type=int, default=10,
+                        help='Number of times to repeat each timing (the\
+                              best time is reported)')
+    parser.add_argument('--random_seed', type=int, default=0,
+                        help='Random seed for the synthetic network')
+    opts = parser.parse_args()
+
+    if not run(opts):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main(sys.argv)
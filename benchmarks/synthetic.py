@@ -0,0 +1,104 @@
+"""
+Generate synthetic PPI-like networks, low lists and seed sets for benchmarks
+
+Networks are scale-free (Barabasi-Albert preferential attachment), and are
+written either in HIPPIE-style 5-column format or as a weighted 3-column
+edge list, so both of Walker's weighted input formats are exercised. All
+output is deterministic for a given random seed.
+
+    python synthetic.py <output dir> <number of nodes> [<random seed>]
+
+"""
+import os
+import sys
+import numpy as np
+
+# edges added for each new node by preferential attachment
+EDGES_PER_NODE = 4
+# fraction of nodes marked as unexpressed (NA) in low lists
+LOW_FRACTION = 0.2
+
+def scale_free_edges(num_nodes, edges_per_node, rng):
+    """ Return a (number of edges) x 2 array of node indices, for a
+    Barabasi-Albert graph on num_nodes nodes.
+    """
+    edges = []
+    # every endpoint of every edge so far, so sampling uniformly from this
+    # list samples nodes proportionally to their degree
+    endpoints = list(xrange(edges_per_node))
+    for node in xrange(edges_per_node, num_nodes):
+        targets = set()
+        while len(targets) < edges_per_node:
+            targets.add(endpoints[rng.randint(len(endpoints))])
+        for target in targets:
+            edges.append((node, target))
+            endpoints.extend((node, target))
+    return np.array(edges)
+
+def write_network(filename, edges, weights, fmt):
+    """ Write edges in 'hippie' (5-column) or 'weighted' (3-column) format,
+    with node IDs offset so they look like Entrez gene IDs.
+    """
+    lines = []
+    for (u, v), weight in zip(edges + 1000, weights):
+        if fmt == 'hippie':
+            lines.append('P{0}_HUMAN\t{0}\tP{1}_HUMAN\t{1}\t{2:.2f}\n'.format(
+                         u, v, weight))
+        else:
+            lines.append('{}\t{}\t{:.2f}\n'.format(u, v, weight))
+    with open(filename, 'w') as fp:
+        fp.write(''.join(lines))
+
+def write_low_list(filename, num_nodes, rng):
+    """ Write a low list marking LOW_FRACTION of the nodes as unexpressed. """
+    low = rng.random_sample(num_nodes) < LOW_FRACTION
+    expression = rng.random_sample(num_nodes) * 10
+    with open(filename, 'w') as fp:
+        fp.write(''.join('{}\t{}\n'.format(node + 1000, 'NA' if is_low else
+                                           '{:.2f}'.format(value))
+                         for node, (is_low, value)
+                         in enumerate(zip(low, expression))))
+
+def write_seed(filename, nodes):
+    with open(filename, 'w') as fp:
+        fp.write(''.join('{}\n'.format(node + 1000) for node in nodes))
+
+def generate(output_dir, num_nodes, random_seed=0):
+    """ Write a network in both formats, a low list and seed sets of 1, 5
+    and 20 nodes to output_dir, and return their file names.
+    """
+    rng = np.random.RandomState(random_seed)
+    if not os.path.isdir(output_dir):
+        os.makedirs(output_dir)
+
+    edges = scale_free_edges(num_nodes, EDGES_PER_NODE, rng)
+    weights = rng.uniform(0.1, 1.0, len(edges))
+    prefix = os.path.join(output_dir, 'synthetic_{}'.format(num_nodes))
+    files = {
+        'hippie': prefix + '.hippie.ppi',
+        'weighted': prefix + '.weighted.ppi',
+        'low_list': prefix + '.low.txt',
+        'seeds': [],
+    }
+    write_network(files['hippie'], edges, weights, 'hippie')
+    write_network(files['weighted'], edges, weights, 'weighted')
+    write_low_list(files['low_list'], num_nodes, rng)
+    for size in (1, 5, 20):
+        seed_file = '{}.seed_{}.txt'.format(prefix, size)
+        write_seed(seed_file, rng.choice(num_nodes, size, replace=False))
+        files['seeds'].append(seed_file)
+    return files
+
+def main(argv):
+    if len(argv) < 3:
+        sys.exit('python {} <output dir> <number of nodes> '
+                 '[<random seed>]'.format(argv[0]))
+    random_seed = int(argv[3]) if len(argv) > 3 else 0
+    files = generate(argv[1], int(argv[2]), random_seed)
+    for name in ('hippie', 'weighted', 'low_list'):
+        print files[name]
+    for seed_file in files['seeds']:
+        print seed_file
+
+if __name__ == '__main__':
+    main(sys.argv)
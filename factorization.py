@@ -0,0 +1,172 @@
+"""
+LU factorization of the RWR linear system, for direct (non-iterative) solves
+
+"""
+import sys
+import numpy as np
+import scipy.linalg as la
+import scipy.sparse as sp
+from scipy.sparse.linalg import splu
+from solvers import triangular_solver
+
+# the column ordering SuperLU uses for sparse factorizations, by default. The
+# system matrix has a symmetric pattern and is column diagonally dominant, so
+# it can be ordered symmetrically (on A + A^T) and factorized without
+# pivoting, which fills in far less than SuperLU's own default (COLAMD with
+# partial pivoting)
+PERMC_SPEC = 'MMD_AT_PLUS_A'
+
+# orderings that permute rows and columns alike, so the diagonal stays on the
+# diagonal and needs no pivoting
+SYMMETRIC_ORDERINGS = ('MMD_AT_PLUS_A', 'NATURAL')
+
+# a warning is written when the factors have more than this many times the
+# nonzeros of the system matrix, since each solve then costs more than the
+# few tens of matrix products an iterative solver needs
+MAX_FILL = 25
+
+class Factorization:
+    """ Cached LU factorization of the matrix (I - (1 - r)W).
+
+    At convergence, the RWR probability vector is the solution of the linear
+    system (I - (1 - r)W) p = r * p_0, where W is the (og_prob-weighted)
+    transition matrix. Factorizing the left hand side once means every seed
+    set afterwards costs only a pair of triangular solves.
+
+    Attributes:
+    -----------
+        restart_prob (float) : The restart probability r the system was built
+                               with
+        og_prob (float)      : The original graph probability the system was
+                               built with
+        nodes (list)         : The node order of the matrix rows/columns
+        checksum (float)     : Sum of the absolute values of the system matrix,
+                               used to detect a factorization of a different
+                               graph with the same nodes
+    """
+
+    def __init__(self, restart_prob, og_prob, nodes, checksum,
+                 lu=None, piv=None, L=None, U=None, perm_r=None, perm_c=None):
+        self.restart_prob = restart_prob
+        self.og_prob = og_prob
+        self.nodes = list(nodes)
+        self.checksum = checksum
+        # dense factorization, as returned by scipy.linalg.lu_factor
+        self.lu = lu
+        self.piv = piv
+        # sparse factorization, as computed by scipy.sparse.linalg.splu:
+        # Pr * A * Pc = L * U
+        self.L = L
+        self.U = U
+        self.perm_r = perm_r
+        self.perm_c = perm_c
+        # the SuperLU object is only available for a fresh factorization
+        # (it can't be written to disk), but solves much faster. A loaded
+        # factorization gets compiled solvers for L and U instead (see load)
+        self._superlu = None
+        self._triangular = None
+
+    @classmethod
+    def factorize(cls, matrix, restart_prob, og_prob, nodes,
+                  permc_spec=None):
+        """ Factorize the system matrix, which may be dense or sparse.
+
+        A sparse matrix is factorized by SuperLU, with the column ordering
+        permc_spec (PERMC_SPEC by default; see scipy.sparse.linalg.splu).
+        A warning is written to stderr if the factors fill in more than
+        MAX_FILL times.
+        """
+        checksum = float(abs(matrix).sum())
+        if sp.issparse(matrix):
+            if permc_spec is None:
+                permc_spec = PERMC_SPEC
+            matrix = sp.csc_matrix(matrix)
+            if permc_spec in SYMMETRIC_ORDERINGS:
+                superlu = splu(matrix, permc_spec=permc_spec,
+                               diag_pivot_thresh=0)
+            else:
+                superlu = splu(matrix, permc_spec=permc_spec)
+
+            fill = float(superlu.L.nnz + superlu.U.nnz) / max(matrix.nnz, 1)
+            if fill > MAX_FILL:
+                sys.stderr.write('The LU factors have {:.0f} times as many '
+                                 'nonzeros as the system matrix; an '
+                                 'iterative solver is likely to be faster.\n'
+                                 .format(fill))
+            factorization = cls(restart_prob, og_prob, nodes, checksum,
+                                L=superlu.L.tocsr(), U=superlu.U.tocsr(),
+                                perm_r=superlu.perm_r, perm_c=superlu.perm_c)
+            factorization._superlu = superlu
+        else:
+            lu, piv = la.lu_factor(np.asarray(matrix))
+            factorization = cls(restart_prob, og_prob, nodes, checksum,
+                                lu=lu, piv=piv)
+        return factorization
+
+    def solve(self, b):
+        """ Solve the factorized system for b (a vector or a matrix). """
+        if self.lu is not None:
+            return la.lu_solve((self.lu, self.piv), b)
+        if self._superlu is not None:
+            return self._superlu.solve(b)
+
+        # otherwise, solve with the stored triangular factors
+        solve_l, solve_u = self._triangular
+        y = np.empty_like(b, dtype=np.float64)
+        y[self.perm_r] = b
+        z = solve_u(solve_l(y))
+        return z[self.perm_c]
+
+    def save(self, filename):
+        """ Write the factorization to disk, in numpy .npz format. """
+        arrays = {
+            'params': np.array([self.restart_prob, self.og_prob,
+                                self.checksum]),
+            'nodes': np.array([str(n) for n in self.nodes]),
+        }
+        if self.lu is not None:
+            arrays['lu'] = self.lu
+            arrays['piv'] = self.piv
+        else:
+            for name, factor in (('L', self.L), ('U', self.U)):
+                arrays[name + '_data'] = factor.data
+                arrays[name + '_indices'] = factor.indices
+                arrays[name + '_indptr'] = factor.indptr
+            arrays['shape'] = np.array(self.L.shape)
+            arrays['perm_r'] = self.perm_r
+            arrays['perm_c'] = self.perm_c
+
+        try:
+            fp = open(filename, 'wb')
+        except IOError:
+            sys.exit("Could not open file: {}".format(filename))
+        np.savez(fp, **arrays)
+        fp.close()
+
+    @classmethod
+    def load(cls, filename):
+        """ Read a factorization written by save. """
+        try:
+            data = np.load(filename)
+        except IOError:
+            sys.exit("Could not open file: {}".format(filename))
+
+        restart_prob, og_prob, checksum = data['params'].tolist()
+        nodes = data['nodes'].tolist()
+        if 'lu' in data.files:
+            return cls(restart_prob, og_prob, nodes, checksum,
+                       lu=data['lu'], piv=data['piv'])
+
+        shape = tuple(data['shape'])
+        factors = [sp.csr_matrix((data[name + '_data'],
+                                  data[name + '_indices'],
+                                  data[name + '_indptr']), shape=shape)
+                   for name in ('L', 'U')]
+        factorization = cls(restart_prob, og_prob, nodes, checksum,
+                            L=factors[0], U=factors[1],
+                            perm_r=data['perm_r'], perm_c=data['perm_c'])
+        # the SuperLU object can't be stored, so refactorize the triangular
+        # factors (without fill-in) for compiled solves
+        factorization._triangular = (triangular_solver(factors[0]),
+                                     triangular_solver(factors[1]))
+        return factorization
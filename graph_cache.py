@@ -0,0 +1,202 @@
+"""
+On-disk cache of compiled graphs (node order and normalized matrices)
+
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import numpy as np
+import scipy.sparse as sp
+
+# bump this whenever the layout of a cache entry, or the way the matrices are
+# built, changes - entries written with a different version are rebuilt
+CACHE_VERSION = 4
+
+# default upper bound on the total size of the cache directory (10 GB)
+DEFAULT_MAX_BYTES = 10 * 1024 ** 3
+
+def input_digest(original_ppi, low_list, remove_nodes):
+    """ Hash the contents of the inputs a graph is built from (the input
+    graph, the low list and the removed nodes), e.g. to check that a result
+    store was computed on the same graph as a Walker.
+    """
+    digest = hashlib.sha1()
+    for filename in (original_ppi, low_list):
+        digest.update('file:\n')
+        if filename:
+            _hash_file(digest, filename)
+    digest.update('remove:{}\n'.format('\t'.join(sorted(remove_nodes))))
+    return digest.hexdigest()
+
+def changes_digest(base_digest, changes):
+    """ Hash the graph made by applying edge changes, i.e. (node, node,
+    weight) triples, to the graph with digest base_digest.
+    """
+    digest = hashlib.sha1()
+    digest.update('base:{}\n'.format(base_digest))
+    for node_a, node_b, weight in changes:
+        digest.update('{}\t{}\t{!r}\n'.format(node_a, node_b, weight))
+    return digest.hexdigest()
+
+def _hash_file(digest, filename):
+    try:
+        fp = open(filename, 'rb')
+    except IOError:
+        sys.exit("Could not open file: {}".format(filename))
+    for chunk in iter(lambda: fp.read(1 << 20), b''):
+        digest.update(chunk)
+    fp.close()
+
+class GraphCache:
+    """ Directory of compiled graphs, keyed by the content of their inputs.
+
+    Each entry is a subdirectory named by the key, holding the node order
+    (i.e. the LCC, after any node removal), the weighted degree of each node,
+    and the column-normalized original and tissue-specific matrices as .npy
+    files, which are memory-mapped when
+    loaded. Dense matrices are stored as a single array, sparse (CSC)
+    matrices as their data, indices and indptr arrays, in the dtype they
+    were built with (which is part of the key).
+
+    Since keys are hashes of the input file contents, an edited input file
+    simply misses the cache. Entries with a different CACHE_VERSION, or with
+    missing files, are treated as stale and removed. Once the directory grows
+    past max_bytes, the least recently used entries are evicted.
+
+    Attributes:
+    -----------
+        cache_dir (str) : The cache directory
+        max_bytes (int) : Upper bound on the total size of all entries
+    """
+
+    def __init__(self, cache_dir, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        if not os.path.isdir(cache_dir):
+            try:
+                os.makedirs(cache_dir)
+            except OSError:
+                sys.exit("Could not create cache directory: {}".format(
+                         cache_dir))
+
+    def key(self, original_ppi, low_list, remove_nodes, sparse,
+            dtype=np.float64):
+        """ Hash the inputs that determine a compiled graph: their
+        input_digest (so an entry is used exactly when a result store of the
+        same inputs would be), and how the graph is compiled.
+        """
+        digest = hashlib.sha1()
+        digest.update('version:{}\n'.format(CACHE_VERSION))
+        digest.update('sparse:{}\n'.format(bool(sparse)))
+        digest.update('dtype:{}\n'.format(np.dtype(dtype).name))
+        digest.update('inputs:{}\n'.format(
+                      input_digest(original_ppi, low_list, remove_nodes)))
+        return digest.hexdigest()
+
+    def load(self, key):
+        """ Load a cache entry, returning (nodes, og_matrix, tsg_matrix,
+        degrees), or None if there is no usable entry for key.
+        """
+        entry_dir = os.path.join(self.cache_dir, key)
+        if not os.path.isdir(entry_dir):
+            return None
+
+        try:
+            with open(os.path.join(entry_dir, 'meta.json'), 'r') as fp:
+                meta = json.load(fp)
+            if meta['version'] != CACHE_VERSION:
+                raise ValueError('stale cache entry')
+            nodes = np.load(os.path.join(entry_dir, 'nodes.npy')).tolist()
+            degrees = np.load(os.path.join(entry_dir, 'degrees.npy'))
+            og_matrix = self._load_matrix(entry_dir, 'og', meta)
+            tsg_matrix = None
+            if meta['has_tsg']:
+                tsg_matrix = self._load_matrix(entry_dir, 'tsg', meta)
+        except (IOError, ValueError, KeyError):
+            # stale or partially written entry, so throw it away
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            return None
+
+        # mark the entry as recently used, for eviction
+        os.utime(entry_dir, None)
+        return nodes, og_matrix, tsg_matrix, degrees
+
+    def store(self, key, nodes, og_matrix, tsg_matrix, degrees):
+        """ Write a cache entry, then evict old entries if necessary. """
+        # write to a temporary directory, then rename it into place, so
+        # concurrent runs never see a partially written entry
+        entry_dir = os.path.join(self.cache_dir, key)
+        tmp_dir = '{}.tmp.{}'.format(entry_dir, os.getpid())
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+
+        meta = {
+            'version': CACHE_VERSION,
+            'sparse': sp.issparse(og_matrix),
+            'shape': list(og_matrix.shape),
+            'has_tsg': tsg_matrix is not None,
+            'created': time.time(),
+        }
+        np.save(os.path.join(tmp_dir, 'nodes.npy'),
+                np.array([str(n) for n in nodes]))
+        np.save(os.path.join(tmp_dir, 'degrees.npy'), degrees)
+        self._save_matrix(tmp_dir, 'og', og_matrix)
+        if tsg_matrix is not None:
+            self._save_matrix(tmp_dir, 'tsg', tsg_matrix)
+        with open(os.path.join(tmp_dir, 'meta.json'), 'w') as fp:
+            json.dump(meta, fp)
+
+        try:
+            os.rename(tmp_dir, entry_dir)
+        except OSError:
+            # another process stored the same entry first
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+        self.evict()
+
+    def evict(self):
+        """ Remove least recently used entries until the cache fits in
+        max_bytes. The most recently used entry is always kept.
+        """
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            entry_dir = os.path.join(self.cache_dir, name)
+            if not os.path.isdir(entry_dir) or '.tmp.' in name:
+                continue
+            entries.append((os.path.getmtime(entry_dir),
+                            self._entry_size(entry_dir), entry_dir))
+
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry_dir in entries[:-1]:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            total -= size
+
+    def _save_matrix(self, entry_dir, name, matrix):
+        if sp.issparse(matrix):
+            matrix = sp.csc_matrix(matrix)
+            for part in ('data', 'indices', 'indptr'):
+                np.save(os.path.join(entry_dir, '{}_{}.npy'.format(name, part)),
+                        getattr(matrix, part))
+        else:
+            np.save(os.path.join(entry_dir, name + '.npy'), np.asarray(matrix))
+
+    def _load_matrix(self, entry_dir, name, meta):
+        if meta['sparse']:
+            parts = [np.load(os.path.join(entry_dir,
+                                          '{}_{}.npy'.format(name, part)),
+                             mmap_mode='r')
+                     for part in ('data', 'indices', 'indptr')]
+            return sp.csc_matrix(tuple(parts), shape=tuple(meta['shape']),
+                                 copy=False)
+        return np.load(os.path.join(entry_dir, name + '.npy'), mmap_mode='r')
+
+    def _entry_size(self, entry_dir):
+        return sum(os.path.getsize(os.path.join(entry_dir, f))
+                   for f in os.listdir(entry_dir))
+
@@ -0,0 +1,286 @@
+"""
+Streaming loader for network files, straight into sparse adjacency matrices
+
+"""
+import sys
+from itertools import chain, count, imap, izip
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.csgraph import connected_components
+
+# the network file is parsed this many bytes (rounded up to whole lines) at a
+# time, so the file is never held in memory
+CHUNK_BYTES = 1 << 22
+
+# the characters str.rstrip strips from the end of a line
+TRAILING = np.frombuffer(' \t\n\r\x0b\x0c', dtype=np.uint8)
+
+def read_edges(filename):
+    """ Read a network file into integer-indexed edge arrays.
+
+    Each line of the file is an edge, in one of three formats (detected line
+    by line):
+
+        HIPPIE (more than 3 tab-separated columns) : the node IDs are in
+                                                     columns 2 and 4, and the
+                                                     weight is in column 5
+        weighted edge list (3 columns)             : node, node, weight
+        edge list (2 columns)                      : node, node (weight 1)
+
+    Nodes are in the order the networkx graph this loader replaced listed
+    them: the iteration order of a dict of the nodes, inserted in the order
+    they first appear. The graph is undirected, so an edge listed more than
+    once (in either direction) keeps the weight of its last listing.
+
+    Returns:
+    --------
+        The list of nodes, and arrays of the row index, column index and
+        weight of each distinct edge (with row index <= column index).
+    """
+    try:
+        graph_fp = open(filename, 'r')
+    except IOError:
+        sys.exit("Could not open file: {}".format(filename))
+
+    # each token is given the next number of counter when its node is first
+    # seen, so node ids increase in order of first appearance, with gaps
+    node_index = {}
+    counter = count()
+    ids = []
+    weights = []
+
+    rest = ''
+    while True:
+        chunk = graph_fp.read(CHUNK_BYTES)
+        if chunk:
+            # parse whole lines, and carry the last partial line over
+            text, newline, rest = (rest + chunk).rpartition('\n')
+            text += newline
+        elif rest:
+            text, rest = rest + '\n', ''
+        else:
+            break
+
+        u, v, weight = _split_edges(text)
+        # the nodes of each edge, in turn
+        ids.append(np.fromiter(
+                imap(node_index.setdefault, chain.from_iterable(izip(u, v)),
+                     counter),
+                dtype=np.int_, count=2 * len(u)))
+        weights.append(np.array(weight, dtype=np.float64))
+
+    graph_fp.close()
+    if not sum(len(weight) for weight in weights):
+        sys.exit("No edges in file: {}".format(filename))
+    weights = np.concatenate(weights)
+
+    nodes = node_index.keys()
+    compact = np.empty(next(counter), dtype=np.int_)
+    compact[np.fromiter(node_index.itervalues(), dtype=np.int_,
+                        count=len(nodes))] = np.arange(len(nodes))
+    ids = compact[np.concatenate(ids)]
+    rows = ids[0::2]
+    cols = ids[1::2]
+
+    # keep the last listing of each edge, whichever way round it is listed
+    low = np.minimum(rows, cols)
+    high = np.maximum(rows, cols)
+    keys = low.astype(np.int64) * len(nodes) + high
+    _, last = np.unique(keys[::-1], return_index=True)
+    last = len(keys) - 1 - last
+    return nodes, low[last], high[last], weights[last]
+
+
+def _split_edges(text):
+    """ Split whole lines of a network file (see read_edges) into lists of
+    the first and second node of each edge, and of their weights.
+
+    When every line has the same number of columns and no trailing
+    whitespace, which is what rstrip would remove, the whole text is split
+    at once; otherwise each line is split on its own.
+    """
+    data = np.frombuffer(text, dtype=np.uint8)
+    newlines = np.flatnonzero(data == ord('\n'))
+    if not len(newlines):
+        return [], [], []
+    tabs = np.searchsorted(np.flatnonzero(data == ord('\t')), newlines)
+    columns = tabs[0] + 1
+    uniform = ((np.diff(tabs) == columns - 1).all() and
+               not np.in1d(data[newlines - 1], TRAILING).any())
+
+    if uniform and (columns in (2, 3) or columns > 4):
+        fields = text.replace('\n', '\t').split('\t')
+        # the empty field after the last newline
+        del fields[-1]
+        if columns == 2:
+            return fields[0::2], fields[1::2], [1.0] * len(newlines)
+        first, second, weight = (0, 1, 2) if columns == 3 else (1, 3, 4)
+        return (fields[first::columns], fields[second::columns],
+                map(float, fields[weight::columns]))
+
+    u, v, weight = [], [], []
+    for line in text.split('\n')[:-1]:
+        split_line = line.rstrip().split('\t')
+        if len(split_line) > 3:
+            # assume input graph is in the form of HIPPIE network
+            u.append(split_line[1])
+            v.append(split_line[3])
+            weight.append(float(split_line[4]))
+        elif len(split_line) == 3:
+            # assume input graph is a simple edgelist with weights
+            u.append(split_line[0])
+            v.append(split_line[1])
+            weight.append(float(split_line[2]))
+        elif len(split_line) == 2:
+            # assume input graph is a simple edgelist without weights
+            u.append(split_line[0])
+            v.append(split_line[1])
+            weight.append(1.0)
+    return u, v, weight
+
+
+def read_edge_changes(filename):
+    """ Read a file of edge changes, in any of the formats read_edges
+    reads, into a list of (node, node, weight) triples (see
+    Walker.update_edges). A weight of 0 deletes an edge.
+    """
+    nodes, low, high, weights = read_edges(filename)
+    return [(nodes[a], nodes[b], weight)
+            for a, b, weight in izip(low, high, weights)]
+
+
+def edge_changes(old_filename, new_filename):
+    """ Return the changes that turn the network in old_filename into the
+    one in new_filename (e.g. two releases of HIPPIE), as (node, node,
+    weight) triples, with weight 0 for deleted edges.
+    """
+    old = _edge_weights(old_filename)
+    new = _edge_weights(new_filename)
+    changes = [(a, b, weight) for (a, b), weight in new.iteritems()
+               if old.get((a, b)) != weight]
+    changes.extend((a, b, 0.0) for (a, b) in old if (a, b) not in new)
+    return sorted(changes)
+
+
+def _edge_weights(filename):
+    """ Read a network file into a dict of (node, node) -> weight, with
+    the nodes of each edge in sorted order.
+    """
+    nodes, low, high, weights = read_edges(filename)
+    return dict((tuple(sorted((nodes[a], nodes[b]))), weight)
+                for a, b, weight in izip(low, high, weights))
+
+
+def adjacency_matrix(num_nodes, rows, cols, weights):
+    """ Build the symmetric (CSC) adjacency matrix of the edges returned by
+    read_edges.
+    """
+    # every edge is added in both directions, except self-loops
+    both = rows != cols
+    return sp.csc_matrix(
+            (np.concatenate((weights, weights[both])),
+             (np.concatenate((rows, cols[both])),
+              np.concatenate((cols, rows[both])))),
+            shape=(num_nodes, num_nodes))
+
+
+def normalize_columns(matrix):
+    """ Return a float64 copy of matrix (dense, or scipy.sparse, which is
+    returned as CSC) with each column divided by the sum of its absolute
+    values. All-zero columns are left as they are.
+
+    This is what sklearn.preprocessing.normalize(matrix, norm='l1', axis=0)
+    computes, without the cost of importing sklearn.
+    """
+    if sp.issparse(matrix):
+        normalized = sp.csc_matrix(matrix, dtype=np.float64, copy=True)
+        sums = np.asarray(abs(normalized).sum(axis=0)).ravel()
+        sums[sums == 0] = 1
+        normalized.data /= np.repeat(sums, np.diff(normalized.indptr))
+        return normalized
+
+    normalized = np.array(matrix, dtype=np.float64)
+    sums = np.abs(normalized).sum(axis=0)
+    sums[sums == 0] = 1
+    normalized /= sums
+    return normalized
+
+
+def largest_component(adjacency, keep=None):
+    """ Return a boolean mask of the nodes in the largest connected component
+    of the graph with adjacency matrix adjacency, restricted to the nodes in
+    the boolean mask keep (all nodes, by default).
+    """
+    if keep is None:
+        keep = np.ones(adjacency.shape[0], dtype=bool)
+    kept_index = np.flatnonzero(keep)
+    _, labels = connected_components(adjacency[kept_index][:, kept_index],
+                                     directed=False)
+    largest = np.zeros(adjacency.shape[0], dtype=bool)
+    largest[kept_index[labels == np.argmax(np.bincount(labels))]] = True
+    return largest
+
+
+def neighbours(adjacency, nodes):
+    """ Return the sorted indices of the nodes adjacent to any of the given
+    nodes, in the graph with (symmetric) adjacency matrix adjacency.
+    """
+    if sp.issparse(adjacency):
+        return np.unique(sp.csc_matrix(adjacency)[:, nodes].indices)
+    return np.flatnonzero(np.asarray(adjacency)[:, nodes].any(axis=1))
+
+
+def connects(adjacency, nodes, keep):
+    """ Return True if the given nodes are all in one connected component
+    of the graph with adjacency matrix adjacency, restricted to the nodes in
+    the boolean mask keep.
+
+    This is a breadth-first search from the first node, which stops as soon
+    as it has reached the others, so it only explores the whole component
+    when they are far apart.
+    """
+    nodes = np.asarray(nodes)
+    seen = np.zeros(adjacency.shape[0], dtype=bool)
+    frontier = nodes[:1]
+    seen[frontier] = True
+    while len(frontier) and not seen[nodes].all():
+        reached = neighbours(adjacency, frontier)
+        frontier = reached[keep[reached] & ~seen[reached]]
+        seen[frontier] = True
+    return bool(seen[nodes].all())
+
+
+def without_nodes(nodes, adjacency, removed):
+    """ Remove the given nodes (ignoring any not in the graph), and return
+    the nodes and adjacency matrix of the largest connected component of
+    what remains.
+    """
+    node_index = dict((node, idx) for idx, node in enumerate(nodes))
+    keep = np.ones(len(nodes), dtype=bool)
+    for node in removed:
+        if node in node_index:
+            keep[node_index[node]] = False
+    kept_index = np.flatnonzero(largest_component(adjacency, keep))
+    return ([nodes[idx] for idx in kept_index],
+            adjacency[kept_index][:, kept_index].tocsc())
+
+
+def read_low_list(low_list, node_index):
+    """ Return the indices (as given by node_index) of the nodes marked
+    unexpressed (NA) in low_list. Nodes that are not in node_index are
+    ignored.
+    """
+    try:
+        list_fp = open(low_list, 'r')
+    except IOError:
+        sys.exit("Could not open file: {}".format(low_list))
+
+    index_list = []
+
+    for line in list_fp.readlines():
+        split_line = map(str.strip, line.split('\t'))
+        if split_line[1] == 'NA' and split_line[0] in node_index:
+            index_list.append(node_index[split_line[0]])
+
+    list_fp.close()
+    return index_list
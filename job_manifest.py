@@ -0,0 +1,268 @@
+"""
+Sharded, resumable job manifests for all-pairs (and other many-seed) runs
+
+"""
+import os
+import sys
+import json
+import fcntl
+import shutil
+import struct
+import numpy as np
+from result_store import ResultStore
+
+# file names within a job directory
+JOB_FILE = 'job.json'
+CHECKPOINT_FILE = 'checkpoint.json'
+LOCK_FILE = 'lock'
+STORE_DIR = 'store'
+
+# layout of struct flock, for testing a shard's lock (with F_GETLK) without
+# taking it
+if sys.platform.startswith('linux'):
+    # l_type, l_whence, l_start, l_len, l_pid
+    FLOCK_FORMAT = 'hhqqi'
+    FLOCK_TYPE = 0
+else:
+    # the BSDs and OS X: l_start, l_len, l_pid, l_type, l_whence
+    FLOCK_FORMAT = 'qqihh'
+    FLOCK_TYPE = 3
+
+class JobManifest:
+    """ Directory describing a many-seed run (by default, one seed per node),
+    split into shards that can each be run by any process on any host that
+    shares the filesystem.
+
+    The job directory contains:
+
+        job.json   : the node order, the name and seed nodes of each row,
+                     the row range of each shard, and the parameters of the
+                     walk
+        shard_<i>/ : for each shard, a result store of its rows (store/), a
+                     checkpoint of the rows completed (checkpoint.json), and
+                     a lock file (lock)
+
+    A process claims a shard by taking an exclusive lock on its lock file
+    (fcntl.lockf, which also works over NFS), without blocking. The lock is
+    released when the process exits or dies, so the shard of a crashed job
+    is simply claimed again, and resumed from its checkpoint. Rows are
+    flushed to the shard's store before the checkpoint listing them is
+    written, and checkpoints are replaced atomically (written to a temporary
+    file, then renamed into place), so a checkpoint never lists a row that
+    is not on disk.
+
+    Attributes:
+    -----------
+        path (str)       : The job directory
+        nodes (list)     : The node order of every result row
+        row_names (list) : The name of each row (the seed node, for
+                           all-pairs jobs)
+        seeds (list)     : The seed set (a list of nodes) of each row
+        shards (list)    : (start, stop) row range of each shard
+        params (dict)    : The parameters of the walk
+    """
+
+    def __init__(self, path):
+        """ Open an existing job directory. """
+        self.path = path
+        try:
+            with open(os.path.join(path, JOB_FILE), 'r') as fp:
+                job = json.load(fp)
+        except (IOError, ValueError):
+            sys.exit("Could not open job manifest: {}".format(path))
+
+        self.nodes = [str(n) for n in job['nodes']]
+        self.row_names = [str(n) for n in job['row_names']]
+        self.seeds = [[str(n) for n in seed] for seed in job['seeds']]
+        self.shards = [tuple(shard) for shard in job['shards']]
+        self.params = job['params']
+
+    @classmethod
+    def create(cls, path, nodes, num_shards, params, row_names=None,
+               seeds=None):
+        """ Create a job directory, with one row per seed set in seeds (by
+        default, one single-node seed per node), split into num_shards
+        shards of consecutive rows.
+
+        If the job directory already exists, it is opened instead, so
+        creating the same job again (e.g. from every host) is harmless.
+        """
+        if seeds is None:
+            seeds = [[node] for node in nodes]
+        if row_names is None:
+            row_names = [seed[0] for seed in seeds]
+        num_shards = max(1, min(num_shards, len(seeds)))
+        bounds = [len(seeds) * idx // num_shards
+                  for idx in xrange(num_shards + 1)]
+
+        if not os.path.exists(path):
+            # write the manifest in a temporary directory, then rename it
+            # into place, so other processes never see a partial job
+            tmp_path = '{}.tmp.{}'.format(path.rstrip('/'), os.getpid())
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            os.makedirs(tmp_path)
+            job = {
+                'nodes': [str(n) for n in nodes],
+                'row_names': [str(n) for n in row_names],
+                'seeds': [[str(n) for n in seed] for seed in seeds],
+                'shards': zip(bounds[:-1], bounds[1:]),
+                'params': params,
+            }
+            with open(os.path.join(tmp_path, JOB_FILE), 'w') as fp:
+                json.dump(job, fp)
+
+            try:
+                os.rename(tmp_path, path)
+            except OSError:
+                shutil.rmtree(tmp_path, ignore_errors=True)
+
+        manifest = cls(path)
+        if manifest.nodes != [str(n) for n in nodes]:
+            sys.exit("Job {} has a different node order than the input "
+                     "graph. Exiting.".format(path))
+        return manifest
+
+    def shard_dir(self, shard):
+        """ Return the directory of a shard, creating it if necessary. """
+        shard_dir = os.path.join(self.path, 'shard_{}'.format(shard))
+        try:
+            os.makedirs(shard_dir)
+        except OSError:
+            if not os.path.isdir(shard_dir):
+                sys.exit("Could not create shard directory: {}".format(
+                         shard_dir))
+        return shard_dir
+
+    def claim(self, shard):
+        """ Try to take the lock of a shard, without blocking.
+
+        Returns the open lock file, which holds the lock until it is closed
+        (or the process exits), or None if another process holds it.
+        """
+        lock_fp = open(os.path.join(self.shard_dir(shard), LOCK_FILE), 'a')
+        try:
+            fcntl.lockf(lock_fp, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except IOError:
+            lock_fp.close()
+            return None
+        return lock_fp
+
+    def is_claimed(self, shard):
+        """ Return True if another process holds the lock of a shard.
+
+        The lock is only tested, not taken, so checking the status of a job
+        never stops a worker from claiming a shard.
+        """
+        with open(os.path.join(self.shard_dir(shard), LOCK_FILE), 'a') as fp:
+            # ask whether an exclusive lock on the whole file would conflict
+            # with a lock held by another process
+            fields = [0] * 5
+            fields[FLOCK_TYPE] = fcntl.F_WRLCK
+            flock = fcntl.fcntl(fp, fcntl.F_GETLK,
+                                struct.pack(FLOCK_FORMAT, *fields))
+        return (struct.unpack(FLOCK_FORMAT, flock)[FLOCK_TYPE] !=
+                fcntl.F_UNLCK)
+
+    def completed(self, shard):
+        """ Return the set of (job) row indices the checkpoint of a shard
+        lists as completed.
+        """
+        filename = os.path.join(self.path, 'shard_{}'.format(shard),
+                                CHECKPOINT_FILE)
+        try:
+            with open(filename, 'r') as fp:
+                return set(json.load(fp)['completed'])
+        except IOError:
+            # nothing has been checkpointed yet
+            return set()
+        except (ValueError, KeyError):
+            sys.exit("Corrupt checkpoint: {}".format(filename))
+
+    def checkpoint(self, shard, completed):
+        """ Atomically replace the checkpoint of a shard with the given
+        completed row indices. The rows must already be flushed to the
+        shard's store.
+        """
+        shard_dir = self.shard_dir(shard)
+        filename = os.path.join(shard_dir, CHECKPOINT_FILE)
+        tmp_filename = '{}.tmp.{}'.format(filename, os.getpid())
+        with open(tmp_filename, 'w') as fp:
+            json.dump({'completed': sorted(completed)}, fp)
+            fp.flush()
+            os.fsync(fp.fileno())
+        os.rename(tmp_filename, filename)
+
+    def pending(self, shard):
+        """ Return the row indices of a shard that are not completed. """
+        start, stop = self.shards[shard]
+        completed = self.completed(shard)
+        return [idx for idx in xrange(start, stop) if idx not in completed]
+
+    def shard_store(self, shard):
+        """ Open (or create) the result store of a shard, with one row per
+        row of the shard, stored in the job's dtype.
+        """
+        start, stop = self.shards[shard]
+        return ResultStore.create(
+                os.path.join(self.shard_dir(shard), STORE_DIR), self.nodes,
+                self.row_names[start:stop], self.store_params(),
+                np.dtype(self.params.get('dtype', 'float64')))
+
+    def store_params(self):
+        """ Parameters to record in the header of the shard (and merged)
+        stores, as run_walker.py records them.
+        """
+        return dict((key, self.params.get(key))
+                    for key in ('input_digest', 'input_graph', 'low_list',
+                                'remove', 'restart_prob',
+                                'original_graph_prob'))
+
+    def status(self):
+        """ Return (number of rows completed, number of rows, claimed) for
+        each shard.
+        """
+        return [(len(self.completed(shard)), stop - start,
+                 self.is_claimed(shard))
+                for shard, (start, stop) in enumerate(self.shards)]
+
+    def merge(self, output, tolerance=1e-6):
+        """ Merge the shard stores into one result store at output, with one
+        row per job row, after verifying every shard.
+
+        Each shard must be checkpointed as complete, with every row filled
+        in its store, and every row must be a valid probability vector
+        (finite, non-negative, and summing to at most 1, within tolerance).
+        """
+        incomplete = [str(shard) for shard in xrange(len(self.shards))
+                      if self.pending(shard)]
+        if incomplete:
+            sys.exit("Shards {} of job {} are not complete. Exiting.".format(
+                     ', '.join(incomplete), self.path))
+
+        stores = []
+        for shard in xrange(len(self.shards)):
+            store_path = os.path.join(self.path, 'shard_{}'.format(shard),
+                                      STORE_DIR)
+            store = ResultStore(store_path)
+            start, stop = self.shards[shard]
+            if (store.nodes != self.nodes or
+                    store.row_names != self.row_names[start:stop] or
+                    not store.is_complete()):
+                sys.exit("Result store of shard {} does not match its "
+                         "checkpoint. Exiting.".format(shard))
+            sums = store.rows.sum(axis=1, dtype=np.float64)
+            if (not np.isfinite(sums).all() or store.rows.min() < 0 or
+                    (sums > 1 + tolerance).any()):
+                sys.exit("Result store of shard {} holds rows that are not "
+                         "probability vectors. Exiting.".format(shard))
+            stores.append(store)
+
+        merged = ResultStore.create(output, self.nodes, self.row_names,
+                                    self.store_params(),
+                                    stores[0].rows.dtype)
+        for (start, stop), store in zip(self.shards, stores):
+            merged.write_rows(slice(start, stop), store.rows)
+        if not merged.is_complete():
+            sys.exit("Merged result store {} is incomplete. Exiting.".format(
+                     output))
+        return merged
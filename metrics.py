@@ -0,0 +1,166 @@
+"""
+Timing, memory and convergence instrumentation for Walker runs
+
+"""
+import sys
+import json
+import time
+import resource
+from contextlib import contextmanager
+import numpy as np
+import scipy.sparse as sp
+from solvers import CONV_THRESHOLD
+
+# rounding allowed in each probability of a float32 result, relative to the
+# largest probability (see precision_tolerance)
+FLOAT32_ROUNDING = 16 * np.finfo(np.float32).eps
+
+class Metrics:
+    """ Machine-readable measurements of a run, written as JSON.
+
+    Attributes:
+    -----------
+        phases (dict)    : Wall time (in seconds) spent in each named phase,
+                           summed over every time the phase was entered
+        matrices (dict)  : Shape, number of nonzeros and density of each
+                           recorded matrix
+        values (dict)    : Any other recorded values (e.g. iteration counts)
+        residuals (list) : The convergence residual after each iteration of
+                           the last traced solve
+    """
+
+    def __init__(self):
+        self.phases = {}
+        self.matrices = {}
+        self.values = {}
+        self.residuals = []
+        self._start = time.time()
+
+    @contextmanager
+    def phase(self, name):
+        """ Time the body of a with statement, as the phase name. """
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.phases[name] = (self.phases.get(name, 0.0) +
+                                 time.time() - start)
+
+    def record(self, name, value):
+        self.values[name] = value
+
+    def record_matrix(self, name, matrix):
+        """ Record the size and sparsity of a (dense or sparse) matrix. """
+        if matrix is None:
+            return
+        if sp.issparse(matrix):
+            nnz = matrix.nnz
+        else:
+            nnz = np.count_nonzero(matrix)
+        rows, cols = matrix.shape
+        self.matrices[name] = {
+            'shape': [rows, cols],
+            'nnz': int(nnz),
+            'density': float(nnz) / (rows * cols) if rows * cols else 0.0,
+        }
+
+    def peak_memory(self):
+        """ Peak resident memory of this process so far, in bytes. """
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in bytes on OS X, and in kilobytes elsewhere
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+    def to_dict(self):
+        return {
+            'total_time': time.time() - self._start,
+            'peak_memory': self.peak_memory(),
+            'phases': self.phases,
+            'matrices': self.matrices,
+            'values': self.values,
+            'residuals': self.residuals,
+        }
+
+    def write(self, filename):
+        """ Write all measurements to filename, as JSON. """
+        try:
+            fp = open(filename, 'w')
+        except IOError:
+            sys.exit("Could not open file: {}".format(filename))
+        json.dump(self.to_dict(), fp, indent=2, sort_keys=True,
+                  default=_to_json)
+        fp.write('\n')
+        fp.close()
+
+
+def precision_tolerance(reference, restart_prob):
+    """ Return the largest difference in any probability expected between
+    a float32 result and its float64 reference.
+
+    Each run stops once an iteration moves the vector by less than
+    CONV_THRESHOLD (in L1), which leaves it within CONV_THRESHOLD * (1 - r)
+    / r of the exact result, so two runs differ by at most twice that.
+    Rounding in float32 adds FLOAT32_ROUNDING of the largest probability.
+    """
+    return (2 * CONV_THRESHOLD * (1 - restart_prob) / restart_prob +
+            FLOAT32_ROUNDING * float(np.max(reference)))
+
+
+def precision_report(reference, result, top_k=100, tolerance=None):
+    """ Compare a probability vector (e.g. from a float32 run) with a
+    reference vector (from a float64 run), and return a dict of how far they
+    differ, in probability and in rank. If tolerance is given, the report
+    also says whether max_abs_error is within it.
+
+    Nodes are ranked as Walker ranks them (highest probability first, ties
+    in node order). top_k_overlap is the fraction of the reference top_k
+    nodes that are also in the top_k of result, top_k_max_rank_shift is the
+    furthest any of them moved, and first_rank_change is the first (0-based)
+    rank at which the two rank lists differ, or None if they agree
+    everywhere.
+    """
+    reference = np.asarray(reference, dtype=np.float64)
+    result = np.asarray(result, dtype=np.float64)
+    error = np.abs(result - reference)
+    nodes = np.arange(len(reference))
+    reference_order = np.lexsort((nodes, -reference))
+    result_order = np.lexsort((nodes, -result))
+
+    # rank of each node, in each rank list
+    reference_ranks = np.empty(len(nodes))
+    reference_ranks[reference_order] = nodes
+    result_ranks = np.empty(len(nodes))
+    result_ranks[result_order] = nodes
+
+    top_k = min(top_k, len(nodes))
+    top = reference_order[:top_k]
+    changed = np.flatnonzero(reference_order != result_order)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        relative = np.where(reference[top] > 0,
+                            error[top] / reference[top], 0)
+    report = {
+        'max_abs_error': float(error.max()),
+        'l1_error': float(error.sum()),
+        'top_k': top_k,
+        'top_k_max_rel_error': float(relative.max()) if top_k else 0.0,
+        'top_k_overlap': (len(np.intersect1d(top, result_order[:top_k])) /
+                          float(top_k) if top_k else 1.0),
+        'top_k_same_order': bool((top == result_order[:top_k]).all()),
+        'first_rank_change': int(changed[0]) if len(changed) else None,
+        'top_k_max_rank_shift': (int(np.abs(reference_ranks[top] -
+                                            result_ranks[top]).max())
+                                 if top_k else 0),
+        'spearman': float(np.corrcoef(reference_ranks, result_ranks)[0, 1]),
+    }
+    if tolerance is not None:
+        report['tolerance'] = tolerance
+        report['within_tolerance'] = report['max_abs_error'] <= tolerance
+    return report
+
+
+def _to_json(value):
+    """ Convert numpy values (e.g. iteration count arrays) for json.dump. """
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError('{!r} is not JSON serializable'.format(value))
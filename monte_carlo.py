@@ -0,0 +1,267 @@
+"""
+Monte Carlo estimation of tissue-specific graph walks with RWR
+
+"""
+import sys
+import hashlib
+import multiprocessing
+import numpy as np
+import scipy.sparse as sp
+from scipy.stats import norm
+from graph_loader import (read_edges, adjacency_matrix, without_nodes,
+                          read_low_list)
+
+# number of walks simulated by each batch (with its own random stream)
+BATCH_WALKS = 100000
+
+# per-process state, set up by _init_worker
+_worker = {}
+
+class MonteCarloWalker:
+    """ Class for estimating the multi-graph walk by simulating walks.
+
+    No transition matrix is built: each graph is held as an adjacency list
+    (in CSR form, with cumulative edge weights), and walks are simulated
+    directly on it. Each walk starts at a seed node, stops at each step with
+    probability restart_prob (recording the node it stops at), and
+    otherwise moves to a neighbour, chosen in proportion to edge weight, on
+    the original graph with probability og_prob or on the tissue-specific
+    graph otherwise. The fraction of walks stopping at a node estimates the
+    probability Walker computes for it. A walk that has to move on the
+    tissue-specific graph from a node with no expressed neighbours is lost,
+    as probability is in Walker.
+
+    Walks are simulated in batches of BATCH_WALKS (the last batch may be
+    smaller, so no more than max_walks are simulated), and batch i always
+    uses the same random stream (derived from random_seed and i). Batches
+    are added to the estimate, and the top_k stopping rule checked, in batch
+    order, so results depend only on random_seed and max_walks, however
+    many processes share the batches.
+
+    Attributes:
+    -----------
+        nodes (list)      : The nodes of the graph (i.e. the LCC, after any
+                            node removal)
+        node_index (dict) : The index of each node in nodes
+        og_graph (tuple)  : (indptr, indices, cumulative weights) of the
+                            original graph's adjacency list
+        tsg_graph (tuple) : The same, for the tissue-specific graph (None
+                            without a low list)
+    """
+
+    def __init__(self, original_ppi, low_list, remove_nodes=[]):
+        nodes, rows, cols, weights = read_edges(original_ppi)
+        adjacency = adjacency_matrix(len(nodes), rows, cols, weights)
+        if remove_nodes:
+            nodes, adjacency = without_nodes(nodes, adjacency, remove_nodes)
+
+        self.nodes = nodes
+        self.node_index = dict((node, idx) for idx, node in enumerate(nodes))
+        self.og_graph = _adjacency_list(adjacency)
+
+        if low_list:
+            # drop the edges of unexpressed nodes
+            mask = np.ones(len(nodes))
+            mask[read_low_list(low_list, self.node_index)] = 0
+            mask = sp.diags(mask)
+            self.tsg_graph = _adjacency_list(mask.dot(adjacency).dot(mask))
+        else:
+            self.tsg_graph = None
+
+    def estimate(self, source, restart_prob, og_prob, max_walks=1000000,
+                 processes=1, random_seed=0, top_k=None, stable_rounds=3,
+                 exclude_seeds=False, confidence=0.95):
+        """ Simulate walks from the source nodes, and return estimated
+        probabilities with confidence intervals.
+
+        Parameters:
+        -----------
+            source (list):        The source nodes, as for Walker.run_exp
+            restart_prob (float): As for Walker
+            og_prob (float):      As for Walker
+            max_walks (int):      The largest number of walks to simulate
+            processes (int):      Number of processes to simulate walks in;
+                                  each round of the simulation runs (up
+                                  to) one batch per process
+            random_seed (int):    Seed the random streams are derived from
+            top_k (int):          If given, stop once the top_k nodes (in
+                                  order) have not changed for stable_rounds
+                                  batches in a row
+            stable_rounds (int):  As above
+            exclude_seeds (bool): Leave the source nodes out of the top_k
+                                  nodes, as run_exp leaves them out of the
+                                  rank list
+            confidence (float):   Confidence level of the intervals
+
+        Returns:
+        --------
+            The estimated probability vector (in the order of self.nodes),
+            the lower and upper ends of each node's confidence interval, and
+            the number of walks simulated.
+        """
+        seeds = []
+        for source_id in source:
+            if source_id not in self.node_index:
+                sys.exit("Source node {} is not in original graph. Source: "
+                         "{}. Exiting.".format(source_id, source))
+            seeds.append(self.node_index[source_id])
+        # each seed node starts with probability 1 / len(source), as in
+        # Walker, so repeated seed nodes only count once
+        seeds = np.unique(seeds)
+        scale = len(seeds) / float(len(source))
+
+        args = (self.og_graph, self.tsg_graph, seeds, restart_prob, og_prob,
+                random_seed)
+        pool = None
+        if processes > 1:
+            pool = multiprocessing.Pool(processes, _init_worker, args)
+        else:
+            _init_worker(*args)
+
+        counts = np.zeros(len(self.nodes), dtype=np.int64)
+        walks = 0
+        batch = 0
+        ranking = None
+        unchanged = 0
+        stable = False
+        while walks < max_walks and not stable:
+            # (batch index, number of walks) of each batch of the round
+            remaining = max_walks - walks
+            num_batches = min(processes, -(-remaining // BATCH_WALKS))
+            batches = [(batch + idx,
+                        min(BATCH_WALKS, remaining - idx * BATCH_WALKS))
+                       for idx in xrange(num_batches)]
+            batch += num_batches
+            results = (pool.map(_simulate_batch, batches) if pool
+                       else map(_simulate_batch, batches))
+
+            # add the batches in order, as if they were simulated one at a
+            # time, and drop the rest of the round once the top is stable
+            for (_, batch_walks), batch_counts in zip(batches, results):
+                counts += batch_counts
+                walks += batch_walks
+                if top_k is not None:
+                    order = np.argsort(-counts, kind='mergesort')
+                    if exclude_seeds:
+                        order = order[~np.in1d(order, seeds)]
+                    top = tuple(order[:top_k])
+                    unchanged = unchanged + 1 if top == ranking else 0
+                    ranking = top
+                    if unchanged >= stable_rounds:
+                        stable = True
+                        break
+
+        if pool:
+            pool.close()
+            pool.join()
+
+        low, high = _wilson_interval(counts, walks, confidence)
+        return counts * scale / float(walks), low * scale, high * scale, walks
+
+    def run_exp(self, source, restart_prob, og_prob, node_list=[],
+                top_k=None, exclude_seeds=False, **kwargs):
+        """ Estimate a multi-graph random walk experiment, and print results.
+
+        Output is as for Walker.run_exp, with two more columns holding the
+        confidence interval of each probability. Other keyword arguments
+        are passed to estimate. Returns the number of walks simulated.
+        """
+        probs, low, high, walks = self.estimate(source, restart_prob, og_prob,
+                                                top_k=top_k,
+                                                exclude_seeds=exclude_seeds,
+                                                **kwargs)
+        if node_list:
+            order = [self.node_index[node] for node in node_list]
+        else:
+            # highest to lowest probability, with ties kept in node order
+            order = np.lexsort((np.arange(len(probs)), -probs))
+            if exclude_seeds:
+                seeds = set(self.node_index[node] for node in source)
+                order = [idx for idx in order if idx not in seeds]
+            order = order[:top_k]
+        sys.stdout.write(''.join('{}\t{:.10f}\t{:.10f}\t{:.10f}\n'.format(
+                                 self.nodes[idx], probs[idx], low[idx],
+                                 high[idx]) for idx in order))
+        return walks
+
+
+def _adjacency_list(adjacency):
+    """ Return (indptr, indices, cumulative weights) of an adjacency matrix.
+
+    The weights of all edges are accumulated in one array, with a leading
+    zero, so the edges of node u cover the range
+    [cumulative[indptr[u]], cumulative[indptr[u + 1]]).
+    """
+    adjacency = adjacency.tocsr()
+    adjacency.eliminate_zeros()
+    cumulative = np.concatenate(([0.0], np.cumsum(adjacency.data)))
+    return adjacency.indptr, adjacency.indices, cumulative
+
+
+def _step(graph, positions, rng):
+    """ Move each walk to a neighbour, chosen in proportion to edge weight,
+    and return the new positions. Walks at nodes with no edges are dropped.
+    """
+    indptr, indices, cumulative = graph
+    first = indptr[positions]
+    last = indptr[positions + 1]
+    moving = last > first
+    first, last = first[moving], last[moving]
+
+    # draw a point in each node's range of cumulative weight, and find the
+    # edge it falls in
+    low = cumulative[first]
+    target = low + rng.random_sample(len(first)) * (cumulative[last] - low)
+    edges = np.searchsorted(cumulative, target, side='right') - 1
+    edges = np.clip(edges, first, last - 1)
+    return indices[edges]
+
+
+def _batch_seed(random_seed, batch):
+    """ Derive an independent 32-bit seed for each batch, by hashing. """
+    digest = hashlib.sha1('{}:{}'.format(random_seed, batch)).hexdigest()
+    return int(digest[:8], 16)
+
+
+def _init_worker(og_graph, tsg_graph, seeds, restart_prob, og_prob,
+                 random_seed):
+    _worker.update(og_graph=og_graph, tsg_graph=tsg_graph, seeds=seeds,
+                   restart_prob=restart_prob, og_prob=og_prob,
+                   random_seed=random_seed)
+
+
+def _simulate_batch(batch_walks):
+    """ Simulate a batch, given as (batch index, number of walks), and
+    return the number of walks that stopped at each node.
+    """
+    batch, num_walks = batch_walks
+    rng = np.random.RandomState(_batch_seed(_worker['random_seed'], batch))
+    og_graph, tsg_graph = _worker['og_graph'], _worker['tsg_graph']
+    num_nodes = len(og_graph[0]) - 1
+    seeds = _worker['seeds']
+
+    counts = np.zeros(num_nodes, dtype=np.int64)
+    positions = seeds[rng.randint(len(seeds), size=num_walks)]
+    while positions.size:
+        stopped = rng.random_sample(positions.size) < _worker['restart_prob']
+        counts += np.bincount(positions[stopped], minlength=num_nodes)
+        positions = positions[~stopped]
+
+        if tsg_graph is None:
+            positions = _step(og_graph, positions, rng)
+        else:
+            on_og = rng.random_sample(positions.size) < _worker['og_prob']
+            positions = np.concatenate((
+                    _step(og_graph, positions[on_og], rng),
+                    _step(tsg_graph, positions[~on_og], rng)))
+    return counts
+
+
+def _wilson_interval(counts, walks, confidence):
+    """ Wilson score interval for each node's stopping probability. """
+    z = norm.ppf(0.5 + confidence / 2)
+    p = counts / float(walks)
+    center = (p + z ** 2 / (2 * walks)) / (1 + z ** 2 / walks)
+    half = (z * np.sqrt(p * (1 - p) / walks + z ** 2 / (4 * walks ** 2)) /
+            (1 + z ** 2 / walks))
+    return np.maximum(center - half, 0), np.minimum(center + half, 1)
@@ -0,0 +1,87 @@
+"""
+Approximate RWR by forward push, for fast top-k queries from small seed sets
+
+Forward push (as in approximate personalized PageRank; Andersen, Chung and
+Lang, 2006) keeps an estimate vector and a residual vector, starting from
+estimate = 0 and residual = p_0. Pushing a node u moves r * residual[u] into
+estimate[u], and spreads the rest of residual[u] over u's neighbours along
+column u of the transition matrix. Throughout, the exact result is
+
+    p = estimate + r (I - (1 - r)W)^-1 residual
+
+and the columns of r (I - (1 - r)W)^-1 sum to at most 1, so estimate <= p
+elementwise, and the L1 error is at most the residual mass left (see
+upper_bound for a bound on each node). Nodes are
+pushed until no residual is above the tolerance. Every push removes at least
+r * tolerance of residual mass, so there are at most 1 / (r * tolerance)
+pushes, each touching one node's neighbours. The running time depends on
+the neighbourhood explored, not on the size of the graph.
+
+"""
+from collections import deque
+import numpy as np
+
+# default residual tolerance - nodes are pushed until no node has more than
+# this much residual probability
+PUSH_TOLERANCE = 0.00001
+
+def forward_push(matrices, restart_prob, p_0, tolerance=PUSH_TOLERANCE):
+    """ Approximate the RWR result for starting vector p_0 by forward push.
+
+    Parameters:
+    -----------
+        matrices (list):      (weight, matrix) pairs, whose weighted sum is
+                              the column-normalized transition matrix W
+                              (e.g. og_prob * og_matrix plus (1 - og_prob) *
+                              tsg_matrix), each a scipy.sparse CSC matrix so
+                              its columns can be read directly
+        restart_prob (float): The restart probability r
+        p_0 (np.array):       The starting probability vector
+        tolerance (float):    Push nodes until none has more residual
+                              probability than this
+
+    Returns:
+    --------
+        The estimate (a lower bound on each node's probability), the
+        residual left (whose sum bounds the L1 error of the estimate), and
+        the number of pushes taken.
+    """
+    estimate = np.zeros(len(p_0))
+    residual = np.array(p_0, dtype=np.float64)
+    queued = residual > tolerance
+    queue = deque(np.flatnonzero(queued).tolist())
+    pushes = 0
+
+    while queue:
+        node = queue.popleft()
+        queued[node] = False
+        mass = residual[node]
+        residual[node] = 0
+        estimate[node] += restart_prob * mass
+
+        for weight, matrix in matrices:
+            start, stop = matrix.indptr[node], matrix.indptr[node + 1]
+            neighbours = matrix.indices[start:stop]
+            residual[neighbours] += ((1 - restart_prob) * weight * mass *
+                                     matrix.data[start:stop])
+            # queue the neighbours whose residual is now over the tolerance
+            grown = neighbours[(residual[neighbours] > tolerance) &
+                               ~queued[neighbours]]
+            queued[grown] = True
+            queue.extend(grown.tolist())
+        pushes += 1
+
+    return estimate, residual, pushes
+
+
+def upper_bound(estimate, residual, restart_prob, row_max):
+    """ Return an upper bound on each node's probability, given the output
+    of forward_push.
+
+    With e = p - estimate = r * residual + (1 - r) W e, and e summing to at
+    most the residual mass, e_i <= r * residual_i + (1 - r) * max_j(W_ij) *
+    sum(residual). row_max holds max_j(W_ij) for each row i of W (or an
+    upper bound on it).
+    """
+    return (estimate + restart_prob * residual +
+            (1 - restart_prob) * row_max * residual.sum())
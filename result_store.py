@@ -0,0 +1,184 @@
+"""
+Binary, memory-mapped store for RWR result vectors
+
+"""
+import os
+import sys
+import json
+import shutil
+import numpy as np
+
+class ResultStore:
+    """ Directory holding a matrix of RWR results, one row per seed set.
+
+    The store is a directory containing:
+
+        rows.npy   : (number of rows) x (number of nodes) matrix of
+                     probabilities, in numpy .npy format (float64 or
+                     float32)
+        filled.npy : one flag per row, set once that row has been written
+        meta.json  : the node order (i.e. the columns of rows.npy), the
+                     names of the rows, and the parameters of the walk
+
+    Both .npy files are memory-mapped, so opening a store is (nearly)
+    free, and many processes can write different rows of the same store.
+    A row's flag is only set after the row itself has been flushed to disk,
+    so a partially filled store is always valid: readers just ignore rows
+    whose flag is not set.
+
+    Attributes:
+    -----------
+        path (str)        : The store directory
+        mode (str)        : 'r' if the store is open read-only, or 'r+'
+        nodes (list)      : The node order of each row
+        row_names (list)  : The name of each row (e.g. the seed file index)
+        params (dict)     : The parameters the results were computed with
+        rows (np.memmap)  : The result matrix
+        filled (np.memmap): Flags marking which rows have been written
+    """
+
+    def __init__(self, path, mode='r'):
+        """ Open an existing store, read-only (mode='r') or for writing
+        (mode='r+').
+        """
+        self.path = path
+        self.mode = mode
+        try:
+            with open(os.path.join(path, 'meta.json'), 'r') as fp:
+                meta = json.load(fp)
+            self.rows = np.load(os.path.join(path, 'rows.npy'), mmap_mode=mode)
+            self.filled = np.load(os.path.join(path, 'filled.npy'),
+                                  mmap_mode=mode)
+        except (IOError, ValueError):
+            sys.exit("Could not open result store: {}".format(path))
+
+        self.nodes = [str(n) for n in meta['nodes']]
+        self.row_names = [str(n) for n in meta['row_names']]
+        self.params = meta['params']
+
+    @classmethod
+    def create(cls, path, nodes, row_names=None, params={},
+               dtype=np.float64):
+        """ Create an empty store, with one row per name in row_names (by
+        default, one row per node), and open it for writing. Rows are stored
+        as dtype (e.g. float32, to halve the size of an all-pairs store).
+
+        If the store already exists (e.g. another process created it first),
+        the existing store is opened instead.
+        """
+        if row_names is None:
+            row_names = nodes
+        row_names = [str(n) for n in row_names]
+
+        if not os.path.exists(path):
+            # build the store in a temporary directory, then rename it into
+            # place, so other processes never see a partial store
+            tmp_path = '{}.tmp.{}'.format(path.rstrip('/'), os.getpid())
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            os.makedirs(tmp_path)
+
+            rows = np.lib.format.open_memmap(
+                    os.path.join(tmp_path, 'rows.npy'), mode='w+',
+                    dtype=dtype, shape=(len(row_names), len(nodes)))
+            del rows
+            filled = np.lib.format.open_memmap(
+                    os.path.join(tmp_path, 'filled.npy'), mode='w+',
+                    dtype=np.uint8, shape=(len(row_names),))
+            del filled
+            meta = {
+                'nodes': [str(n) for n in nodes],
+                'row_names': row_names,
+                'params': params,
+            }
+            with open(os.path.join(tmp_path, 'meta.json'), 'w') as fp:
+                json.dump(meta, fp)
+
+            try:
+                os.rename(tmp_path, path)
+            except OSError:
+                shutil.rmtree(tmp_path, ignore_errors=True)
+
+        store = cls(path, mode='r+')
+        if store.nodes != [str(n) for n in nodes]:
+            sys.exit("Result store {} has a different node order than the "
+                     "input graph. Exiting.".format(path))
+        return store
+
+    def set_params(self, params):
+        """ Replace the parameters recorded in the store's header. """
+        meta = {
+            'nodes': self.nodes,
+            'row_names': self.row_names,
+            'params': params,
+        }
+        # write to a temporary file, then rename it into place, so readers
+        # never see a partial header
+        filename = os.path.join(self.path, 'meta.json')
+        tmp_filename = '{}.tmp.{}'.format(filename, os.getpid())
+        try:
+            with open(tmp_filename, 'w') as fp:
+                json.dump(meta, fp)
+            os.rename(tmp_filename, filename)
+        except (IOError, OSError):
+            sys.exit("Could not write result store: {}".format(self.path))
+        self.params = params
+
+    def write_row(self, index, p_t):
+        """ Write a probability vector to row index, and mark it filled. """
+        self.write_rows(slice(index, index + 1), p_t[np.newaxis])
+
+    def write_rows(self, indices, block):
+        """ Write a block of probability vectors (one per row) to the given
+        row indices (or slice), and mark them filled.
+        """
+        self.rows[indices] = block
+        self.rows.flush()
+        self.filled[indices] = 1
+        self.filled.flush()
+
+    def row_index(self, name):
+        """ Return the index of the row with the given name. """
+        try:
+            return self.row_names.index(str(name))
+        except ValueError:
+            sys.exit("Row {} is not in result store {}. Exiting.".format(
+                     name, self.path))
+
+    def num_filled(self):
+        """ Return the number of rows that have been written. """
+        return int(np.count_nonzero(self.filled))
+
+    def is_complete(self):
+        return self.num_filled() == len(self.row_names)
+
+    def export_text(self, filename, fmt='%.10f', node_list=None):
+        """ Write the result matrix as text, in the format build_matrix.py
+        has always written. Rows that have not been filled are written as
+        NaN.
+
+        Columns are in the order of self.nodes, or of node_list if it is
+        given: build_matrix.py used to read files written by run_walker.py
+        -n <node list>, whose columns were in node list order.
+        """
+        columns = np.arange(len(self.nodes))
+        if node_list is not None:
+            node_index = dict((node, idx) for idx, node in
+                              enumerate(self.nodes))
+            for node in node_list:
+                if node not in node_index:
+                    sys.exit("Node {} is not in result store {}. "
+                             "Exiting.".format(node, self.path))
+            columns = np.array([node_index[node] for node in node_list],
+                               dtype=np.int_)
+
+        try:
+            fp = open(filename, 'w')
+        except IOError:
+            sys.exit("Could not open file: {}".format(filename))
+
+        # one row at a time, so the whole matrix is never held in memory
+        missing = np.full(len(columns), np.nan)
+        for index in xrange(len(self.row_names)):
+            row = self.rows[index, columns] if self.filled[index] else missing
+            np.savetxt(fp, row[np.newaxis], fmt=fmt)
+        fp.close()
@@ -0,0 +1,151 @@
+"""
+Script for running all-pairs random walk experiments (one seed per node), in
+parallel.
+
+The Walker matrices are built once, and the fused operator is written to a
+memory-mapped file that every worker process attaches to without copying.
+Workers solve chunks of seeds, and write each result row straight into a
+preallocated (number of nodes) x (number of nodes) result store (see
+result_store.py), where row i is the probability vector for a walk seeded at
+node i.
+
+"""
+import os
+import sys
+import shutil
+import argparse
+import tempfile
+import multiprocessing
+import numpy as np
+import scipy.sparse as sp
+from walker import Walker
+from graph_cache import GraphCache
+from result_store import ResultStore
+from solvers import power_iteration_block
+
+# per-process state, set up by _init_worker
+_worker = {}
+
+def save_operator(operator, operator_dir):
+    """ Write the operator to .npy files, to be memory-mapped by workers. """
+    if sp.issparse(operator):
+        for part in ('data', 'indices', 'indptr'):
+            np.save(os.path.join(operator_dir, 'operator_{}.npy'.format(part)),
+                    getattr(operator, part))
+    else:
+        np.save(os.path.join(operator_dir, 'operator.npy'), operator)
+
+
+def load_operator(operator_dir, num_nodes):
+    """ Memory-map an operator written by save_operator. """
+    dense_file = os.path.join(operator_dir, 'operator.npy')
+    if os.path.exists(dense_file):
+        return np.load(dense_file, mmap_mode='r')
+    parts = [np.load(os.path.join(operator_dir, 'operator_{}.npy'.format(p)),
+                     mmap_mode='r')
+             for p in ('data', 'indices', 'indptr')]
+    return sp.csr_matrix(tuple(parts), shape=(num_nodes, num_nodes),
+                         copy=False)
+
+
+def _init_worker(operator_dir, store_path, num_nodes, restart_prob):
+    _worker['operator'] = load_operator(operator_dir, num_nodes)
+    _worker['store'] = ResultStore(store_path, mode='r+')
+    _worker['restart_prob'] = restart_prob
+
+
+def _solve_chunk(chunk):
+    """ Solve the walks seeded at nodes start, ..., stop - 1. """
+    start, stop = chunk
+    num_nodes = _worker['operator'].shape[0]
+
+    # starting vectors for single-node seeds are columns of the identity
+    p_0 = np.zeros((num_nodes, stop - start), dtype=_worker['operator'].dtype)
+    p_0[np.arange(start, stop), np.arange(stop - start)] = 1
+    restart = p_0 * _worker['restart_prob']
+
+    p_t, _ = power_iteration_block(_worker['operator'], restart, p_0)
+    _worker['store'].write_rows(slice(start, stop), p_t.T)
+    return stop - start
+
+
+def main(argv):
+
+    # set up argument parsing
+    parser = argparse.ArgumentParser()
+    parser.add_argument('input_graph', help='Original graph input file, in\
+                                             edge list format')
+    parser.add_argument('output', help='Output result store directory')
+    parser.add_argument('-e', '--restart_prob', type=float, default=0.7,
+                        help='Restart probability for random walk')
+    parser.add_argument('-l', '--low_list', nargs='?', default=None,
+                        help='<Optional> List of genes expressed and\
+                              unexpressed in the current tissue, if applicable')
+    parser.add_argument('-o', '--original_graph_prob', type=float, default=0.1,
+                        help='Probability of walking on the original (non-\
+                              tissue specific) graph, if applicable')
+    parser.add_argument('-r', '--remove', nargs='+',
+                        help='<Optional> Nodes to remove from the graph, if any')
+    parser.add_argument('-s', '--sparse', action='store_true',
+                        help='Store the graph matrices in sparse format, for\
+                              large (e.g. whole-proteome) networks')
+    parser.add_argument('--float32', action='store_true',
+                        help='Iterate and store results in single precision,\
+                              halving the size of the operator and store')
+    parser.add_argument('-c', '--cache_dir', default=None,
+                        help='<Optional> Directory to cache compiled graphs in')
+    parser.add_argument('-j', '--processes', type=int,
+                        default=multiprocessing.cpu_count(),
+                        help='Number of worker processes')
+    parser.add_argument('--chunk_size', type=int, default=64,
+                        help='Number of seeds each worker solves at once')
+    parser.add_argument('--tmp_dir', default=None,
+                        help='<Optional> Directory for the memory-mapped\
+                              operator (defaults to the system temp dir)')
+    opts = parser.parse_args()
+
+    remove_list = opts.remove if opts.remove else []
+    cache = GraphCache(opts.cache_dir) if opts.cache_dir else None
+    dtype = np.float32 if opts.float32 else np.float64
+    wk = Walker(opts.input_graph, opts.low_list, remove_list,
+                sparse=opts.sparse, cache=cache, dtype=dtype)
+    nodes = wk.nodes
+    num_nodes = len(nodes)
+
+    digest = wk.input_digest()
+
+    operator_dir = tempfile.mkdtemp(dir=opts.tmp_dir)
+    try:
+        save_operator(wk.operator(opts.restart_prob, opts.original_graph_prob),
+                      operator_dir)
+        # the operator is on disk now, so drop the in-memory copies
+        del wk
+
+        # preallocate the output, which the workers fill in row by row
+        ResultStore.create(opts.output, nodes, params={
+            'input_digest': digest,
+            'input_graph': opts.input_graph,
+            'low_list': opts.low_list,
+            'remove': opts.remove,
+            'restart_prob': opts.restart_prob,
+            'original_graph_prob': opts.original_graph_prob,
+        }, dtype=dtype)
+
+        chunks = [(start, min(start + opts.chunk_size, num_nodes))
+                  for start in xrange(0, num_nodes, opts.chunk_size)]
+        pool = multiprocessing.Pool(opts.processes, _init_worker,
+                                    (operator_dir, opts.output, num_nodes,
+                                     opts.restart_prob))
+        done = 0
+        for solved in pool.imap_unordered(_solve_chunk, chunks):
+            done += solved
+            sys.stderr.write('\r{}/{} seeds'.format(done, num_nodes))
+        sys.stderr.write('\n')
+        pool.close()
+        pool.join()
+    finally:
+        shutil.rmtree(operator_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,218 @@
+"""
+Script for running all-pairs (or any many-seed) walk experiments as a
+sharded, resumable job (see job_manifest.py).
+
+    python run_jobs.py create <job dir> <input_graph> [options]
+    python run_jobs.py run <job dir> [-c <cache dir>]
+    python run_jobs.py status <job dir>
+    python run_jobs.py merge <job dir> <output store> [-t <text file>]
+
+create splits the seeds into shards. run claims shards one at a time, and
+solves their remaining seeds, checkpointing after each batch; start it on
+as many hosts as you like (they only need to share the job directory), and
+start it again after a crash to resume. merge verifies the completed shards
+and merges them into one result store (see result_store.py).
+
+"""
+import os
+import sys
+import argparse
+import numpy as np
+from walker import Walker
+from graph_cache import GraphCache
+from job_manifest import JobManifest
+from run_walker import read_manifest, generate_seed_list, get_node_list
+
+def create_job(opts):
+    """ Build the graph (to find the node order), and write the job. """
+    remove_list = opts.remove if opts.remove else []
+    cache = GraphCache(opts.cache_dir) if opts.cache_dir else None
+    dtype = np.float32 if opts.float32 else np.float64
+    wk = Walker(opts.input_graph, opts.low_list, remove_list,
+                sparse=opts.sparse, cache=cache, dtype=dtype)
+
+    row_names = seeds = None
+    if opts.seeds:
+        # one row per seed file of the manifest, as run_walker.py -b runs them
+        row_names, seeds = [], []
+        for name, seed_file in read_manifest(opts.seeds):
+            seed_list = [s for s in generate_seed_list(seed_file)
+                         if s not in remove_list]
+            for node in seed_list:
+                if node not in wk.node_index:
+                    sys.exit("Source node {} of seed {} is not in original "
+                             "graph. Exiting.".format(node, name))
+            row_names.append(name)
+            seeds.append(seed_list)
+
+    # paths are made absolute, so every host can run the job from anywhere
+    # on the shared filesystem
+    params = {
+        'input_digest': wk.input_digest(),
+        'input_graph': os.path.abspath(opts.input_graph),
+        'low_list': (os.path.abspath(opts.low_list) if opts.low_list
+                     else None),
+        'remove': opts.remove,
+        'restart_prob': opts.restart_prob,
+        'original_graph_prob': opts.original_graph_prob,
+        'sparse': opts.sparse,
+        'dtype': np.dtype(dtype).name,
+    }
+    job = JobManifest.create(opts.job_dir, wk.nodes, opts.shards, params,
+                             row_names, seeds)
+    sys.stderr.write('{}: {} rows in {} shards\n'.format(
+                     opts.job_dir, len(job.row_names), len(job.shards)))
+
+def run_shard(wk, job, shard, batch_size):
+    """ Solve the remaining rows of a (claimed) shard, checkpointing after
+    each batch.
+    """
+    params = job.params
+    start, _ = job.shards[shard]
+    store = job.shard_store(shard)
+    completed = job.completed(shard)
+    pending = job.pending(shard)
+
+    for batch_start in xrange(0, len(pending), batch_size):
+        rows = pending[batch_start:batch_start + batch_size]
+        probs = wk.run_batch([job.seeds[row] for row in rows],
+                             params['restart_prob'],
+                             params['original_graph_prob'])
+        # the rows are flushed to the store before they are checkpointed
+        store.write_rows([row - start for row in rows], probs.T)
+        completed.update(rows)
+        job.checkpoint(shard, completed)
+        sys.stderr.write('shard {}: {}/{} rows\n'.format(
+                         shard, len(completed), len(store.row_names)))
+
+def run_job(opts):
+    """ Claim and run shards until none are left unclaimed. """
+    job = JobManifest(opts.job_dir)
+    params = job.params
+    wk = None
+    shards_run = 0
+
+    for shard in xrange(len(job.shards)):
+        if opts.max_shards is not None and shards_run >= opts.max_shards:
+            break
+        if not job.pending(shard):
+            continue
+        lock_fp = job.claim(shard)
+        if lock_fp is None:
+            # another process is running this shard
+            continue
+
+        try:
+            if wk is None:
+                # only build the graph once there is work to do
+                cache = (GraphCache(opts.cache_dir) if opts.cache_dir
+                         else None)
+                wk = Walker(params['input_graph'], params['low_list'],
+                            params['remove'] or [], sparse=params['sparse'],
+                            cache=cache, dtype=np.dtype(params['dtype']))
+                if (wk.nodes != job.nodes or
+                        wk.input_digest() != params.get('input_digest')):
+                    sys.exit("The input graph, low list or removed nodes of "
+                             "job {} have changed. Exiting.".format(
+                              opts.job_dir))
+            # check again, now that the shard is ours (another process may
+            # have finished it since)
+            if job.pending(shard):
+                run_shard(wk, job, shard, opts.batch_size)
+                shards_run += 1
+        finally:
+            lock_fp.close()
+
+def show_status(opts):
+    """ Write the progress of each shard, and of the whole job. """
+    job = JobManifest(opts.job_dir)
+    total_completed = total_rows = 0
+    for shard, (completed, rows, claimed) in enumerate(job.status()):
+        sys.stdout.write('shard {}\t{}/{}\t{}\n'.format(
+                         shard, completed, rows,
+                         'running' if claimed else
+                         'done' if completed == rows else 'waiting'))
+        total_completed += completed
+        total_rows += rows
+    sys.stdout.write('total\t{}/{}\n'.format(total_completed, total_rows))
+
+def merge_job(opts):
+    """ Verify the shards, and merge them into one result store. """
+    job = JobManifest(opts.job_dir)
+    merged = job.merge(opts.output)
+    sys.stderr.write('{}: {} rows, {} nodes\n'.format(
+                     opts.output, merged.num_filled(), len(merged.nodes)))
+    if opts.text:
+        node_list = get_node_list(opts.node_list) if opts.node_list else None
+        merged.export_text(opts.text, node_list=node_list)
+
+def main(argv):
+
+    # set up argument parsing
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers()
+
+    create = subparsers.add_parser('create', help='Split the seeds of a job\
+                                                   into shards')
+    create.set_defaults(func=create_job)
+    create.add_argument('job_dir', help='Job directory to create')
+    create.add_argument('input_graph', help='Original graph input file, in\
+                                             edge list format')
+    create.add_argument('--seeds', default=None,
+                        help='<Optional> Manifest of seed files (as for\
+                              run_walker.py -b); by default, every node is\
+                              a seed')
+    create.add_argument('-n', '--shards', type=int, default=16,
+                        help='Number of shards to split the seeds into')
+    create.add_argument('-e', '--restart_prob', type=float, default=0.7,
+                        help='Restart probability for random walk')
+    create.add_argument('-l', '--low_list', nargs='?', default=None,
+                        help='<Optional> List of genes expressed and\
+                              unexpressed in the current tissue, if applicable')
+    create.add_argument('-o', '--original_graph_prob', type=float,
+                        default=0.1,
+                        help='Probability of walking on the original (non-\
+                              tissue specific) graph, if applicable')
+    create.add_argument('-r', '--remove', nargs='+',
+                        help='<Optional> Nodes to remove from the graph, if any')
+    create.add_argument('-s', '--sparse', action='store_true',
+                        help='Store the graph matrices in sparse format, for\
+                              large (e.g. whole-proteome) networks')
+    create.add_argument('--float32', action='store_true',
+                        help='Iterate and store results in single precision')
+    create.add_argument('-c', '--cache_dir', default=None,
+                        help='<Optional> Directory to cache compiled graphs in')
+
+    run = subparsers.add_parser('run', help='Claim and run shards until none\
+                                             are left')
+    run.set_defaults(func=run_job)
+    run.add_argument('job_dir', help='Job directory')
+    run.add_argument('-c', '--cache_dir', default=None,
+                     help='<Optional> Directory to cache compiled graphs in')
+    run.add_argument('--batch_size', type=int, default=64,
+                     help='Number of seeds to solve (and checkpoint) at once')
+    run.add_argument('--max_shards', type=int, default=None,
+                     help='<Optional> Stop after running this many shards')
+
+    status = subparsers.add_parser('status', help='Show the progress of each\
+                                                   shard')
+    status.set_defaults(func=show_status)
+    status.add_argument('job_dir', help='Job directory')
+
+    merge = subparsers.add_parser('merge', help='Verify the shards, and merge\
+                                                 them into one result store')
+    merge.set_defaults(func=merge_job)
+    merge.add_argument('job_dir', help='Job directory')
+    merge.add_argument('output', help='Output result store directory')
+    merge.add_argument('-t', '--text', default=None,
+                       help='<Optional> Also export the merged results as a\
+                             text matrix, as build_matrix.py writes it')
+    merge.add_argument('-n', '--node_list', default=None,
+                       help='<Optional> Order of the columns of the text\
+                             matrix (as for run_walker.py -n)')
+
+    opts = parser.parse_args()
+    opts.func(opts)
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,73 @@
+"""
+Script for estimating tissue-specific graph walk experiments by simulating
+walks (see monte_carlo.py), without building any transition matrix.
+
+"""
+import sys
+import argparse
+import multiprocessing
+from monte_carlo import MonteCarloWalker
+from run_walker import generate_seed_list, get_node_list
+
+def main(argv):
+
+    # set up argument parsing
+    parser = argparse.ArgumentParser()
+    parser.add_argument('input_graph', help='Original graph input file, in\
+                                             edge list format')
+    parser.add_argument('seed', help='Seed file, to pull start nodes from')
+    parser.add_argument('-e', '--restart_prob', type=float, default=0.7,
+                        help='Restart probability for random walk')
+    parser.add_argument('-l', '--low_list', nargs='?', default=None,
+                        help='<Optional> List of genes expressed and\
+                              unexpressed in the current tissue, if applicable')
+    parser.add_argument('-n', '--node_list', nargs='?', default=None,
+                        help='<Optional> Order of output probs')
+    parser.add_argument('-o', '--original_graph_prob', type=float, default=0.1,
+                        help='Probability of walking on the original (non-\
+                              tissue specific) graph, if applicable')
+    parser.add_argument('-r', '--remove', nargs='+',
+                        help='<Optional> Nodes to remove from the graph, if any')
+    parser.add_argument('-k', '--top_k', type=int, default=None,
+                        help='<Optional> Only write the top k nodes of the\
+                              rank list, and stop simulating once they are\
+                              stable (ignored with -n)')
+    parser.add_argument('-x', '--exclude_seeds', action='store_true',
+                        help='Leave the seed nodes out of the rank list')
+    parser.add_argument('-w', '--walks', type=int, default=1000000,
+                        help='Maximum number of walks to simulate')
+    parser.add_argument('--stable_rounds', type=int, default=3,
+                        help='With -k, stop once the top k nodes have not\
+                              changed for this many batches in a row')
+    parser.add_argument('--confidence', type=float, default=0.95,
+                        help='Confidence level of the intervals written\
+                              after each probability')
+    parser.add_argument('--random_seed', type=int, default=0,
+                        help='Seed for the random streams of the walks')
+    parser.add_argument('-j', '--processes', type=int,
+                        default=multiprocessing.cpu_count(),
+                        help='Number of processes to simulate walks in')
+    parser.add_argument('--show_walks', action='store_true',
+                        help='Write the number of walks simulated to stderr')
+    opts = parser.parse_args()
+
+    node_list = get_node_list(opts.node_list) if opts.node_list else []
+    remove_list = opts.remove if opts.remove else []
+    seed_list = generate_seed_list(opts.seed)
+
+    # filter nodes we want to remove out of the starting seed, if any
+    if remove_list:
+        seed_list = [s for s in seed_list if s not in remove_list]
+
+    mc = MonteCarloWalker(opts.input_graph, opts.low_list, remove_list)
+    walks = mc.run_exp(seed_list, opts.restart_prob, opts.original_graph_prob,
+                       node_list, None if node_list else opts.top_k,
+                       opts.exclude_seeds, max_walks=opts.walks,
+                       processes=opts.processes, random_seed=opts.random_seed,
+                       stable_rounds=opts.stable_rounds,
+                       confidence=opts.confidence)
+    if opts.show_walks:
+        sys.stderr.write('{} walks\n'.format(walks))
+
+if __name__ == '__main__':
+    main(sys.argv)
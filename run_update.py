@@ -0,0 +1,99 @@
+"""
+Script for updating an all-pairs result store after the network changes
+(e.g. a new HIPPIE release), without rerunning every walk from scratch.
+
+The Walker for the old network is built (or loaded from the graph cache),
+the edge changes are applied to it (see Walker.update_edges), and every row
+of the store is re-solved, warm-started from its old result.
+
+"""
+import os
+import sys
+import argparse
+import numpy as np
+from walker import Walker
+from graph_cache import GraphCache
+from graph_loader import read_edge_changes, edge_changes
+from result_store import ResultStore
+
+def main(argv):
+
+    # set up argument parsing
+    parser = argparse.ArgumentParser()
+    parser.add_argument('input_graph', help='Original graph input file (the\
+                                             network the store was built\
+                                             from), in edge list format')
+    parser.add_argument('changes', help='Edge changes to apply, in edge list\
+                                         format, where a weight of 0 deletes\
+                                         an edge (or, with --release, the\
+                                         new release of the whole network)')
+    parser.add_argument('store', help='All-pairs result store to update (see\
+                                       run_all_pairs.py)')
+    parser.add_argument('--release', action='store_true',
+                        help='Treat the changes file as a new release of the\
+                              whole network, and apply its differences from\
+                              the original graph')
+    parser.add_argument('--output', default=None,
+                        help='<Optional> Write the updated results to this\
+                              store, rather than updating the store in place\
+                              (required if nodes are added)')
+    parser.add_argument('-l', '--low_list', nargs='?', default=None,
+                        help='<Optional> List of genes expressed and\
+                              unexpressed in the current tissue, if applicable')
+    parser.add_argument('-r', '--remove', nargs='+',
+                        help='<Optional> Nodes to remove from the graph, if any')
+    parser.add_argument('-s', '--sparse', action='store_true',
+                        help='Store the graph matrices in sparse format, for\
+                              large (e.g. whole-proteome) networks')
+    parser.add_argument('--float32', action='store_true',
+                        help='Store the graph matrices and iterate in single\
+                              precision')
+    parser.add_argument('-c', '--cache_dir', default=None,
+                        help='<Optional> Directory to cache compiled graphs in')
+    parser.add_argument('--batch_size', type=int, default=64,
+                        help='Number of rows to re-solve at once')
+    parser.add_argument('-m', '--metrics', default=None,
+                        help='<Optional> Write timing and convergence metrics\
+                              for the run to this file, as JSON')
+    opts = parser.parse_args()
+
+    if opts.release:
+        changes = edge_changes(opts.input_graph, opts.changes)
+    else:
+        changes = read_edge_changes(opts.changes)
+
+    remove_list = opts.remove if opts.remove else []
+    cache = GraphCache(opts.cache_dir) if opts.cache_dir else None
+    wk = Walker(opts.input_graph, opts.low_list, remove_list,
+                sparse=opts.sparse, cache=cache,
+                dtype=np.float32 if opts.float32 else np.float64)
+
+    mode = 'r' if opts.output else 'r+'
+    if mode == 'r+' and not os.access(opts.store, os.W_OK):
+        sys.exit('Result store {} is not writable; pass --output. '
+                 'Exiting.'.format(opts.store))
+    store = ResultStore(opts.store, mode)
+    if store.params.get('input_digest') != wk.input_digest():
+        sys.exit('Result store {} was not built from this input graph, low '
+                 'list and removed nodes. Exiting.'.format(opts.store))
+
+    num_nodes = len(wk.nodes)
+    columns = wk.update_edges(changes,
+                              opts.changes if opts.release else None)
+    sys.stderr.write('{} edge changes: {} nodes added, {} columns '
+                     'renormalized\n'.format(len(changes),
+                                             len(wk.nodes) - num_nodes,
+                                             len(columns)))
+
+    store, iterations = wk.update_store(store, opts.output, opts.batch_size)
+    if len(iterations):
+        sys.stderr.write('{}: {} rows re-solved, {:.1f} iterations per row '
+                         '(at most {})\n'.format(store.path, len(iterations),
+                                                 iterations.mean(),
+                                                 iterations.max()))
+
+    if opts.metrics:
+        wk.metrics.write(opts.metrics)
+
+if __name__ == '__main__':
+    main(sys.argv)
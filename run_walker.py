@@ -2,46 +2,349 @@
 Main script for running tissue-specific graph walk experiments, to convergence.
 
 """
+import os
 import sys
 import argparse
+import numpy as np
 from walker import Walker
+from graph_cache import GraphCache
+from result_store import ResultStore
+from solvers import SCHEMES
+from push import PUSH_TOLERANCE
+from metrics import precision_report, precision_tolerance
 
 def generate_seed_list(seed_file):
-    """ Read seed file into a list. """
-    seed_list = []
+    """ Read seed file into a list, with a single read of the whole file.
 
+    Each line is either a node, or an index and a node separated by
+    whitespace.
+    """
     try:
         fp = open(seed_file, "r")
     except IOError:
         sys.exit("Error opening file {}".format(seed_file))
+    lines = fp.read().splitlines()
+    fp.close()
 
-    for line in fp.readlines():
+    # the node is the last of (at most) the first two fields
+    return [info[:2][-1] for info in map(str.split, lines) if info]
+
+def read_manifest(manifest_file):
+    """ Read a manifest of seed files into a list of (name, seed file) pairs.
+
+    Each line of the manifest is either a seed file path, or a name and a seed
+    file path separated by whitespace. Seed sets without a name are named by
+    their (0-based) line number in the manifest.
+    """
+    manifest = []
+
+    try:
+        fp = open(manifest_file, "r")
+    except IOError:
+        sys.exit("Error opening file {}".format(manifest_file))
+
+    for idx, line in enumerate(fp.readlines()):
         info = line.rstrip().split()
+        if not info:
+            continue
         if len(info) > 1:
-            seed_list.append(info[1])
+            manifest.append((info[0], info[1]))
         else:
-            seed_list.append(info[0])
+            manifest.append((str(idx), info[0]))
+
+    fp.close()
+    return manifest
+
+def write_output(wk, opts, output_filename, p_t, seed_list, node_list):
+    """ Write a probability vector to output_filename, in the same format
+    run_walker.py writes to stdout.
+    """
+    try:
+        out_fp = open(output_filename, 'w')
+    except IOError:
+        sys.exit('Could not open file: {}'.format(output_filename))
+    exclude = seed_list if opts.exclude_seeds else []
+    wk.write_results(p_t, out_fp, node_list, opts.top_k, exclude)
+    out_fp.close()
+
+def run_tissues(wk, opts, names, seed_lists, node_list):
+    """ Run every seed set in every tissue of the tissue manifest, writing
+    one output file per (seed set, tissue) pair, to
+    <output_prefix>.<seed set name>.tis.<tissue name>.rwr (or
+    <output_prefix>.tis.<tissue name>.rwr for a single seed set, outside
+    batch mode).
+    """
+    tissues = read_manifest(opts.tissues)
+    probs = wk.run_tissues(seed_lists, [low_list for _, low_list in tissues],
+                           opts.restart_prob, opts.original_graph_prob)
+
+    for idx, name in enumerate(names):
+        for tissue_idx, (tissue, _) in enumerate(tissues):
+            output_filename = '.'.join(
+                    [opts.output_prefix] + ([name] if name else []) +
+                    ['tis', tissue, 'rwr'])
+            write_output(wk, opts, output_filename, probs[:, idx, tissue_idx],
+                         seed_lists[idx], node_list)
+
+def run_batch(wk, opts, remove_list, node_list):
+    """ Run every seed set in the manifest, writing one output file per set.
+
+    Output for each seed set is written to <output_prefix>.<name>.rwr, in the
+    same format run_walker.py writes to stdout, or to the row of the result
+    store named after the seed set if a store is given.
+    """
+    manifest = read_manifest(opts.seed)
+    store = None
+    if opts.store:
+        store = ResultStore.create(opts.store, wk.nodes,
+                                   [name for name, _ in manifest],
+                                   store_params(wk, opts), wk.dtype)
+
+    for start in xrange(0, len(manifest), opts.batch_size):
+        chunk = manifest[start:start + opts.batch_size]
+        seed_lists = []
+        for _, seed_file in chunk:
+            seed_list = generate_seed_list(seed_file)
+            if remove_list:
+                seed_list = [s for s in seed_list if s not in remove_list]
+            seed_lists.append(seed_list)
+
+        if opts.tissues:
+            run_tissues(wk, opts, [name for name, _ in chunk], seed_lists,
+                        node_list)
+            continue
+
+        probs = wk.run_batch(seed_lists, opts.restart_prob,
+                             opts.original_graph_prob, opts.solver)
+
+        for idx, (name, _) in enumerate(chunk):
+            if store:
+                store.write_row(start + idx, probs[:, idx])
+                continue
+
+            output_filename = '{}.{}.rwr'.format(opts.output_prefix, name)
+            write_output(wk, opts, output_filename, probs[:, idx],
+                         seed_lists[idx], node_list)
+
+def read_sweep(sweep_file):
+    """ Read a list of (restart_prob, original_graph_prob) pairs, one pair
+    per line.
+    """
+    params = []
+
+    try:
+        fp = open(sweep_file, "r")
+    except IOError:
+        sys.exit("Error opening file {}".format(sweep_file))
+
+    for line in fp.readlines():
+        info = line.split()
+        if info:
+            params.append((float(info[0]), float(info[1])))
 
     fp.close()
-    return seed_list
+    return params
+
+def run_sweep(wk, opts, seed_list, node_list):
+    """ Run the walk for every parameter pair in the sweep file, and write a
+    table with one column per pair to stdout.
+
+    The number of iterations each pair took is written to stderr.
+    """
+    params = read_sweep(opts.sweep)
+    probs, iterations = wk.run_sweep(seed_list, params, opts.solver)
+
+    if node_list:
+        rows = [wk.node_index[node] for node in node_list]
+    else:
+        rows = range(len(wk.nodes))
+
+    lines = ['node\t' + '\t'.join('{}/{}'.format(restart_prob, og_prob)
+                                  for restart_prob, og_prob in params)]
+    for row in rows:
+        lines.append('{}\t{}'.format(wk.nodes[row], '\t'.join(
+                     '{:.10f}'.format(prob) for prob in probs[row])))
+    sys.stdout.write('\n'.join(lines) + '\n')
+
+    for (restart_prob, og_prob), num_iterations in zip(params, iterations):
+        sys.stderr.write('{}/{}\t{} iterations\n'.format(
+                         restart_prob, og_prob, num_iterations))
+
+def read_knockouts(knockout_file):
+    """ Read a list of knockouts, one per line, where each knockout is a
+    whitespace-separated list of nodes to remove together.
+    """
+    knockouts = []
+
+    try:
+        fp = open(knockout_file, "r")
+    except IOError:
+        sys.exit("Error opening file {}".format(knockout_file))
+
+    for line in fp.readlines():
+        info = line.split()
+        if info:
+            knockouts.append(info)
+
+    fp.close()
+    return knockouts
+
+def run_knockouts(wk, opts, seed_list, node_list):
+    """ Run the walk once per knockout in the knockout file, writing one
+    output file per knockout.
+
+    Output for each knockout is written to <output_prefix>.<name>.rwr, where
+    name is the knocked-out nodes joined by '_', in the format run_walker.py
+    writes to stdout with the same nodes passed to -r.
+    """
+    knockouts = read_knockouts(opts.knockouts)
+    probs, iterations, kept = wk.run_knockouts(seed_list, knockouts,
+                                               opts.restart_prob,
+                                               opts.original_graph_prob,
+                                               opts.solver)
+
+    for idx, knockout in enumerate(knockouts):
+        if not probs[:, idx].any():
+            # every seed node was knocked out, so there is nothing to rank
+            continue
+        name = '_'.join(knockout)
+        output_filename = '{}.{}.rwr'.format(opts.output_prefix, name)
+        try:
+            out_fp = open(output_filename, 'w')
+        except IOError:
+            sys.exit('Could not open file: {}'.format(output_filename))
+        # leave out the removed nodes, as if they were never in the graph
+        exclude = [node for node, keep in zip(wk.nodes, kept[:, idx])
+                   if not keep]
+        if opts.exclude_seeds:
+            exclude += seed_list
+        wk.write_results(probs[:, idx], out_fp, node_list, opts.top_k,
+                         exclude)
+        out_fp.close()
+
+        if opts.show_iterations:
+            sys.stderr.write('{}\t{} iterations\n'.format(name,
+                                                           iterations[idx]))
+
+def store_params(wk, opts):
+    """ Parameters to record in a result store's header. """
+    return {
+        'input_digest': wk.input_digest(),
+        'input_graph': opts.input_graph,
+        'low_list': opts.low_list,
+        'node_list': opts.node_list,
+        'remove': opts.remove,
+        'restart_prob': opts.restart_prob,
+        'original_graph_prob': opts.original_graph_prob,
+    }
+
+def validate_precision(wk, opts, seed_list, remove_list, cache):
+    """ Solve the seed set with float64 matrices as well as with the
+    (float32) Walker, and write a report comparing the two rank lists to
+    stderr, and to the metrics. Warns if any probability differs by more
+    than precision_tolerance.
+    """
+    reference = Walker(opts.input_graph, opts.low_list, remove_list,
+                       sparse=opts.sparse, cache=cache)
+    p_64 = reference.solve(seed_list, opts.restart_prob,
+                           opts.original_graph_prob, opts.solver)
+    del reference
+    p_32 = wk.solve(seed_list, opts.restart_prob, opts.original_graph_prob,
+                    opts.solver)
+
+    report = precision_report(p_64, p_32, opts.top_k or 100,
+                              precision_tolerance(p_64, opts.restart_prob))
+    wk.metrics.record('precision', report)
+    for key in sorted(report):
+        sys.stderr.write('{}\t{}\n'.format(key, report[key]))
+    if not report['within_tolerance']:
+        sys.stderr.write('Warning: the float32 probabilities differ from '
+                         'float64 by more than {:g}; run without --float32 '
+                         'for this network.\n'.format(report['tolerance']))
 
 def get_node_list(node_file):
-    node_list = []
     try:
         fp = open(node_file, 'r')
     except IOError:
         sys.exit('Could not open file: {}'.format(node_file))
-
-    # read the first (i.e. largest) connected component
-    cur_line = fp.readline()
-    while cur_line and not cur_line.isspace():
-        if cur_line:
-            node_list.append(cur_line.rstrip())
-        cur_line = fp.readline()
-
+    lines = fp.read().splitlines()
     fp.close()
+
+    # read the first (i.e. largest) connected component, which ends at the
+    # first blank line
+    node_list = []
+    for line in lines:
+        if not line.strip():
+            break
+        node_list.append(line.rstrip())
     return node_list
 
+def run_experiments(wk, opts, remove_list, node_list, cache=None):
+    """ Run the experiment(s) selected by the command line options. """
+    if opts.batch:
+        run_batch(wk, opts, remove_list, node_list)
+        return
+
+    seed_list = generate_seed_list(opts.seed)
+
+    # filter nodes we want to remove out of the starting seed, if any
+    if remove_list:
+        seed_list = [s for s in seed_list if s not in remove_list]
+
+    if opts.sweep:
+        if opts.solver == 'direct':
+            sys.exit('Sweeps need an iterative solver. Exiting.')
+        run_sweep(wk, opts, seed_list, node_list)
+        return
+
+    if opts.tissues:
+        run_tissues(wk, opts, [None], [seed_list], node_list)
+        return
+
+    if opts.knockouts:
+        if opts.solver == 'direct':
+            sys.exit('Knockouts need an iterative solver. Exiting.')
+        run_knockouts(wk, opts, seed_list, node_list)
+        return
+
+    if opts.store:
+        # one row per node, so single-seed runs can fill an all-pairs store
+        store = ResultStore.create(opts.store, wk.nodes,
+                                   params=store_params(wk, opts), dtype=wk.dtype)
+        if opts.store_row is not None:
+            row = store.row_index(opts.store_row)
+        elif len(seed_list) == 1:
+            row = store.row_index(seed_list[0])
+        else:
+            sys.exit('--store_row is required for multi-node seeds. Exiting.')
+        store.write_row(row, wk.solve(seed_list, opts.restart_prob,
+                                      opts.original_graph_prob, opts.solver))
+        return
+
+    if opts.push:
+        # approximate, with an upper bound on each probability
+        certain = wk.run_push(seed_list, opts.restart_prob,
+                              opts.original_graph_prob, node_list,
+                              opts.push_tolerance, opts.top_k,
+                              opts.exclude_seeds)
+        if not certain:
+            sys.stderr.write('The bounds do not separate the top {} nodes '
+                             'from the rest; lower --push_tolerance for an '
+                             'exact top {}\n'.format(opts.top_k, opts.top_k))
+        if opts.show_iterations:
+            sys.stderr.write('{} pushes\n'.format(wk.iterations))
+        return
+
+    # run the experiments, and write a rank list to stdout
+    wk.run_exp(seed_list, opts.restart_prob,
+               opts.original_graph_prob, node_list, opts.solver,
+               opts.top_k, opts.exclude_seeds)
+    if opts.show_iterations:
+        sys.stderr.write('{} iterations\n'.format(wk.iterations))
+    if opts.validate_precision:
+        validate_precision(wk, opts, seed_list, remove_list, cache)
+
+
 def main(argv):
 
     # set up argument parsing
@@ -61,21 +364,144 @@ def main(argv):
                               tissue specific) graph, if applicable')
     parser.add_argument('-r', '--remove', nargs='+',
                         help='<Optional> Nodes to remove from the graph, if any')
+    parser.add_argument('-k', '--top_k', type=int, default=None,
+                        help='<Optional> Only write the top k nodes of the\
+                              rank list (ignored with -n)')
+    parser.add_argument('-x', '--exclude_seeds', action='store_true',
+                        help='Leave the seed nodes out of the rank list')
+    parser.add_argument('-b', '--batch', action='store_true',
+                        help='Treat the seed argument as a manifest of seed\
+                              files, and run all of them in one pass')
+    parser.add_argument('--batch_size', type=int, default=100,
+                        help='Number of seed sets to iterate together in\
+                              batch mode')
+    parser.add_argument('-p', '--output_prefix', default='seed',
+                        help='Prefix of the output files written in batch\
+                              mode (<prefix>.<name>.rwr)')
+    parser.add_argument('--solver', default='power',
+                        choices=sorted(SCHEMES) + ['direct'],
+                        help='Iterate to convergence (power, or one of the\
+                              accelerated schemes), or solve the equivalent\
+                              linear system with an LU factorization\
+                              (direct)')
+    parser.add_argument('--push', action='store_true',
+                        help='Approximate the walk by forward push, which\
+                              only explores the neighbourhood of the seed\
+                              nodes; a third column bounds each probability\
+                              from above')
+    parser.add_argument('--push_tolerance', type=float,
+                        default=PUSH_TOLERANCE,
+                        help='Residual tolerance for --push (smaller is more\
+                              accurate, but explores further)')
+    parser.add_argument('--show_iterations', action='store_true',
+                        help='Write the number of iterations the solver took\
+                              to stderr')
+    parser.add_argument('--permc_spec', default=None,
+                        choices=['MMD_AT_PLUS_A', 'MMD_ATA', 'COLAMD',
+                                 'NATURAL'],
+                        help='Column ordering for the sparse LU\
+                              factorization of --solver direct (default\
+                              MMD_AT_PLUS_A, which fills in least on most\
+                              networks)')
+    parser.add_argument('-f', '--factorization', default=None,
+                        help='<Optional> File to cache the direct solver\
+                              factorization in; it is read if it exists, and\
+                              written otherwise')
+    parser.add_argument('--sweep', default=None,
+                        help='<Optional> File of restart and original graph\
+                              probability pairs (one pair per line); the\
+                              walk is run for each pair, and a table with\
+                              one column per pair is written')
+    parser.add_argument('-t', '--tissues', default=None,
+                        help='<Optional> Manifest of low lists, one "<tissue\
+                              name> <low list>" per line; every seed set is\
+                              run in every tissue in one pass, writing\
+                              <prefix>[.<seed name>].tis.<tissue>.rwr')
+    parser.add_argument('--knockouts', default=None,
+                        help='<Optional> File of nodes to knock out, one\
+                              knockout per line (nodes on the same line are\
+                              removed together); the walk is run once per\
+                              knockout, writing <prefix>.<nodes>.rwr')
+    parser.add_argument('--store', default=None,
+                        help='<Optional> Write probability vectors to this\
+                              binary result store (see result_store.py),\
+                              rather than writing text')
+    parser.add_argument('--store_row', default=None,
+                        help='<Optional> Name of the result store row to\
+                              write (defaults to the seed node, for a\
+                              single-node seed)')
+    parser.add_argument('--from_store', default=None,
+                        help='<Optional> All-pairs result store (see\
+                              run_all_pairs.py) to answer seed sets from, by\
+                              combining its single-node rows; missing rows\
+                              are solved and written back to the store')
+    parser.add_argument('-m', '--metrics', default=None,
+                        help='<Optional> Write timing, memory and convergence\
+                              metrics for the run to this file, as JSON')
+    parser.add_argument('-c', '--cache_dir', default=None,
+                        help='<Optional> Directory to cache compiled graphs\
+                              in, so later runs on the same inputs skip\
+                              building the graph')
+    parser.add_argument('--cache_size', type=float, default=10240,
+                        help='Maximum size of the graph cache, in megabytes')
+    parser.add_argument('-s', '--sparse', action='store_true',
+                        help='Store the graph matrices in sparse format, for\
+                              large (e.g. whole-proteome) networks')
+    parser.add_argument('--float32', action='store_true',
+                        help='Store the graph matrices, iterate, and write\
+                              result stores in single precision, halving\
+                              memory use')
+    parser.add_argument('--validate_precision', action='store_true',
+                        help='With --float32, also solve the seed with\
+                              double precision, and write a report comparing\
+                              the rank lists to stderr')
     opts = parser.parse_args()
 
-    seed_list = generate_seed_list(opts.seed)
-    node_list = get_node_list(opts.node_list) if opts.node_list else []
+    if opts.tissues and (opts.low_list or opts.store or opts.sweep or
+                         opts.knockouts or opts.solver != 'power'):
+        sys.exit('--tissues cannot be combined with -l, --store, --sweep, '
+                 '--knockouts or other solvers. Exiting.')
 
-    # filter nodes we want to remove out of the starting seed, if any
+    if opts.validate_precision and (not opts.float32 or opts.batch or
+                                    opts.sweep or opts.tissues or
+                                    opts.knockouts or opts.store or
+                                    opts.push):
+        sys.exit('--validate_precision needs --float32, and a single seed '
+                 'set written as a rank list. Exiting.')
+
+    node_list = get_node_list(opts.node_list) if opts.node_list else []
     remove_list = opts.remove if opts.remove else []
-    if remove_list:
-        seed_list = [s for s in seed_list if s not in remove_list]
 
-    # run the experiments, and write a rank list to stdout
-    wk = Walker(opts.input_graph, opts.low_list, remove_list)
-    wk.run_exp(seed_list, opts.restart_prob,
-               opts.original_graph_prob, node_list)
+    cache = None
+    if opts.cache_dir:
+        cache = GraphCache(opts.cache_dir,
+                           max_bytes=int(opts.cache_size * 1024 ** 2))
+
+    wk = Walker(opts.input_graph, opts.low_list, remove_list,
+                sparse=opts.sparse, cache=cache,
+                dtype=np.float32 if opts.float32 else np.float64)
+    wk.permc_spec = opts.permc_spec
+
+    if opts.from_store:
+        mode = 'r+' if os.access(opts.from_store, os.W_OK) else 'r'
+        wk.attach_store(ResultStore(opts.from_store, mode))
+
+    if opts.solver == 'direct' and opts.factorization:
+        if os.path.exists(opts.factorization):
+            factorization = wk.load_factorization(opts.factorization)
+            if (factorization.restart_prob != opts.restart_prob or
+                    factorization.og_prob != opts.original_graph_prob):
+                sys.exit('Factorization {} was built with different restart '
+                         'and original graph probabilities. Exiting.'.format(
+                          opts.factorization))
+        else:
+            wk.save_factorization(opts.factorization, opts.restart_prob,
+                                  opts.original_graph_prob)
+
+    run_experiments(wk, opts, remove_list, node_list, cache)
 
+    if opts.metrics:
+        wk.metrics.write(opts.metrics)
 
 if __name__ == '__main__':
     main(sys.argv)
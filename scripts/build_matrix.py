@@ -1,7 +1,44 @@
+"""
+Build a result matrix from RWR results.
+
+Given a result store (written by run_walker.py --store or run_all_pairs.py),
+the store is opened in place (it is memory-mapped, so nothing is copied) and
+summarized, and it is exported as a text matrix only if an output file is
+given. Columns are in the order of the node list if one is given, or if
+the store was written by run_walker.py -n <node list>, as the text files
+below were:
+
+    python build_matrix.py <store dir> [<output file> [<node list>]]
+
+The original interface, reading <file prefix>.<idx>.rwr text files, is still
+supported:
+
+    python build_matrix.py <file prefix> <number of files> <output file>
+"""
+import os
 import sys
 import numpy as np
 
+# the result store lives in the top-level directory of the repo
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from result_store import ResultStore
+from run_walker import get_node_list
+
+def build_from_store(argv):
+    store = ResultStore(argv[1])
+    sys.stderr.write('{}: {}/{} rows filled, {} nodes\n'.format(
+                     argv[1], store.num_filled(), len(store.row_names),
+                     len(store.nodes)))
+    if len(argv) > 2:
+        node_file = argv[3] if len(argv) > 3 else store.params.get('node_list')
+        node_list = get_node_list(node_file) if node_file else None
+        store.export_text(argv[2], node_list=node_list)
+
 def main(argv):
+    if len(argv) < 5 and os.path.isdir(argv[1]):
+        build_from_store(argv)
+        return
+
     file_prefix = argv[1]
     num_files = int(argv[2])
     output_filename = argv[3]
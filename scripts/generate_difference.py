@@ -7,17 +7,18 @@ from the previous format, generated by multi_graph/old RWR code.
 (That is, each run of multi_matrix outputs a list of gene IDs, ordered by
 their probability in the converged RWR and delimited by newlines.)
 
-TODO: - parts of this are hacky (filtering out seed genes, etc)
-      - document this more thoroughly in LabArchives
+Genes in a seed are left out of that seed's rankings. For each seed, the
+genes in the top of any tissue's ranking are written to ./seed<n>.rankdiff,
+with the difference between their highest and lowest ranks across tissues.
 """
 import sys
-import operator
-import shared_functions as sh
+import argparse
+import numpy as np
+import rank_analytics as ra
 
-TOP = 25
-
-def write_diff_list(diff_list, tissue_list, seed_number, gene_rank, id_symbol_map):
-    """ Write the calculated diff scores to a rankdiff file """
+def write_diff_list(order, diffs, ranks, genes, tissue_list, seed_number,
+                    top, id_symbol_map):
+    """ Write the calculated diff scores of one seed to a rankdiff file """
     diff_file = "./seed{}.rankdiff".format(seed_number)
     seed_fp = open(diff_file, "w")
 
@@ -28,18 +29,15 @@ def write_diff_list(diff_list, tissue_list, seed_number, gene_rank, id_symbol_ma
     seed_fp.write("\n")
 
     # write each top diff
-    sorted_diffs = sorted(diff_list.items(),
-                          key=operator.itemgetter(1),
-                          reverse=True)
-
-    for gene in zip(*(sorted_diffs[:TOP]))[0]:
-        if diff_list[gene] == 0 or gene not in id_symbol_map:
+    for idx in order[:top]:
+        gene = genes[idx]
+        if diffs[idx] == 0 or gene not in id_symbol_map:
             continue
 
         seed_fp.write("{}\t{}\t{}".format(gene, id_symbol_map[gene],
-                                          diff_list[gene]))
-        for tissue_id in tissue_list:
-            seed_fp.write("\t{}".format(gene_rank[seed_number][tissue_id][gene]))
+                                          diffs[idx]))
+        for rank in ranks[:, idx]:
+            seed_fp.write("\t{}".format(rank))
         seed_fp.write("\n")
 
     seed_fp.close()
@@ -47,71 +45,38 @@ def write_diff_list(diff_list, tissue_list, seed_number, gene_rank, id_symbol_ma
 
 def main(argv):
 
-    if len(sys.argv) != 4:
-        sys.exit("python {} <prediction dir> <seed dir> <mapping file>".format(sys.argv[0]))
-
-    pred_dir = argv[1]
-    seed_dir = argv[2]
-    mapping = argv[3]
-
-    tissue_list = (14, 20, 22, 33, 46, 51)
-    # tissue_list = (30, 38, 43) # stomach, spleen, WBC
-    seed_hash = {}
-    id_symbol_map = sh.read_mapping(mapping)
-
-    for i in xrange(1, 5):
-        seed_file = "{}/seed{}.asso".format(seed_dir, i)
-        seed_hash = sh.read_seed(seed_file, i, seed_hash)
-
-    # generate and print a diff file for each seed (1, 2, 3, 4)
-    for seed_number in xrange(1, 5):
-        top_list = []
-        gene_rank = {}
-
-        for tissue_id in tissue_list:
-            prediction_file = "{}/seed.{}.tis.{}.rwr".format(
-                    pred_dir, seed_number, tissue_id)
-            if seed_number not in gene_rank:
-                gene_rank[seed_number] = {}
-
-            # these are filtered for things not in the seed
-            gene_rank[seed_number][tissue_id] = sh.read_rwr(prediction_file,
-                                                         seed_hash,
-                                                         seed_number)
-
-            # need to filter for things that are in the seed
-            # then get the top however many genes
-            filtered_genes = [(g, r) for g, r
-                              in gene_rank[seed_number][tissue_id].iteritems()]
-
-            sorted_genes = sorted(filtered_genes, key=lambda x: x[1])[:TOP]
-
-            for gene in zip(*sorted_genes)[0]:
-                top_list.append(gene)
-
-        # find the max and min ranks for each gene, then take the diff
-        top_list = list(set(top_list))
-        diff_list = {}
-        for gene in top_list:
-            min = 5000000
-            max = 0
-            rank_list = []
-
-            for tissue_id in tissue_list:
-                rank = gene_rank[seed_number][tissue_id][gene]
-                rank_list.append(rank)
-                if rank > max:
-                    max = rank
-                if rank < min:
-                    min = rank
-
-            diff_list[gene] = max - min
-
-        # now, print the calculated diff scores for each seed
-        write_diff_list(diff_list, tissue_list, seed_number, gene_rank, id_symbol_map)
+    parser = argparse.ArgumentParser()
+    parser.add_argument('pred_dir', help='Directory of RWR results, named\
+                                          seed.<seed>.tis.<tissue>.rwr')
+    parser.add_argument('seed_dir', help='Directory of seed files, named\
+                                          seed<seed>.asso')
+    parser.add_argument('mapping', help='Gene ID to gene symbol mapping file')
+    parser.add_argument('-t', '--tissues', nargs='+',
+                        default=['14', '20', '22', '33', '46', '51'],
+                        help='Tissues to compare')
+    parser.add_argument('-s', '--seeds', nargs='+',
+                        default=['1', '2', '3', '4'],
+                        help='Seeds to write diff files for')
+    parser.add_argument('-n', '--top', type=int, default=25,
+                        help='Number of top genes in each tissue to compare,\
+                              and of diffs to write')
+    opts = parser.parse_args()
+
+    id_symbol_map = ra.read_mapping(opts.mapping)
+    seeds = [ra.read_seed("{}/seed{}.asso".format(opts.seed_dir, i))
+             for i in opts.seeds]
+
+    genes, positions = ra.load_results(opts.pred_dir, opts.seeds,
+                                       opts.tissues)
+    ranks = ra.seed_filtered_ranks(genes, positions, seeds)
+    ranked = np.isfinite(ra.seed_filtered_positions(genes, positions, seeds))
+    orders, diffs = ra.rank_differences(ranks, opts.top, ranked)
+
+    # now, print the calculated diff scores for each seed
+    for s, seed_number in enumerate(opts.seeds):
+        write_diff_list(orders[s], diffs[s], ranks[s], genes, opts.tissues,
+                        seed_number, opts.top, id_symbol_map)
 
 
 if __name__ == "__main__":
     main(sys.argv)
-
-
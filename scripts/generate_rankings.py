@@ -1,67 +1,21 @@
-import sys
-
-def read_mapping(mapping):
-    """ Read (gene ID) -> (gene symbol) mapping file into a dict """
-    mapping_hash = {}
-    try:
-        fp = open(mapping, "r")
-    except IOError:
-        sys.exit("Error opening file {}".format(mapping))
-
-    for line in fp.readlines():
-        info = line.split()
-        mapping_hash[info[0]] = info[1]
-
-    fp.close()
-    return mapping_hash
-
-
-def read_seed(seed_file, i, seed_hash):
-    """ Read seed file into a list containing sublists representing each seed """
-    try:
-        fp = open(seed_file, "r")
-    except IOError:
-        sys.exit("Error opening file {}".format(seed_file))
-
-    seed_hash[i] = []
-    for line in fp.readlines():
-        info = line.split()
-        seed_hash[i].append(info[1])
-
-    fp.close()
-    return seed_hash
-
-
-def read_top_lists(seed_number, seed_hash, pred_dir):
-    tissue_list = (14, 20, 22, 33, 46, 51)
-    top_lists = {}
-    for tissue in tissue_list:
-        top_list = []
-        filename = "{}/seed.{}.tis.{}.rwr".format(
-                        pred_dir, seed_number, tissue)
+"""
+Write the top genes of each tissue's RWR results, side by side, for each seed
 
-        try:
-            fp = open(filename, "r")
-        except IOError:
-            sys.exit("Error opening file {}".format(filename))
-
-        # get top 20 genes from file, excepting genes in the
-        # current seed
-        gene_counter = 1
-        while gene_counter < 21:
-            current_gene = fp.readline().strip()
-            if current_gene not in seed_hash[seed_number]:
-                top_list.append(current_gene)
-                gene_counter += 1
-
-        top_lists[tissue] = top_list
-
-    return top_lists
-
-
-def write_top_lists(top_lists, seed_number, id_symbol_map):
+Genes in a seed are left out of that seed's rankings. The rankings of each
+seed are written to ./seed<n>.toprank.
+"""
+import sys
+import argparse
+import numpy as np
+import rank_analytics as ra
+
+def write_top_lists(top_lists, genes, tissue_list, seed_number, top,
+                    id_symbol_map):
+    """ Write the top genes of one seed to a toprank file. top_lists holds
+    the indices of the top genes of each tissue; if a tissue has fewer than
+    top genes, its column is left empty past the end of its list.
+    """
     diff_file = "./seed{}.toprank".format(seed_number)
-    tissue_list = (14, 20, 22, 33, 46, 51)
     list_fp = open(diff_file, "w")
 
     # write the header
@@ -71,31 +25,54 @@ def write_top_lists(top_lists, seed_number, id_symbol_map):
     list_fp.write("\n")
 
     # write rank lists
-    for rank in xrange(20):
-        for tissue in tissue_list:
-            current_gene_id = top_lists[tissue][rank]
-            list_fp.write("{}\t\t".format(id_symbol_map[current_gene_id]))
+    for rank in xrange(top):
+        for top_list in top_lists:
+            if rank < len(top_list):
+                current_gene_id = genes[top_list[rank]]
+                list_fp.write("{}\t\t".format(
+                        id_symbol_map.get(current_gene_id, current_gene_id)))
+            else:
+                list_fp.write("\t\t")
         list_fp.write("\n")
 
+    list_fp.close()
 
-def main(argv):
-
-    if len(sys.argv) != 4:
-        sys.exit("python {} <prediction dir> <mapping file>".format(sys.argv[0]))
 
-    pred_dir = argv[1]
-    seed_dir = argv[2]
-    seed_hash = {}
-    mapping = argv[3]
-    id_symbol_map = read_mapping(mapping)
-
-    for i in xrange(1, 5):
-        seed_file = "{}/seed{}.asso".format(seed_dir, i)
-        seed_hash = read_seed(seed_file, i, seed_hash)
+def main(argv):
 
-    for seed_id in xrange(1, 5):
-        top_lists = read_top_lists(seed_id, seed_hash, pred_dir)
-        write_top_lists(top_lists, seed_id, id_symbol_map)
+    parser = argparse.ArgumentParser()
+    parser.add_argument('pred_dir', help='Directory of RWR results, named\
+                                          seed.<seed>.tis.<tissue>.rwr')
+    parser.add_argument('seed_dir', help='Directory of seed files, named\
+                                          seed<seed>.asso')
+    parser.add_argument('mapping', help='Gene ID to gene symbol mapping file')
+    parser.add_argument('-t', '--tissues', nargs='+',
+                        default=['14', '20', '22', '33', '46', '51'],
+                        help='Tissues to rank')
+    parser.add_argument('-s', '--seeds', nargs='+',
+                        default=['1', '2', '3', '4'],
+                        help='Seeds to write rankings for')
+    parser.add_argument('-n', '--top', type=int, default=20,
+                        help='Number of top genes to write for each tissue')
+    opts = parser.parse_args()
+
+    id_symbol_map = ra.read_mapping(opts.mapping)
+    seeds = [ra.read_seed("{}/seed{}.asso".format(opts.seed_dir, i))
+             for i in opts.seeds]
+
+    genes, positions = ra.load_results(opts.pred_dir, opts.seeds,
+                                       opts.tissues)
+    ranks = ra.seed_filtered_ranks(genes, positions, seeds)
+    ranked = np.isfinite(ra.seed_filtered_positions(genes, positions, seeds))
+    top = ra.top_genes(ranks, opts.top)
+
+    for s, seed_number in enumerate(opts.seeds):
+        # leave out seed genes and genes missing from a file, which are only
+        # in the top lists when a file has fewer than top other genes
+        top_lists = [[idx for idx in top[s, t] if ranked[s, t, idx]]
+                     for t in xrange(len(opts.tissues))]
+        write_top_lists(top_lists, genes, opts.tissues, seed_number,
+                        opts.top, id_symbol_map)
 
 
 if __name__ == "__main__":
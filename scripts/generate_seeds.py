@@ -1,5 +1,8 @@
 """
 Generate seeds from an edge list
+
+Optionally also writes a manifest of the seed files, which can be passed to
+run_walker.py in batch mode (-b) to run every seed in a single process.
 """
 import sys
 
@@ -12,6 +15,7 @@ def main(argv):
 
     output_dir = argv[2]
     nodelist_file = argv[3]
+    manifest_file = argv[4] if len(argv) > 4 else None
 
     node_list = set()
 
@@ -22,14 +26,19 @@ def main(argv):
     node_list = list(node_list)
 
     nodelist_fp = open(nodelist_file, 'w')
+    manifest_fp = open(manifest_file, 'w') if manifest_file else None
     for idx, node in enumerate(node_list):
         nodelist_fp.write(node + '\n')
         output_filename = '{}/seed_{}.txt'.format(output_dir, idx)
         output_fp = open(output_filename, 'w')
         output_fp.write(node)
         output_fp.close()
+        if manifest_fp:
+            manifest_fp.write('{}\t{}\n'.format(idx, output_filename))
 
     nodelist_fp.close()
+    if manifest_fp:
+        manifest_fp.close()
     fp.close()
 
 
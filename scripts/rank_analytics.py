@@ -0,0 +1,156 @@
+"""
+Rank analytics over (seed, tissue) RWR results, shared between the data
+processing scripts
+
+All results for a set of seeds and tissues are loaded into one array of
+positions, (seeds) x (tissues) x (genes), and ranks are computed with array
+operations over it, rather than with per-gene dicts.
+
+"""
+import sys
+import numpy as np
+
+def read_mapping(mapping_file):
+    """ Read (gene ID) -> (gene symbol) mapping file into a dict """
+    mapping_hash = {}
+    try:
+        fp = open(mapping_file, "r")
+    except IOError:
+        sys.exit("Error opening file {}".format(mapping_file))
+
+    for line in fp.readlines():
+        info = line.split()
+        mapping_hash[info[0]] = info[1]
+
+    fp.close()
+    return mapping_hash
+
+
+def read_seed(seed_file):
+    """ Read the gene IDs of a seed file (the second column) into a set """
+    try:
+        fp = open(seed_file, "r")
+    except IOError:
+        sys.exit("Error opening file {}".format(seed_file))
+
+    seed = set(line.split()[1] for line in fp.readlines() if line.split())
+
+    fp.close()
+    return seed
+
+
+def read_ranked_genes(prediction_file):
+    """ Read the gene IDs of an RWR results file, from highest to lowest
+    probability. Either format works: one gene ID per line (as written by
+    multi_matrix.py), or gene ID and probability (as written by
+    run_walker.py).
+    """
+    try:
+        fp = open(prediction_file, "r")
+    except IOError:
+        sys.exit("Error opening file {}".format(prediction_file))
+
+    genes = [line.split()[0] for line in fp.readlines() if line.split()]
+
+    fp.close()
+    return genes
+
+
+def load_results(pred_dir, seed_names, tissues):
+    """ Load the results for every (seed, tissue) pair, i.e. the files
+    <pred_dir>/seed.<seed>.tis.<tissue>.rwr.
+
+    Returns:
+    --------
+        The list of genes (every gene in any of the files), and a
+        len(seed_names) x len(tissues) x (number of genes) array holding the
+        0-based position of each gene in each file. Genes missing from a file
+        get position inf, so they rank after every gene in it.
+    """
+    ranked = [[read_ranked_genes("{}/seed.{}.tis.{}.rwr".format(
+                                 pred_dir, seed, tissue))
+               for tissue in tissues] for seed in seed_names]
+
+    gene_index = {}
+    for gene_lists in ranked:
+        for genes in gene_lists:
+            for gene in genes:
+                gene_index.setdefault(gene, len(gene_index))
+    genes = [None] * len(gene_index)
+    for gene, idx in gene_index.iteritems():
+        genes[idx] = gene
+
+    positions = np.full((len(seed_names), len(tissues), len(genes)), np.inf)
+    for s, gene_lists in enumerate(ranked):
+        for t, ranked_genes in enumerate(gene_lists):
+            indices = [gene_index[gene] for gene in ranked_genes]
+            positions[s, t, indices] = np.arange(len(ranked_genes))
+    return genes, positions
+
+
+def seed_filtered_positions(genes, positions, seeds):
+    """ Return a copy of positions in which each seed's genes are at
+    position inf for that seed, like genes missing from a file. The finite
+    positions are then exactly the genes that are ranked.
+
+    seeds holds the set of seed genes for each seed, in the order of the
+    first axis of positions.
+    """
+    gene_index = dict((gene, idx) for idx, gene in enumerate(genes))
+    positions = positions.copy()
+    for s, seed in enumerate(seeds):
+        positions[s][:, [gene_index[g] for g in seed if g in gene_index]] = \
+                np.inf
+    return positions
+
+
+def seed_filtered_ranks(genes, positions, seeds):
+    """ Rank the genes for each (seed, tissue) pair, leaving out the genes in
+    that seed (which aren't informative, for our purposes).
+
+    seeds holds the set of seed genes for each seed, in the order of the
+    first axis of positions. Returns an array of the same shape as positions,
+    with ranks starting from 1. Seed genes, and genes missing from a file,
+    are ranked after every other gene (see seed_filtered_positions).
+    """
+    positions = seed_filtered_positions(genes, positions, seeds)
+
+    # the rank of each gene is the position of its position, in sorted order
+    # (a stable sort, so genes tied at inf stay in gene order)
+    order = np.argsort(positions, axis=-1, kind='mergesort')
+    ranks = np.empty_like(order)
+    np.put_along_axis(ranks, order, np.arange(1, len(genes) + 1), axis=-1)
+    return ranks
+
+
+def top_genes(ranks, top):
+    """ Return the indices of the top genes for each (seed, tissue) pair, as
+    a (seeds) x (tissues) x top array (fewer than top columns if there are
+    fewer genes).
+    """
+    return np.argsort(ranks, axis=-1, kind='mergesort')[..., :top]
+
+
+def rank_differences(ranks, top, ranked):
+    """ For each seed, find every gene in the top of any tissue's ranking,
+    and the difference between its highest and lowest rank across tissues.
+
+    ranked is a boolean array of the same shape as ranks, marking the genes
+    that are really ranked (e.g. the finite seed_filtered_positions). Seed
+    genes and genes missing from a file are ranked after the rest, so when a
+    file has fewer than top other genes, they would otherwise count as
+    being in its top.
+
+    Returns a list with, for each seed, the gene indices sorted by rank
+    difference (largest first), and an array of the differences of all
+    genes (zero for genes in no top list). Genes with the same difference
+    are in gene index order, i.e. the order they first appear in the
+    results (the per-gene dicts this replaced left ties in dict order).
+    """
+    in_top = (ranks <= top) & ranked
+    diffs = np.where(in_top.any(axis=1),
+                     ranks.max(axis=1) - ranks.min(axis=1), 0)
+    order = [np.flatnonzero(candidates)[
+                     np.argsort(-diffs[s][candidates], kind='mergesort')]
+             for s, candidates in enumerate(in_top.any(axis=1))]
+    return order, diffs
@@ -1,20 +1,77 @@
+"""
+Transform an RWR result matrix into a symmetric distance matrix, where
+entry (i, j) is 1 / m[i][j] + 1 / m[j][i].
+
+The transform is done tile by tile, processing tiles (i, j) and (j, i)
+together, so only a few tiles are held in memory at once. Input and output
+files ending in .npy (or a result store directory) are memory-mapped, so
+large matrices never need to fit in memory; other files are read and written
+as text, as before. Zero entries have no reciprocal, so a matrix with any
+is rejected.
+
+    python transform_matrix.py <matrix file> <output file> [<block size>]
+"""
+import os
 import sys
 import numpy as np
 
+# the result store lives in the top-level directory of the repo
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from result_store import ResultStore
+
+BLOCK_SIZE = 2048
+
+def open_input(matrix_file):
+    if os.path.isdir(matrix_file):
+        return ResultStore(matrix_file).rows
+    if matrix_file.endswith('.npy'):
+        return np.load(matrix_file, mmap_mode='r')
+    return np.loadtxt(matrix_file)
+
+def transform(matrix, output, block_size=BLOCK_SIZE):
+    """ Write 1 / matrix + (1 / matrix).T into output, tile by tile.
+    Exits if the matrix has a zero entry, which has no reciprocal.
+    """
+    n = matrix.shape[0]
+    for i in xrange(0, n, block_size):
+        rows = slice(i, min(i + block_size, n))
+        for j in xrange(i, n, block_size):
+            cols = slice(j, min(j + block_size, n))
+            tile = reciprocal(matrix[rows, cols], i, j)
+            tile += reciprocal(matrix[cols, rows], j, i).T
+            output[rows, cols] = tile
+            output[cols, rows] = tile.T
+
+def reciprocal(tile, row, col):
+    """ Return 1 / tile, for the tile of the matrix starting at (row, col).
+    """
+    tile = np.asarray(tile, dtype=np.float64)
+    if not tile.all():
+        zero_row, zero_col = np.argwhere(tile == 0)[0]
+        sys.exit('Matrix has a zero entry at ({}, {}), which has no '
+                 'reciprocal. Exiting.'.format(row + zero_row,
+                                               col + zero_col))
+    return np.reciprocal(tile)
+
 def main(argv):
     matrix_file = argv[1]
     output_filename = argv[2]
-    matrix = np.loadtxt(matrix_file)
-    def f(x): return 1 / float(x)
-    f = np.vectorize(f)
-    matrix = f(matrix)
+    block_size = int(argv[3]) if len(argv) > 3 else BLOCK_SIZE
 
-    transformed_matrix = [([0] * len(matrix[0])) for _ in xrange(len(matrix[0]))]
-    for i, row in enumerate(matrix):
-        for j, col in enumerate(row):
-            transformed_matrix[i][j] = matrix[i][j] + matrix[j][i]
+    matrix = open_input(matrix_file)
+    if matrix.shape[0] != matrix.shape[1]:
+        sys.exit('Matrix in {} is not square'.format(matrix_file))
 
-    np.savetxt(output_filename, np.array(transformed_matrix), fmt='%.10f')
+    if output_filename.endswith('.npy'):
+        output = np.lib.format.open_memmap(output_filename, mode='w+',
+                                           dtype=np.float64,
+                                           shape=matrix.shape)
+        transform(matrix, output, block_size)
+        output.flush()
+    else:
+        output = np.empty(matrix.shape)
+        transform(matrix, output, block_size)
+        np.savetxt(output_filename, output, fmt='%.10f')
 
 if __name__ == '__main__':
     main(sys.argv)
@@ -0,0 +1,349 @@
+"""
+Iterative solvers for the RWR fixed point p = operator * p + r * p_0
+
+Each solver works on a fused operator (i.e. (1 - r)W, as built by
+Walker.operator), which may be a dense numpy array or a scipy.sparse CSR
+matrix, so the solvers can be shared by Walker and by worker processes that
+only hold the operator. Every solver takes (operator, restart, p_init), and
+returns the final probability vector and the number of iterations taken,
+using the same L1 convergence criterion as plain power iteration so their
+results (and iteration counts) are comparable. If a trace list is passed,
+the convergence residual after each iteration is appended to it.
+
+Power iteration (single, block and tissue) runs in the operator's dtype, so
+a float32 operator halves the memory and bandwidth of each product. The
+residual is still accumulated in float64: the difference of two nearby
+floats is exact, so only the sum could lose precision (see residual_norm).
+
+scipy.linalg and scipy.sparse.linalg are only imported by the solvers that
+use them, since importing them slows down the start of every run.
+
+"""
+import sys
+import numpy as np
+import scipy.sparse as sp
+try:
+    # private to scipy, so it may move; next_p falls back to operator.dot
+    from scipy.sparse._sparsetools import csr_matvec, csr_matvecs
+except ImportError:
+    csr_matvec = csr_matvecs = None
+
+# convergence criterion - when vector L1 norm drops below 10^(-6)
+# (this is the same as the original RWR paper)
+CONV_THRESHOLD = 0.000001
+
+# number of times a Krylov method is rerun with a tighter tolerance, before
+# falling back to power iteration (see _krylov)
+MAX_KRYLOV_RUNS = 8
+
+def residual_norm(p_t_1, p_t, out=None, axis=None):
+    """ Return the L1 norm of p_t_1 - p_t (of each column, if axis is 0),
+    summed in float64 whatever the dtype of the vectors.
+
+    The subtraction is done in the vectors' own dtype, into out if it is
+    given: near convergence the two are close, so their difference is exact
+    (Sterbenz), and summing a float32 vector in float32 would instead add an
+    error that grows with the number of nodes, and can exceed
+    CONV_THRESHOLD.
+    """
+    diff = np.subtract(p_t_1, p_t, out=out)
+    np.absolute(diff, out=diff)
+    return diff.sum(axis=axis, dtype=np.float64)
+
+
+
+def next_p(operator, p_t, restart, out=None):
+    """ Calculate the next probability vector.
+
+    This is p^(t + 1) = operator * p^(t) + restart, where restart is r * p_0.
+    The result is written into out if it is given (so it must not be p_t).
+
+    p_t and restart may also be (number of nodes) x k matrices, with one
+    probability vector per column.
+
+    The product is computed in place when the operator (a CSR matrix, or a
+    dense array), p_t and out share a dtype and out is C-contiguous, and
+    into a temporary otherwise.
+    """
+    if out is None:
+        # C order, since the kernels below write to out's raw buffer
+        out = np.empty(p_t.shape, dtype=p_t.dtype)
+    in_place = (operator.dtype == p_t.dtype == out.dtype and
+                out.flags.c_contiguous)
+
+    if sp.issparse(operator):
+        if in_place and csr_matvec is not None and sp.isspmatrix_csr(operator):
+            # the sparsetools kernels accumulate operator * p_t into out, so
+            # this is a single matrix product plus an axpy with no
+            # temporaries
+            np.copyto(out, restart)
+            n = operator.shape[0]
+            if p_t.ndim == 1:
+                csr_matvec(n, n, operator.indptr, operator.indices,
+                           operator.data, np.ascontiguousarray(p_t), out)
+            else:
+                csr_matvecs(n, n, p_t.shape[1], operator.indptr,
+                            operator.indices, operator.data,
+                            np.ascontiguousarray(p_t).ravel(), out.ravel())
+            return out
+        np.copyto(out, operator.dot(p_t))
+    elif in_place:
+        np.dot(operator, p_t, out=out)
+    else:
+        out[...] = np.dot(operator, p_t)
+    out += restart
+    return out
+
+
+def power_iteration(operator, restart, p_init, trace=None):
+    """ Iterate from p_init until the L1 norm of the change in p drops below
+    CONV_THRESHOLD, and return the final probability vector and the number
+    of iterations taken.
+
+    p_init is usually p_0, but any starting vector converges to the same
+    result, so a nearby solution can be passed to warm-start the iteration.
+    """
+    diff_norm = 1
+    iterations = 0
+    # this needs to be a deep copy, since the caller may reuse p_init
+    p_t = np.array(p_init, dtype=operator.dtype)
+    # preallocate buffers, so nothing is allocated inside the loop
+    p_t_1 = np.empty_like(p_t)
+    diff = np.empty_like(p_t)
+
+    while (diff_norm > CONV_THRESHOLD):
+        # first, calculate p^(t + 1) from p^(t)
+        next_p(operator, p_t, restart, out=p_t_1)
+
+        # calculate L1 norm of difference between p^(t + 1) and p^(t),
+        # for checking the convergence condition
+        diff_norm = residual_norm(p_t_1, p_t, out=diff)
+        iterations += 1
+        if trace is not None:
+            trace.append(diff_norm)
+
+        # then, set p^(t) = p^(t + 1), and loop again if necessary
+        # swapping the buffers means p^(t) is overwritten next time
+        p_t, p_t_1 = p_t_1, p_t
+
+    return p_t, iterations
+
+
+def power_iteration_block(operator, restart, p_init):
+    """ Power iteration for a block of probability vectors (one per column).
+
+    The columns are iterated together using matrix-matrix products. Each
+    column is checked for convergence separately (using the same criterion
+    as power_iteration), and is dropped from the iteration once it has
+    converged. Returns the final probability vectors and the number of
+    iterations taken by each column.
+    """
+    p_t = np.array(p_init, dtype=operator.dtype)
+    iterations = np.zeros(p_t.shape[1], dtype=int)
+    # indices of the columns that have not converged yet
+    active = np.arange(p_t.shape[1])
+
+    while active.size:
+        p_t_1 = next_p(operator, p_t[:, active], restart[:, active])
+
+        # L1 norm of the difference for each column separately
+        diff_norms = residual_norm(p_t_1, p_t[:, active], axis=0)
+
+        p_t[:, active] = p_t_1
+        iterations[active] += 1
+        active = active[diff_norms > CONV_THRESHOLD]
+
+    return p_t, iterations
+
+
+def power_iteration_tissues(operator, og_prob, masks, scales, tissues,
+                            restart, p_init):
+    """ Power iteration for a block of (seed set, tissue) probability
+    vectors that all share one original graph operator.
+
+    operator is (1 - r) * og_matrix. Tissue t is a node mask masks[:, t]
+    (1 for expressed nodes, 0 otherwise) plus column scales scales[:, t], so
+    that its tissue-specific matrix applied to p is
+
+        masks[:, t] * (og_matrix * (scales[:, t] * p))
+
+    i.e. the column-normalized adjacency matrix with unexpressed nodes
+    removed, without ever building it. tissues[i] is the tissue of column i.
+    Both walks are done with a single product of operator with a block of
+    twice the number of active columns. Columns converge separately, as in
+    power_iteration_block.
+    """
+    p_t = np.array(p_init, dtype=operator.dtype)
+    iterations = np.zeros(p_t.shape[1], dtype=int)
+    active = np.arange(p_t.shape[1])
+
+    while active.size:
+        p_active = p_t[:, active]
+        k = active.size
+        walked = operator.dot(np.hstack(
+                (p_active, p_active * scales[:, tissues[active]])))
+        walked = np.asarray(walked)
+
+        p_t_1 = walked[:, :k] * og_prob
+        p_t_1 += walked[:, k:] * masks[:, tissues[active]] * (1 - og_prob)
+        p_t_1 += restart[:, active]
+
+        diff_norms = residual_norm(p_t_1, p_active, axis=0)
+
+        p_t[:, active] = p_t_1
+        iterations[active] += 1
+        active = active[diff_norms > CONV_THRESHOLD]
+
+    return p_t, iterations
+
+
+def triangular_solver(matrix):
+    """ Return a function that solves matrix * x = b, for a sparse (lower or
+    upper) triangular matrix with no zeros on its diagonal.
+
+    The matrix is factorized by SuperLU with no reordering and no pivoting,
+    which leaves a triangular matrix as it is (with no fill-in), so the
+    factorization is about as cheap as a copy, and each solve is a compiled
+    triangular solve, where spsolve_triangular loops over the rows in
+    Python.
+    """
+    from scipy.sparse.linalg import splu
+
+    return splu(sp.csc_matrix(matrix, dtype=np.float64),
+                permc_spec='NATURAL', diag_pivot_thresh=0).solve
+
+
+def gauss_seidel(operator, restart, p_init, trace=None):
+    """ Gauss-Seidel sweeps: each node's new probability is used as soon as
+    it is computed, within the same sweep.
+
+    With the operator split into its lower triangle (including the diagonal)
+    L and strict upper triangle U, each sweep solves
+    (I - L) p^(t + 1) = U p^(t) + restart. Convergence is checked in the
+    same way as power_iteration.
+    """
+    import scipy.linalg as la
+
+    if sp.issparse(operator):
+        upper = sp.csr_matrix(sp.triu(operator, 1))
+        solve_lower = triangular_solver(sp.identity(operator.shape[0]) -
+                                        sp.tril(operator))
+    else:
+        lower = np.identity(operator.shape[0]) - np.tril(operator)
+        upper = np.triu(operator, 1)
+        solve_lower = lambda rhs: la.solve_triangular(lower, rhs, lower=True)
+
+    diff_norm = 1
+    iterations = 0
+    p_t = np.array(p_init, dtype=np.float64)
+
+    while (diff_norm > CONV_THRESHOLD):
+        p_t_1 = solve_lower(upper.dot(p_t) + restart)
+        diff_norm = np.abs(p_t_1 - p_t).sum()
+        iterations += 1
+        if trace is not None:
+            trace.append(diff_norm)
+        p_t = p_t_1
+
+    return p_t, iterations
+
+
+def anderson(operator, restart, p_init, trace=None, memory=5):
+    """ Power iteration with Anderson extrapolation.
+
+    Each step combines the last `memory` power iteration steps, with weights
+    chosen to minimize the (least squares) residual. Convergence is checked
+    on the power iteration step from the current vector, i.e. the same L1
+    norm power_iteration checks, and the result is that step's output.
+    """
+    iterations = 0
+    p_t = np.array(p_init, dtype=np.float64)
+    g_t = next_p(operator, p_t, restart)
+    f_t = g_t - p_t
+    delta_f = []
+    delta_g = []
+
+    while (np.abs(f_t).sum() > CONV_THRESHOLD):
+        if delta_f:
+            # find the combination of previous steps that best cancels the
+            # current residual, and extrapolate with it
+            gamma = np.linalg.lstsq(np.column_stack(delta_f), f_t,
+                                    rcond=None)[0]
+            p_t_1 = g_t - np.column_stack(delta_g).dot(gamma)
+        else:
+            p_t_1 = g_t
+
+        g_t_1 = next_p(operator, p_t_1, restart)
+        f_t_1 = g_t_1 - p_t_1
+        delta_f = (delta_f + [f_t_1 - f_t])[-memory:]
+        delta_g = (delta_g + [g_t_1 - g_t])[-memory:]
+        p_t, g_t, f_t = p_t_1, g_t_1, f_t_1
+        iterations += 1
+        if trace is not None:
+            trace.append(np.abs(f_t).sum())
+
+    return g_t, iterations
+
+
+def _krylov(method, operator, restart, p_init, trace=None):
+    """ Solve (I - operator) p = restart with a scipy Krylov method (the
+    name of a function in scipy.sparse.linalg).
+
+    Krylov methods measure convergence with the 2-norm of the residual, so
+    the method is rerun (warm-started, with a tighter tolerance) until the
+    L1 norm of the residual, which is the change one power iteration step
+    would make, is below CONV_THRESHOLD. The trace holds this L1 residual
+    after each run of the method, rather than after each iteration.
+
+    If the method stalls (e.g. on rounding error) for MAX_KRYLOV_RUNS runs,
+    a warning is written to stderr, and power iteration, which always
+    converges, finishes from the method's last vector.
+    """
+    import scipy.sparse.linalg as spla
+
+    method = getattr(spla, method)
+    n = operator.shape[0]
+    system = spla.LinearOperator((n, n), dtype=np.float64,
+                            matvec=lambda x: x - operator.dot(x))
+    counter = [0]
+    def count(_):
+        counter[0] += 1
+
+    p_t = np.array(p_init, dtype=np.float64)
+    tolerance = CONV_THRESHOLD
+    for _ in xrange(MAX_KRYLOV_RUNS):
+        p_t, _ = method(system, restart, x0=p_t, tol=0, atol=tolerance,
+                        callback=count)
+        residual = next_p(operator, p_t, restart)
+        diff_norm = np.abs(residual - p_t).sum()
+        if trace is not None:
+            trace.append(diff_norm)
+        if diff_norm <= CONV_THRESHOLD:
+            return residual, counter[0]
+        tolerance /= 10
+
+    sys.stderr.write('{} did not converge after {} runs (L1 residual {:g}); '
+                     'finishing with power iteration\n'.format(
+                      method.__name__, MAX_KRYLOV_RUNS, diff_norm))
+    p_t, iterations = power_iteration(operator, restart, residual, trace)
+    return p_t, counter[0] + iterations
+
+
+def gmres(operator, restart, p_init, trace=None):
+    """ Restarted GMRES on the equivalent linear system (see _krylov). """
+    return _krylov('gmres', operator, restart, p_init, trace)
+
+
+def bicgstab(operator, restart, p_init, trace=None):
+    """ BiCGSTAB on the equivalent linear system (see _krylov). """
+    return _krylov('bicgstab', operator, restart, p_init, trace)
+
+
+# iterative schemes, by the name used for Walker's solver option
+SCHEMES = {
+    'power': power_iteration,
+    'gauss-seidel': gauss_seidel,
+    'anderson': anderson,
+    'gmres': gmres,
+    'bicgstab': bicgstab,
+}
@@ -0,0 +1,55 @@
+"""
+Shared set-up for the tests: the repo on the path, and a small synthetic
+network (see benchmarks/synthetic.py) written to a temporary directory
+
+"""
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.join(TESTS_DIR, '..')
+sys.path.append(REPO_DIR)
+sys.path.append(os.path.join(REPO_DIR, 'benchmarks'))
+
+import synthetic
+from run_walker import generate_seed_list
+
+# results of different solvers are compared to this, well above the error
+# left by iterating to CONV_THRESHOLD
+TOLERANCE = 1e-5
+
+class NetworkTestCase(unittest.TestCase):
+    """ Test case with a synthetic network of num_nodes nodes (in both
+    formats, with a low list and seed sets of 1, 5 and 20 nodes), generated
+    once for the class in self.files (see synthetic.generate), and a
+    scratch directory, self.tmp_dir, for each test.
+    """
+    num_nodes = 200
+
+    @classmethod
+    def setUpClass(cls):
+        cls.data_dir = tempfile.mkdtemp()
+        cls.files = synthetic.generate(cls.data_dir, cls.num_nodes)
+        cls.graph = cls.files['weighted']
+        cls.low_list = cls.files['low_list']
+        cls.seed = generate_seed_list(cls.files['seeds'][1])
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.data_dir, ignore_errors=True)
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def assertClose(self, actual, expected, tolerance=TOLERANCE):
+        """ Assert that two arrays agree to within tolerance everywhere. """
+        self.assertEqual(actual.shape, expected.shape)
+        error = abs(actual - expected).max()
+        self.assertLess(error, tolerance,
+                        'largest difference {:g}'.format(error))
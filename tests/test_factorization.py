@@ -0,0 +1,76 @@
+"""
+Tests for the direct solver's LU factorizations (factorization.py)
+
+"""
+import os
+import sys
+import unittest
+from StringIO import StringIO
+import numpy as np
+
+from helpers import NetworkTestCase
+from walker import Walker
+import factorization
+
+class FactorizationTest(NetworkTestCase):
+
+    def test_direct_matches_power(self):
+        for sparse in (False, True):
+            wk = Walker(self.graph, self.low_list, sparse=sparse)
+            expected = wk.solve(self.seed, 0.7, 0.1, 'power')
+            self.assertClose(wk.solve(self.seed, 0.7, 0.1, 'direct'),
+                             expected)
+
+    def test_orderings(self):
+        wk = Walker(self.graph, self.low_list, sparse=True)
+        expected = wk.solve(self.seed, 0.7, 0.1, 'power')
+        for permc_spec in ('MMD_AT_PLUS_A', 'MMD_ATA', 'COLAMD', 'NATURAL'):
+            wk = Walker(self.graph, self.low_list, sparse=True)
+            wk.permc_spec = permc_spec
+            self.assertClose(wk.solve(self.seed, 0.7, 0.1, 'direct'),
+                             expected)
+
+    def test_save_and_load(self):
+        filename = os.path.join(self.tmp_dir, 'factorization.npz')
+        for sparse in (False, True):
+            wk = Walker(self.graph, self.low_list, sparse=sparse)
+            expected = wk.solve(self.seed, 0.7, 0.1, 'direct')
+            wk.save_factorization(filename, 0.7, 0.1)
+
+            loaded = Walker(self.graph, self.low_list, sparse=sparse)
+            loaded_factorization = loaded.load_factorization(filename)
+            self.assertEqual(loaded_factorization.nodes, wk.nodes)
+            self.assertClose(loaded.solve(self.seed, 0.7, 0.1, 'direct'),
+                             expected, 1e-12)
+
+            # several right-hand sides at once
+            b = np.zeros((len(wk.nodes), 3))
+            b[:3, :3] = np.identity(3)
+            self.assertClose(loaded_factorization.solve(b),
+                             wk._get_factorization(0.7, 0.1).solve(b),
+                             1e-12)
+
+    def test_load_refuses_other_graph(self):
+        filename = os.path.join(self.tmp_dir, 'factorization.npz')
+        Walker(self.graph, self.low_list,
+               sparse=True).save_factorization(filename, 0.7, 0.1)
+        wk = Walker(self.graph, None, sparse=True)
+        with self.assertRaises(SystemExit):
+            wk.load_factorization(filename)
+
+    def test_fill_warning(self):
+        wk = Walker(self.graph, self.low_list, sparse=True)
+        stderr, sys.stderr = sys.stderr, StringIO()
+        max_fill, factorization.MAX_FILL = factorization.MAX_FILL, 0
+        try:
+            factorization.Factorization.factorize(
+                    wk._system_matrix(0.7, 0.1), 0.7, 0.1, wk.nodes)
+            warning = sys.stderr.getvalue()
+        finally:
+            sys.stderr = stderr
+            factorization.MAX_FILL = max_fill
+        self.assertIn('iterative solver', warning)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+"""
+Tests for the streaming network loader (graph_loader.read_edges)
+
+"""
+import os
+import unittest
+import networkx as nx
+
+from helpers import NetworkTestCase
+import graph_loader
+
+def networkx_edges(filename):
+    """ Parse a network file the way Walker did before graph_loader, into a
+    networkx graph.
+    """
+    G = nx.Graph()
+    with open(filename, 'r') as fp:
+        for line in fp:
+            split_line = line.rstrip().split('\t')
+            if len(split_line) > 3:
+                G.add_edge(split_line[1], split_line[3],
+                           weight=float(split_line[4]))
+            elif len(split_line) == 3:
+                G.add_edge(split_line[0], split_line[1],
+                           weight=float(split_line[2]))
+            elif len(split_line) == 2:
+                G.add_edge(split_line[0], split_line[1], weight=1.0)
+    return G
+
+
+class ReadEdgesTest(NetworkTestCase):
+
+    def write(self, text):
+        filename = os.path.join(self.tmp_dir, 'network.ppi')
+        with open(filename, 'w') as fp:
+            fp.write(text)
+        return filename
+
+    def assertMatchesNetworkx(self, filename):
+        nodes, rows, cols, weights = graph_loader.read_edges(filename)
+        G = networkx_edges(filename)
+        self.assertEqual(nodes, G.nodes())
+        edges = dict((frozenset((nodes[u], nodes[v])), weight)
+                     for u, v, weight in zip(rows, cols, weights))
+        self.assertEqual(len(edges), len(rows))
+        self.assertEqual(edges, dict((frozenset((u, v)), data['weight'])
+                                     for u, v, data in G.edges(data=True)))
+        self.assertTrue((rows <= cols).all())
+
+    def test_formats(self):
+        for fmt in ('hippie', 'weighted'):
+            self.assertMatchesNetworkx(self.files[fmt])
+        self.assertEqual(graph_loader.read_edges(self.files['hippie'])[0],
+                         graph_loader.read_edges(self.files['weighted'])[0])
+
+    def test_small_chunks(self):
+        expected = graph_loader.read_edges(self.graph)
+        chunk_bytes = graph_loader.CHUNK_BYTES
+        # less than a line, and a few lines
+        for size in (7, 100):
+            graph_loader.CHUNK_BYTES = size
+            try:
+                nodes, rows, cols, weights = graph_loader.read_edges(
+                        self.graph)
+            finally:
+                graph_loader.CHUNK_BYTES = chunk_bytes
+            self.assertEqual(nodes, expected[0])
+            for actual, array in zip((rows, cols, weights), expected[1:]):
+                self.assertTrue((actual == array).all())
+
+    def test_mixed_lines(self):
+        # trailing whitespace, Windows line endings, blank lines, every
+        # format and no newline at the end
+        filename = self.write('a\tb\t0.5 \r\n\nx\tb\tc\tc\t2\n'
+                              'c\td\n\t\nd\ta\t0.25')
+        self.assertMatchesNetworkx(filename)
+
+    def test_last_listing_wins(self):
+        filename = self.write('a\tb\t0.5\nb\tc\t1\nb\ta\t0.75\na\tb\t0.25\n'
+                              'c\tb\t3\n')
+        self.assertMatchesNetworkx(filename)
+        self.assertEqual(len(graph_loader.read_edges(filename)[1]), 2)
+
+    def test_no_edges(self):
+        for text in ('', '\n\nnode\n'):
+            with self.assertRaises(SystemExit):
+                graph_loader.read_edges(self.write(text))
+
+    def test_missing_file(self):
+        with self.assertRaises(SystemExit):
+            graph_loader.read_edges(os.path.join(self.tmp_dir, 'missing'))
+
+
+if __name__ == '__main__':
+    unittest.main()
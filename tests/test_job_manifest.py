@@ -0,0 +1,121 @@
+"""
+Tests for sharded, resumable jobs (job_manifest.py and run_jobs.py)
+
+"""
+import os
+import sys
+import fcntl
+import unittest
+import subprocess
+from StringIO import StringIO
+
+from helpers import NetworkTestCase, REPO_DIR
+from walker import Walker
+from job_manifest import JobManifest
+from run_jobs import run_shard
+
+# checks the status of shard 0 of the job in argv[1] from another process,
+# then claims it, and prints whether each found the shard claimed
+CLAIM_SCRIPT = """
+import sys
+from job_manifest import JobManifest
+job = JobManifest(sys.argv[1])
+status = job.is_claimed(0)
+sys.stdout.write('{} {}'.format(status, job.claim(0) is None))
+"""
+
+class JobManifestTest(NetworkTestCase):
+
+    def setUp(self):
+        NetworkTestCase.setUp(self)
+        self.wk = Walker(self.graph, self.low_list)
+        self.job = JobManifest.create(
+                os.path.join(self.tmp_dir, 'job'), self.wk.nodes, 3,
+                {'input_digest': self.wk.input_digest(), 'restart_prob': 0.7,
+                 'original_graph_prob': 0.1})
+
+    def claimed_elsewhere(self):
+        """ Return True if another process can not claim shard 0. """
+        process = subprocess.Popen(
+                [sys.executable, '-c', CLAIM_SCRIPT, self.job.path],
+                cwd=REPO_DIR, stdout=subprocess.PIPE)
+        stdout, _ = process.communicate()
+        self.assertEqual(process.returncode, 0)
+        status, claimed = stdout.split()
+        self.assertEqual(status, claimed)
+        return claimed == 'True'
+
+    def run_shards(self, shards):
+        """ Run the given shards, keeping their progress off stderr. """
+        stderr, sys.stderr = sys.stderr, StringIO()
+        try:
+            for shard in shards:
+                run_shard(self.wk, self.job, shard, 50)
+        finally:
+            sys.stderr = stderr
+
+    def test_shards(self):
+        self.assertEqual(self.job.shards, [(0, 66), (66, 133), (133, 200)])
+        self.assertEqual(self.job.seeds[:2], [[node] for node in
+                                              self.wk.nodes[:2]])
+        # creating the job again opens it
+        job = JobManifest.create(self.job.path, self.wk.nodes, 5, {})
+        self.assertEqual(job.shards, self.job.shards)
+        with self.assertRaises(SystemExit):
+            JobManifest.create(self.job.path, self.wk.nodes[::-1], 3, {})
+
+    def test_claim(self):
+        self.assertFalse(self.claimed_elsewhere())
+        lock_fp = self.job.claim(0)
+        self.assertIsNotNone(lock_fp)
+        try:
+            self.assertTrue(self.claimed_elsewhere())
+        finally:
+            lock_fp.close()
+        self.assertFalse(self.claimed_elsewhere())
+
+    def test_status_does_not_lock(self):
+        lockf = fcntl.lockf
+        def fail(*args):
+            self.fail('status took a lock')
+        fcntl.lockf = fail
+        try:
+            status = self.job.status()
+        finally:
+            fcntl.lockf = lockf
+        self.assertEqual(status, [(0, 66, False), (0, 67, False),
+                                  (0, 67, False)])
+
+    def test_merge(self):
+        self.run_shards(xrange(len(self.job.shards)))
+        merged = self.job.merge(os.path.join(self.tmp_dir, 'merged'))
+        self.assertTrue(merged.is_complete())
+        self.assertEqual(merged.params['input_digest'],
+                         self.wk.input_digest())
+        expected = self.wk.run_batch(self.job.seeds, 0.7, 0.1)
+        self.assertClose(merged.rows.T, expected)
+
+    def test_merge_refuses_incomplete(self):
+        self.run_shards([0, 1])
+        with self.assertRaises(SystemExit):
+            self.job.merge(os.path.join(self.tmp_dir, 'merged'))
+
+    def test_resume(self):
+        self.run_shards(xrange(len(self.job.shards)))
+        # as if shard 1 crashed after its first batch
+        start, stop = self.job.shards[1]
+        self.job.checkpoint(1, range(start, start + 50))
+        store = self.job.shard_store(1)
+        store.rows[50:] = 0
+        store.rows.flush()
+        self.assertEqual(self.job.pending(1), range(start + 50, stop))
+
+        self.run_shards([1])
+        self.assertEqual(self.job.pending(1), [])
+        merged = self.job.merge(os.path.join(self.tmp_dir, 'merged'))
+        expected = self.wk.run_batch(self.job.seeds, 0.7, 0.1)
+        self.assertClose(merged.rows.T, expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+"""
+Tests for node knockouts without rebuilding the graph (Walker.run_knockouts)
+
+"""
+import os
+import shutil
+import unittest
+import numpy as np
+
+from helpers import NetworkTestCase
+from walker import Walker
+from graph_loader import connects
+
+class KnockoutTest(NetworkTestCase):
+
+    def setUp(self):
+        NetworkTestCase.setUp(self)
+        # a chain hanging off the network, which knocking out p1 cuts off,
+        # and a separate small component
+        self.network = os.path.join(self.tmp_dir, 'network.ppi')
+        shutil.copy(self.graph, self.network)
+        with open(self.network, 'a') as fp:
+            fp.write('p1\t{}\t1\np2\tp1\t1\nx1\tx2\t1\n'.format(self.seed[0]))
+
+    def knockouts(self, wk):
+        hub = wk.nodes[int(np.argmax(wk._degrees))]
+        return [[hub], [self.seed[0]], ['p1'], ['x1'], ['not_a_node'],
+                wk.nodes[10:15]]
+
+    def test_matches_rebuild(self):
+        for low_list in (None, self.low_list):
+            for sparse in (False, True):
+                wk = Walker(self.network, low_list, sparse=sparse)
+                knockouts = self.knockouts(wk)
+                results, _, kept = wk.run_knockouts(self.seed, knockouts,
+                                                    0.7, 0.1)
+
+                for idx, knockout in enumerate(knockouts):
+                    rebuilt = Walker(self.network, low_list, knockout,
+                                     sparse=sparse)
+                    indices = [wk.node_index[node] for node in rebuilt.nodes]
+                    self.assertEqual(sorted(indices),
+                                     list(np.flatnonzero(kept[:, idx])))
+                    seed = [node for node in self.seed
+                            if node in rebuilt.node_index]
+                    self.assertClose(results[indices, idx],
+                                     rebuilt.solve(seed, 0.7, 0.1))
+                    self.assertFalse(results[~kept[:, idx], idx].any())
+
+    def test_operator_restored(self):
+        for sparse in (False, True):
+            wk = Walker(self.network, self.low_list, sparse=sparse)
+            operator = wk.operator(0.7, 0.1)
+            before = operator.toarray() if sparse else operator.copy()
+            wk.run_knockouts(self.seed, self.knockouts(wk), 0.7, 0.1)
+            after = operator.toarray() if sparse else operator
+            self.assertTrue((before == after).all())
+
+    def test_cut_off_nodes_dropped(self):
+        wk = Walker(self.network, None, sparse=True)
+        keep = wk.knockout_mask(['p1'])
+        self.assertFalse(keep[wk.node_index['p2']])
+        self.assertFalse(keep[wk.node_index['x1']])
+        self.assertEqual(keep.sum(), self.num_nodes)
+
+    def test_connects(self):
+        wk = Walker(self.network, None, sparse=True)
+        keep = np.ones(len(wk.nodes), dtype=bool)
+        p1, p2 = wk.node_index['p1'], wk.node_index['p2']
+        seed = wk.node_index[self.seed[0]]
+        self.assertTrue(connects(wk.og_matrix, [p2, seed], keep))
+        self.assertFalse(connects(wk.og_matrix, [p2, wk.node_index['x1']],
+                                  keep))
+        keep[p1] = False
+        self.assertFalse(connects(wk.og_matrix, [p2, seed], keep))
+        self.assertTrue(connects(wk.og_matrix.toarray(), [seed], keep))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+"""
+Tests for the Monte Carlo estimates of the walk (monte_carlo.py)
+
+"""
+import unittest
+import numpy as np
+
+from helpers import NetworkTestCase
+import monte_carlo
+from monte_carlo import MonteCarloWalker
+
+class MonteCarloTest(NetworkTestCase):
+
+    def setUp(self):
+        NetworkTestCase.setUp(self)
+        # small batches, so a few thousand walks span several rounds
+        self.batch_walks = monte_carlo.BATCH_WALKS
+        monte_carlo.BATCH_WALKS = 1000
+        self.mc = MonteCarloWalker(self.graph, self.low_list)
+
+    def tearDown(self):
+        monte_carlo.BATCH_WALKS = self.batch_walks
+        NetworkTestCase.tearDown(self)
+
+    def test_max_walks(self):
+        for max_walks in (500, 1000, 4500):
+            expected = None
+            for processes in (1, 2, 3):
+                estimate = self.mc.estimate(self.seed, 0.7, 0.1, max_walks,
+                                            processes)
+                self.assertEqual(estimate[3], max_walks)
+                if expected is None:
+                    expected = estimate
+                for actual, array in zip(estimate[:3], expected[:3]):
+                    self.assertTrue((actual == array).all())
+
+    def test_top_k_independent_of_processes(self):
+        expected = None
+        for processes in (1, 2, 4):
+            estimate = self.mc.estimate(self.seed, 0.7, 0.1, 50000,
+                                        processes, top_k=3, stable_rounds=2,
+                                        exclude_seeds=True)
+            self.assertLess(estimate[3], 50000)
+            self.assertEqual(estimate[3] % 1000, 0)
+            if expected is None:
+                expected = estimate
+            self.assertEqual(estimate[3], expected[3])
+            self.assertTrue((estimate[0] == expected[0]).all())
+
+
+if __name__ == '__main__':
+    unittest.main()
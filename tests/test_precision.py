@@ -0,0 +1,58 @@
+"""
+Tests for float32 runs checked against float64 (run_walker.py
+--validate_precision, metrics.precision_report)
+
+"""
+import os
+import sys
+import unittest
+import subprocess
+import numpy as np
+
+from helpers import NetworkTestCase, REPO_DIR
+from metrics import precision_report, precision_tolerance
+
+class PrecisionTest(NetworkTestCase):
+
+    def validate(self, *args):
+        """ Run run_walker.py --float32 --validate_precision, and return the
+        report it writes to stderr.
+        """
+        process = subprocess.Popen(
+                [sys.executable, os.path.join(REPO_DIR, 'run_walker.py'),
+                 self.graph, self.files['seeds'][1], '-l', self.low_list,
+                 '--float32', '--validate_precision'] + list(args),
+                stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        _, stderr = process.communicate()
+        self.assertEqual(process.returncode, 0, stderr)
+        self.assertNotIn('Warning', stderr)
+        return dict(line.split('\t') for line in stderr.splitlines())
+
+    def test_within_tolerance(self):
+        for args in ([], ['-s'], ['-s', '-e', '0.3', '-k', '20']):
+            report = self.validate(*args)
+            self.assertEqual(report['within_tolerance'], 'True')
+            self.assertLessEqual(float(report['max_abs_error']),
+                                 float(report['tolerance']))
+            self.assertEqual(float(report['top_k_overlap']), 1.0)
+
+    def test_report(self):
+        reference = np.array([0.5, 0.3, 0.2, 0.0])
+        tolerance = precision_tolerance(reference, 0.7)
+        report = precision_report(reference, reference + tolerance / 2, 2,
+                                  tolerance)
+        self.assertTrue(report['within_tolerance'])
+        self.assertTrue(report['top_k_same_order'])
+        self.assertIsNone(report['first_rank_change'])
+
+        result = np.array([0.3, 0.5, 0.2, 0.0])
+        report = precision_report(reference, result, 2, tolerance)
+        self.assertFalse(report['within_tolerance'])
+        self.assertEqual(report['first_rank_change'], 0)
+        self.assertEqual(report['top_k_overlap'], 1.0)
+        self.assertEqual(report['top_k_max_rank_shift'], 1)
+        self.assertNotIn('tolerance', precision_report(reference, result))
+
+
+if __name__ == '__main__':
+    unittest.main()
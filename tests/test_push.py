@@ -0,0 +1,54 @@
+"""
+Tests for approximate walks by forward push (push.py, Walker.approximate)
+
+"""
+import sys
+import unittest
+from StringIO import StringIO
+import numpy as np
+
+from helpers import NetworkTestCase
+from walker import Walker
+
+# slack for the bounds, for the rounding error of the exact solve
+ROUNDING = 1e-12
+
+class PushTest(NetworkTestCase):
+
+    def test_bounds(self):
+        for low_list in (None, self.low_list):
+            for sparse in (False, True):
+                wk = Walker(self.graph, low_list, sparse=sparse)
+                exact = wk.solve(self.seed, 0.7, 0.1, 'direct')
+                for tolerance in (1e-3, 1e-5):
+                    estimate, upper = wk.approximate(self.seed, 0.7, 0.1,
+                                                     tolerance)
+                    self.assertTrue((estimate <= exact + ROUNDING).all())
+                    self.assertTrue((exact <= upper + ROUNDING).all())
+
+    def test_top_k(self):
+        wk = Walker(self.graph, self.low_list, sparse=True)
+        exact = wk.solve(self.seed, 0.7, 0.1, 'direct')
+        estimate, _ = wk.approximate(self.seed, 0.7, 0.1, 1e-10)
+        self.assertClose(estimate, exact, 1e-8)
+        order = np.argsort(-exact, kind='mergesort')
+        self.assertEqual(list(np.argsort(-estimate, kind='mergesort')[:20]),
+                         list(order[:20]))
+
+        # when the bounds guarantee the top k, it is the exact top k
+        stdout, sys.stdout = sys.stdout, StringIO()
+        try:
+            certain = wk.run_push(self.seed, 0.7, 0.1, tolerance=1e-6,
+                                  top_k=10, exclude_seeds=True)
+            output = sys.stdout.getvalue()
+        finally:
+            sys.stdout = stdout
+        self.assertTrue(certain)
+        seeds = set(wk.node_index[node] for node in self.seed)
+        expected = [wk.nodes[idx] for idx in order if idx not in seeds][:10]
+        self.assertEqual([line.split('\t')[0]
+                          for line in output.splitlines()], expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
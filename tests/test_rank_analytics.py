@@ -0,0 +1,108 @@
+"""
+Tests for the ranking scripts (scripts/rank_analytics.py,
+generate_rankings.py and generate_difference.py), against the output of the
+scripts they replaced (in tests/data/rank_analytics)
+
+"""
+import os
+import sys
+import unittest
+import subprocess
+import numpy as np
+
+from helpers import NetworkTestCase, TESTS_DIR, REPO_DIR
+
+sys.path.append(os.path.join(REPO_DIR, 'scripts'))
+import rank_analytics as ra
+
+SEEDS = ['1', '2', '3', '4']
+TISSUES = ['14', '20', '22', '33', '46', '51']
+GENES = [str(gene) for gene in xrange(100, 124)]
+EXPECTED_DIR = os.path.join(TESTS_DIR, 'data', 'rank_analytics')
+
+def write_predictions(output_dir, random_seed=0):
+    """ Write a prediction directory, a seed directory (two genes per seed)
+    and a mapping file, for the default seeds and tissues of the scripts.
+    Every file ranks all of GENES, so each has 22 genes besides the seed's,
+    and the top 25 of every tissue covers them all.
+    """
+    rng = np.random.RandomState(random_seed)
+    pred_dir = os.path.join(output_dir, 'predictions')
+    seed_dir = os.path.join(output_dir, 'seeds')
+    os.makedirs(pred_dir)
+    os.makedirs(seed_dir)
+    for seed in SEEDS:
+        with open(os.path.join(seed_dir, 'seed{}.asso'.format(seed)),
+                  'w') as fp:
+            for gene in rng.choice(GENES, 2, replace=False):
+                fp.write('disease{}\t{}\n'.format(seed, gene))
+        for tissue in TISSUES:
+            with open(os.path.join(pred_dir, 'seed.{}.tis.{}.rwr'.format(
+                                   seed, tissue)), 'w') as fp:
+                fp.write(''.join('{}\n'.format(gene)
+                                 for gene in rng.permutation(GENES)))
+
+    mapping = os.path.join(output_dir, 'mapping.txt')
+    with open(mapping, 'w') as fp:
+        fp.write(''.join('{}\tGENE{}\n'.format(gene, gene) for gene in GENES))
+    return pred_dir, seed_dir, mapping
+
+
+def diff_lines(filename):
+    """ Return the header and lines of a rankdiff file, with the lines of
+    genes tied on their difference in gene ID order.
+    """
+    with open(filename, 'r') as fp:
+        lines = fp.read().splitlines()
+    return lines[0], sorted(lines[1:], key=lambda line: (
+            -int(line.split('\t')[2]), line.split('\t')[0]))
+
+
+class RankAnalyticsTest(NetworkTestCase):
+
+    def setUp(self):
+        NetworkTestCase.setUp(self)
+        self.inputs = write_predictions(self.tmp_dir)
+
+    def run_script(self, name):
+        process = subprocess.Popen(
+                [sys.executable, os.path.join(REPO_DIR, 'scripts', name)] +
+                list(self.inputs), cwd=self.tmp_dir)
+        process.communicate()
+        self.assertEqual(process.returncode, 0)
+
+    def test_toprank(self):
+        self.run_script('generate_rankings.py')
+        for seed in SEEDS:
+            name = 'seed{}.toprank'.format(seed)
+            with open(os.path.join(self.tmp_dir, name), 'r') as fp:
+                actual = fp.read()
+            with open(os.path.join(EXPECTED_DIR, name), 'r') as fp:
+                self.assertEqual(actual, fp.read())
+
+    def test_rankdiff(self):
+        # the old script wrote genes tied on their difference in dict order
+        self.run_script('generate_difference.py')
+        for seed in SEEDS:
+            name = 'seed{}.rankdiff'.format(seed)
+            self.assertEqual(diff_lines(os.path.join(self.tmp_dir, name)),
+                             diff_lines(os.path.join(EXPECTED_DIR, name)))
+
+    def test_rankdiff_ties(self):
+        genes, positions = ra.load_results(self.inputs[0], SEEDS, TISSUES)
+        seeds = [ra.read_seed(os.path.join(self.inputs[1],
+                                           'seed{}.asso'.format(seed)))
+                 for seed in SEEDS]
+        ranks = ra.seed_filtered_ranks(genes, positions, seeds)
+        ranked = np.isfinite(ra.seed_filtered_positions(genes, positions,
+                                                        seeds))
+        orders, diffs = ra.rank_differences(ranks, 25, ranked)
+        for order, seed_diffs in zip(orders, diffs):
+            # largest difference first, and ties in gene order
+            keys = [(-seed_diffs[idx], idx) for idx in order]
+            self.assertEqual(keys, sorted(keys))
+            self.assertEqual(len(order), len(GENES) - 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+"""
+Tests for answering seed sets from a result store (Walker.attach_store), and
+for refusing stores built from other inputs
+
+"""
+import os
+import shutil
+import unittest
+
+from helpers import NetworkTestCase
+from walker import Walker
+from result_store import ResultStore
+
+class StoreTest(NetworkTestCase):
+
+    def create_store(self, wk, mode='r+'):
+        """ Create an empty all-pairs store for wk, as run_all_pairs.py
+        would, and reopen it in mode.
+        """
+        path = os.path.join(self.tmp_dir, 'store')
+        ResultStore.create(path, wk.nodes, params={
+                'input_digest': wk.input_digest(), 'restart_prob': 0.7,
+                'original_graph_prob': 0.1})
+        return ResultStore(path, mode)
+
+    def test_answers_from_store(self):
+        wk = Walker(self.graph, self.low_list)
+        expected = wk.solve(self.seed, 0.7, 0.1)
+        store = self.create_store(wk)
+        wk.attach_store(store)
+        self.assertClose(wk.solve(self.seed, 0.7, 0.1), expected)
+        self.assertEqual(store.num_filled(), len(self.seed))
+
+        # answered from the rows written by the first solve
+        wk = Walker(self.graph, self.low_list)
+        wk.attach_store(self.create_store(wk, 'r'))
+        self.assertClose(wk.solve(self.seed, 0.7, 0.1), expected)
+
+    def test_refuses_other_low_list(self):
+        store = self.create_store(Walker(self.graph, self.low_list))
+        for low_list in (None, self.files['weighted']):
+            wk = Walker(self.graph, low_list)
+            with self.assertRaises(SystemExit):
+                wk.attach_store(store)
+
+    def test_refuses_other_removed_nodes(self):
+        store = self.create_store(Walker(self.graph, self.low_list))
+        # not in the graph, so the nodes are the same
+        wk = Walker(self.graph, self.low_list, ['not_a_node'])
+        with self.assertRaises(SystemExit):
+            wk.attach_store(store)
+
+    def test_refuses_changed_graph(self):
+        graph = os.path.join(self.tmp_dir, 'network.ppi')
+        shutil.copy(self.graph, graph)
+        store = self.create_store(Walker(graph, self.low_list))
+
+        # the same file name and nodes, but one weight changed
+        with open(graph, 'r') as fp:
+            lines = fp.readlines()
+        first, second, _ = lines[0].split('\t')
+        lines[0] = '{}\t{}\t0.01\n'.format(first, second)
+        with open(graph, 'w') as fp:
+            fp.writelines(lines)
+        wk = Walker(graph, self.low_list)
+        with self.assertRaises(SystemExit):
+            wk.attach_store(store)
+
+    def test_refuses_after_edge_update(self):
+        wk = Walker(self.graph, self.low_list)
+        wk.attach_store(self.create_store(wk))
+        wk.update_edges([(wk.nodes[0], wk.nodes[1], 2.0)])
+        with self.assertRaises(SystemExit):
+            wk.solve(self.seed, 0.7, 0.1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+"""
+Tests for the query server (walker_server.py)
+
+"""
+import json
+import httplib
+import unittest
+import threading
+from StringIO import StringIO
+
+from helpers import NetworkTestCase
+from walker import Walker
+from walker_server import WalkerServer, WalkerHandler, ResultCache
+
+class ServerTest(NetworkTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super(ServerTest, cls).setUpClass()
+        # keep the request log out of the test output
+        WalkerHandler.log_message = lambda handler, *args: None
+        cls.walker = Walker(cls.graph, cls.low_list, max_operators=1)
+        # port 0 picks a free port
+        cls.server = WalkerServer(('127.0.0.1', 0), {'ppi': cls.walker},
+                                  ResultCache(2))
+        cls.thread = threading.Thread(target=cls.server.serve_forever)
+        cls.thread.daemon = True
+        cls.thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        del WalkerHandler.log_message
+        super(ServerTest, cls).tearDownClass()
+
+    def post(self, query):
+        """ POST a query (or a raw body), and return the status and body. """
+        connection = httplib.HTTPConnection(*self.server.server_address)
+        body = query if isinstance(query, str) else json.dumps(query)
+        connection.request('POST', '/walk', body)
+        response = connection.getresponse()
+        result = response.status, response.read()
+        connection.close()
+        return result
+
+    def test_query(self):
+        status, body = self.post({'seed': self.seed, 'top_k': 10,
+                                  'exclude_seeds': True})
+        self.assertEqual(status, 200)
+
+        expected = StringIO()
+        wk = Walker(self.graph, self.low_list)
+        wk.write_results(wk.solve(self.seed, 0.7, 0.1), expected, top_k=10,
+                         exclude=self.seed)
+        self.assertEqual(body, expected.getvalue())
+
+    def test_malformed_queries(self):
+        node = self.seed[0]
+        for query in ('not json', [node], {}, {'seed': []},
+                      {'seed': node}, {'seed': ['not_a_node']},
+                      {'seed': [node], 'graph': 'other'},
+                      {'seed': [node], 'node_list': ['not_a_node']},
+                      {'seed': [node], 'node_list': node},
+                      {'seed': [node], 'top_k': 0},
+                      {'seed': [node], 'top_k': 2.5},
+                      {'seed': [node], 'top_k': '10'},
+                      {'seed': [node], 'top_k': True},
+                      {'seed': [node], 'restart_prob': 0},
+                      {'seed': [node], 'restart_prob': 1.5},
+                      {'seed': [node], 'original_graph_prob': -1},
+                      {'seed': [node], 'exclude_seeds': 'yes'}):
+            status, _ = self.post(query)
+            self.assertEqual(status, 400, 'query {!r}'.format(query))
+
+    def test_operators_bounded(self):
+        for restart_prob in (0.5, 0.6, 0.7, 0.8):
+            status, _ = self.post({'seed': self.seed, 'top_k': 1,
+                                   'restart_prob': restart_prob})
+            self.assertEqual(status, 200)
+            self.assertLessEqual(len(self.walker._operators), 1)
+
+
+class ResultCacheTest(unittest.TestCase):
+
+    def test_evicts_least_recently_used(self):
+        cache = ResultCache(2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        cache.get('a')
+        cache.put('c', 3)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+"""
+Tests for the iteration kernels and solvers (solvers.py)
+
+"""
+import os
+import sys
+import unittest
+import subprocess
+from StringIO import StringIO
+import numpy as np
+import scipy.sparse as sp
+import scipy.sparse.linalg as spla
+
+from helpers import NetworkTestCase, REPO_DIR
+from walker import Walker
+import solvers
+
+class NextPTest(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        self.operator = sp.random(50, 50, density=0.1, format='csr',
+                                  random_state=rng)
+        self.p_t = rng.random_sample((50, 4))
+        self.restart = rng.random_sample((50, 4))
+        self.expected = self.operator.toarray().dot(self.p_t) + self.restart
+
+    def operators(self, dtype):
+        operator = self.operator.astype(dtype)
+        return [operator, operator.tocsc(), operator.toarray()]
+
+    def test_mixed_dtypes(self):
+        for operator_dtype, vector_dtype in ((np.float64, np.float32),
+                                             (np.float32, np.float64)):
+            p_t = self.p_t.astype(vector_dtype)
+            restart = self.restart.astype(vector_dtype)
+            for operator in self.operators(operator_dtype):
+                out = solvers.next_p(operator, p_t, restart)
+                self.assertEqual(out.dtype, vector_dtype)
+                self.assertLess(abs(out - self.expected).max(), 1e-5)
+                out = solvers.next_p(operator, p_t[:, 0], restart[:, 0])
+                self.assertLess(abs(out - self.expected[:, 0]).max(), 1e-5)
+
+    def test_non_contiguous_out(self):
+        for operator in self.operators(np.float64):
+            # every other column of a larger array, a Fortran-ordered
+            # array, and a column of a C-ordered one
+            out = np.zeros((50, 8))[:, ::2]
+            solvers.next_p(operator, self.p_t, self.restart, out)
+            self.assertLess(abs(out - self.expected).max(), 1e-12)
+
+            out = np.zeros((50, 4), order='F')
+            solvers.next_p(operator, self.p_t, self.restart, out)
+            self.assertLess(abs(out - self.expected).max(), 1e-12)
+
+            out = np.zeros((50, 3))[:, 1]
+            solvers.next_p(operator, self.p_t[:, 0], self.restart[:, 0],
+                           out)
+            self.assertLess(abs(out - self.expected[:, 0]).max(), 1e-12)
+
+    def test_without_kernels(self):
+        kernels = solvers.csr_matvec, solvers.csr_matvecs
+        solvers.csr_matvec = solvers.csr_matvecs = None
+        try:
+            out = solvers.next_p(self.operator, self.p_t, self.restart)
+        finally:
+            solvers.csr_matvec, solvers.csr_matvecs = kernels
+        self.assertLess(abs(out - self.expected).max(), 1e-12)
+
+
+class SolverTest(NetworkTestCase):
+
+    def test_schemes_match_power(self):
+        for low_list in (None, self.low_list):
+            for sparse in (False, True):
+                wk = Walker(self.graph, low_list, sparse=sparse)
+                expected = wk.solve(self.seed, 0.7, 0.1, 'power')
+                for solver in sorted(solvers.SCHEMES):
+                    self.assertClose(wk.solve(self.seed, 0.7, 0.1, solver),
+                                     expected)
+
+    def test_float32(self):
+        expected = Walker(self.graph, self.low_list).solve(self.seed, 0.7,
+                                                           0.1)
+        for sparse in (False, True):
+            wk = Walker(self.graph, self.low_list, sparse=sparse,
+                        dtype=np.float32)
+            for solver in sorted(solvers.SCHEMES):
+                self.assertClose(wk.solve(self.seed, 0.7, 0.1, solver),
+                                 expected)
+
+    def test_krylov_fallback(self):
+        # a method that never moves, so every run stalls
+        spla.stall = lambda system, b, x0, tol, atol, callback: (x0, 1)
+        wk = Walker(self.graph, self.low_list, sparse=True)
+        expected = wk.solve(self.seed, 0.7, 0.1, 'power')
+        p_0 = wk._set_up_p0(self.seed)
+        stderr, sys.stderr = sys.stderr, StringIO()
+        try:
+            p_t, _ = solvers._krylov('stall', wk.operator(0.7, 0.1),
+                                     p_0 * 0.7, p_0)
+            warning = sys.stderr.getvalue()
+        finally:
+            sys.stderr = stderr
+            del spla.stall
+        self.assertIn('power iteration', warning)
+        self.assertClose(p_t, expected)
+
+    def test_sweep_needs_iterative_solver(self):
+        sweep = os.path.join(self.tmp_dir, 'sweep.txt')
+        with open(sweep, 'w') as fp:
+            fp.write('0.7\t0.1\n0.5\t0.1\n')
+        process = subprocess.Popen(
+                [sys.executable, os.path.join(REPO_DIR, 'run_walker.py'),
+                 self.graph, self.files['seeds'][1], '--sweep', sweep,
+                 '--solver', 'direct'],
+                stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        _, stderr = process.communicate()
+        self.assertNotEqual(process.returncode, 0)
+        self.assertIn('iterative solver', stderr)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+"""
+Tests for solving several tissues at once (Walker.run_tissues)
+
+"""
+import os
+import unittest
+import numpy as np
+
+from helpers import NetworkTestCase
+from walker import Walker
+from run_walker import generate_seed_list
+import synthetic
+
+class TissuesTest(NetworkTestCase):
+
+    def setUp(self):
+        NetworkTestCase.setUp(self)
+        self.low_lists = [self.low_list]
+        # another tissue, and one with most nodes unexpressed, so some
+        # expressed nodes have no expressed neighbours
+        for idx, low_fraction in enumerate((0.2, 0.8)):
+            low_list = os.path.join(self.tmp_dir, 'low_{}.txt'.format(idx))
+            rng = np.random.RandomState(idx + 1)
+            fraction, synthetic.LOW_FRACTION = (synthetic.LOW_FRACTION,
+                                                low_fraction)
+            try:
+                synthetic.write_low_list(low_list, self.num_nodes, rng)
+            finally:
+                synthetic.LOW_FRACTION = fraction
+            self.low_lists.append(low_list)
+        self.sources = [generate_seed_list(seed_file)
+                        for seed_file in self.files['seeds']]
+
+    def test_matches_low_list_runs(self):
+        for sparse in (False, True):
+            wk = Walker(self.graph, None, sparse=sparse)
+            results = wk.run_tissues(self.sources, self.low_lists, 0.7, 0.1)
+            self.assertEqual(results.shape, (len(wk.nodes), len(self.sources),
+                                             len(self.low_lists)))
+
+            for tissue, low_list in enumerate(self.low_lists):
+                tissue_wk = Walker(self.graph, low_list, sparse=sparse)
+                self.assertEqual(tissue_wk.nodes, wk.nodes)
+                for idx, source in enumerate(self.sources):
+                    self.assertClose(results[:, idx, tissue],
+                                     tissue_wk.solve(source, 0.7, 0.1))
+
+    def test_original_graph_only(self):
+        wk = Walker(self.graph, None)
+        results = wk.run_tissues(self.sources, self.low_lists, 0.7, 1.0)
+        for idx, source in enumerate(self.sources):
+            expected = wk.solve(source, 0.7, 0.1)
+            for tissue in xrange(len(self.low_lists)):
+                self.assertClose(results[:, idx, tissue], expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
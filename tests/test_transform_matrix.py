@@ -0,0 +1,59 @@
+"""
+Tests for the tiled reciprocal symmetrization (scripts/transform_matrix.py)
+
+"""
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+from helpers import REPO_DIR
+
+sys.path.append(os.path.join(REPO_DIR, 'scripts'))
+import transform_matrix
+
+class TransformTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.matrix = np.random.RandomState(0).uniform(0.01, 1, (10, 10))
+        self.expected = 1 / self.matrix + (1 / self.matrix).T
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_tiles(self):
+        # a block size that does not divide 10, one that does, and one
+        # tile for the whole matrix
+        for block_size in (3, 5, 10, 16):
+            output = np.zeros_like(self.matrix)
+            transform_matrix.transform(self.matrix, output, block_size)
+            self.assertTrue(np.allclose(output, self.expected, rtol=1e-12))
+
+    def test_files(self):
+        np.save(os.path.join(self.tmp_dir, 'matrix.npy'), self.matrix)
+        np.savetxt(os.path.join(self.tmp_dir, 'matrix.txt'), self.matrix)
+        for input_name, output_name in (('matrix.npy', 'out.npy'),
+                                        ('matrix.txt', 'out.txt')):
+            output_file = os.path.join(self.tmp_dir, output_name)
+            transform_matrix.main(['transform_matrix.py',
+                                   os.path.join(self.tmp_dir, input_name),
+                                   output_file, '3'])
+            if output_name.endswith('.npy'):
+                output = np.load(output_file)
+            else:
+                output = np.loadtxt(output_file)
+            self.assertLess(abs(output - self.expected).max(), 1e-9)
+
+    def test_zero_entry(self):
+        self.matrix[7, 2] = 0
+        with self.assertRaises(SystemExit) as context:
+            transform_matrix.transform(self.matrix,
+                                       np.zeros_like(self.matrix), 3)
+        self.assertIn('(7, 2)', str(context.exception))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,205 @@
+"""
+Tests for updating a Walker and its result stores after edge changes
+(Walker.update_edges and Walker.update_store)
+
+"""
+import os
+import sys
+import unittest
+from collections import OrderedDict
+from StringIO import StringIO
+import numpy as np
+import scipy.sparse as sp
+
+from helpers import NetworkTestCase
+from walker import Walker
+from result_store import ResultStore
+
+def dense(matrix):
+    """ Return a (sparse or dense) matrix as an array. """
+    return matrix.toarray() if sp.issparse(matrix) else np.asarray(matrix)
+
+
+class UpdateTest(NetworkTestCase):
+
+    def setUp(self):
+        NetworkTestCase.setUp(self)
+        wk = Walker(self.graph, self.low_list)
+        with open(self.graph, 'r') as fp:
+            lines = [line.split('\t')[:2] for line in fp]
+        # every node has several edges, so both nodes of the last edge are
+        # listed before it, and deleting it keeps the node order
+        (a, b), (c, d) = lines[0], lines[-1]
+        # a pair of nodes with no edge between them
+        absent = np.argwhere(dense(wk.og_matrix) == 0)
+        e, f = [wk.nodes[idx] for idx in absent[absent[:, 0] !=
+                                                absent[:, 1]][0]]
+        # reweight, delete, insert, and insert an edge to a new node
+        self.changes = [(a, b, 0.5), (d, c, 0), (e, f, 0.8)]
+        self.new_node_changes = self.changes + [('new', a, 1.0)]
+
+    def write_release(self, changes, sort=False):
+        """ Write the whole network with the changes applied, in the order
+        of the input graph (with new edges last), or sorted by node.
+        """
+        weights = OrderedDict()
+        with open(self.graph, 'r') as fp:
+            for line in fp:
+                u, v, weight = line.split('\t')
+                weights[tuple(sorted((u, v)))] = float(weight)
+        for u, v, weight in changes:
+            weights[tuple(sorted((u, v)))] = weight
+        edges = weights.items()
+        if sort:
+            edges.sort()
+
+        release = os.path.join(self.tmp_dir, 'release.ppi')
+        with open(release, 'w') as fp:
+            for (u, v), weight in edges:
+                if weight:
+                    fp.write('{}\t{}\t{}\n'.format(u, v, weight))
+        return release
+
+    def assertSameGraph(self, updated, rebuilt):
+        self.assertEqual(sorted(updated.nodes), sorted(rebuilt.nodes))
+        order = [rebuilt.node_index[node] for node in updated.nodes]
+        for name in ('og_matrix', 'tsg_matrix'):
+            expected = getattr(rebuilt, name)
+            if expected is None:
+                self.assertIsNone(getattr(updated, name))
+                continue
+            self.assertClose(dense(getattr(updated, name)),
+                             dense(expected)[np.ix_(order, order)], 1e-12)
+
+    def test_matches_rebuild(self):
+        release = self.write_release(self.new_node_changes)
+        for low_list in (None, self.low_list):
+            for sparse in (False, True):
+                wk = Walker(self.graph, low_list, sparse=sparse)
+                wk.solve(self.seed, 0.7, 0.1)
+                columns = wk.update_edges(self.new_node_changes)
+                self.assertEqual(wk.nodes[-1], 'new')
+                changed = set(node for change in self.new_node_changes
+                              for node in change[:2])
+                self.assertEqual(sorted(wk.nodes[idx] for idx in columns),
+                                 sorted(changed))
+
+                rebuilt = Walker(release, low_list, sparse=sparse)
+                self.assertSameGraph(wk, rebuilt)
+                order = [rebuilt.node_index[node] for node in wk.nodes]
+                self.assertClose(wk.solve(self.seed, 0.7, 0.1),
+                                 rebuilt.solve(self.seed, 0.7, 0.1)[order])
+
+    def test_release_digest(self):
+        release = self.write_release(self.changes)
+        for remove_nodes in ([], ['not_a_node']):
+            wk = Walker(self.graph, self.low_list, remove_nodes)
+            wk.update_edges(self.changes, release)
+            rebuilt = Walker(release, self.low_list, remove_nodes)
+            self.assertEqual(wk.nodes, rebuilt.nodes)
+            self.assertEqual(wk.input_digest(), rebuilt.input_digest())
+
+    def test_digest_covers_changes(self):
+        wk = Walker(self.graph, self.low_list)
+        digest = wk.input_digest()
+        self.assertEqual(len(wk.update_edges(self.changes[:1])), 2)
+        self.assertNotEqual(wk.input_digest(), digest)
+        # deleting an edge that is not there changes nothing
+        digest = wk.input_digest()
+        e, f, _ = self.changes[2]
+        self.assertEqual(len(wk.update_edges([(e, f, 0)])), 0)
+        self.assertEqual(wk.input_digest(), digest)
+
+    def assertDigestKept(self, changes, release, remove_nodes=[]):
+        """ Assert that updating a Walker with changes and release keeps
+        the digest of the changes, as the node order of a Walker built from
+        release differs.
+        """
+        wk = Walker(self.graph, self.low_list, remove_nodes)
+        expected = Walker(self.graph, self.low_list, remove_nodes)
+        expected.update_edges(changes)
+        stderr, sys.stderr = sys.stderr, StringIO()
+        try:
+            wk.update_edges(changes, release)
+            warning = sys.stderr.getvalue()
+        finally:
+            sys.stderr = stderr
+        self.assertIn('different node order', warning)
+
+        rebuilt = Walker(release, self.low_list, remove_nodes)
+        self.assertNotEqual(wk.nodes, rebuilt.nodes)
+        self.assertEqual(wk.input_digest(), expected.input_digest())
+        self.assertNotEqual(wk.input_digest(), rebuilt.input_digest())
+
+    def test_release_node_order(self):
+        self.assertDigestKept(self.changes,
+                              self.write_release(self.changes, sort=True))
+        # new nodes are appended, rather than placed where the release
+        # lists them
+        self.assertDigestKept(self.new_node_changes,
+                              self.write_release(self.new_node_changes))
+
+    def test_release_disconnects_node(self):
+        wk = Walker(self.graph, self.low_list)
+        node = self.seed[0]
+        idx = wk.node_index[node]
+        neighbours = [wk.nodes[other] for other in
+                      np.flatnonzero(dense(wk.og_matrix)[:, idx])]
+        changes = [(node, other, 0) for other in neighbours]
+        release = self.write_release(changes)
+        # the node is kept, with no edges, but not in the release
+        self.assertDigestKept(changes, release)
+        # and after a removal, the largest component of the release is
+        # computed without it
+        self.assertDigestKept(changes, release, ['not_a_node'])
+
+    def create_store(self, wk):
+        """ Write a complete all-pairs store for wk. """
+        store = ResultStore.create(
+                os.path.join(self.tmp_dir, 'store'), wk.nodes,
+                params={'input_digest': wk.input_digest(),
+                        'restart_prob': 0.7, 'original_graph_prob': 0.1})
+        store.write_rows(slice(None), wk.run_batch(
+                [[node] for node in wk.nodes], 0.7, 0.1).T)
+        return store
+
+    def test_update_store_in_place(self):
+        release = self.write_release(self.changes)
+        wk = Walker(self.graph, self.low_list)
+        store = self.create_store(wk)
+        wk.update_edges(self.changes, release)
+        updated, iterations = wk.update_store(store)
+        self.assertIs(updated, store)
+        self.assertEqual(len(iterations), len(wk.nodes))
+
+        rebuilt = Walker(release, self.low_list)
+        self.assertEqual(ResultStore(store.path).params['input_digest'],
+                         rebuilt.input_digest())
+        order = [rebuilt.node_index[node] for node in wk.nodes]
+        expected = rebuilt.run_batch([[node] for node in wk.nodes], 0.7, 0.1)
+        self.assertClose(store.rows[:].T, expected[order])
+
+    def test_update_store_new_node(self):
+        wk = Walker(self.graph, self.low_list)
+        store = self.create_store(wk)
+        wk.update_edges(self.new_node_changes)
+        with self.assertRaises(SystemExit):
+            wk.update_store(store)
+
+        output = os.path.join(self.tmp_dir, 'updated')
+        updated, _ = wk.update_store(store, output)
+        self.assertEqual(updated.nodes, wk.nodes)
+        self.assertEqual(updated.row_names, wk.nodes)
+        self.assertEqual(updated.num_filled(), len(wk.nodes) - 1)
+        self.assertEqual(updated.params['input_digest'], wk.input_digest())
+        expected = wk.run_batch([[node] for node in wk.nodes[:-1]], 0.7, 0.1)
+        self.assertClose(updated.rows[:-1].T, expected)
+
+        # the new node's row is solved when first needed
+        wk.attach_store(ResultStore(output, 'r+'))
+        self.assertClose(wk.solve(['new'], 0.7, 0.1),
+                         wk.run_batch([['new']], 0.7, 0.1)[:, 0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,12 +4,21 @@ Implementation of tissue-specific graph walk with RWR
 """
 import sys
 import numpy as np
-import networkx as nx
-from sklearn.preprocessing import normalize
+import scipy.sparse as sp
+from collections import OrderedDict
+from scipy.sparse.csgraph import connected_components
+from graph_loader import (read_edges, adjacency_matrix, largest_component,
+                          without_nodes, read_low_list, normalize_columns,
+                          neighbours, connects)
+from graph_cache import input_digest, changes_digest
+from result_store import ResultStore
+from solvers import (CONV_THRESHOLD, SCHEMES, power_iteration_block,
+                     power_iteration_tissues)
+from metrics import Metrics
+from push import PUSH_TOLERANCE, forward_push, upper_bound
 
-# convergence criterion - when vector L1 norm drops below 10^(-6)
-# (this is the same as the original RWR paper)
-CONV_THRESHOLD = 0.000001
+# number of fused operators (one per parameter pair) a Walker keeps by default
+MAX_OPERATORS = 4
 
 class Walker:
     """ Class for multi-graph walk to convergence, using matrix computation.
@@ -22,6 +31,10 @@ class Walker:
 
     Attributes:
     -----------
+        nodes (list)         : The nodes of the graph (i.e. the LCC, after any
+                               node removal), in the order of the matrix rows
+                               and columns
+        node_index (dict)    : The index of each node in nodes
         og_matrix (np.array) : The column-normalized adjacency matrix
                                representing the original graph LCC, with no
                                nodes removed
@@ -29,18 +42,83 @@ class Walker:
                                representing the tissue-specific graph LCC, with
                                unexpressed nodes removed as specified by
                                low_list.
+        sparse (bool)        : If True, og_matrix and tsg_matrix are stored as
+                               scipy.sparse CSC matrices rather than dense
+                               numpy matrices, so memory use and the cost of
+                               each iteration scale with the number of edges
+        dtype (np.dtype)     : The dtype of the graph matrices, and of the
+                               probability vectors iterated with them
+                               (float64, or float32 to halve memory use and
+                               the cost of each iteration)
         restart_prob (float) : The probability of restarting from the source
                                node for each step in run_path (i.e. r in the
                                original Kohler paper RWR formulation)
         og_prob (float)      : The probability of walking on the original graph
                                for nodes that are expressed (so, we walk on the
                                TSG with probability 1 - og_prob)
+        iterations (int)     : The number of iterations the last solve took
+                               (an array with one count per seed set, after
+                               run_batch, or the number of pushes, after
+                               approximate)
+        metrics (Metrics)    : Per-phase wall times, matrix sizes, iteration
+                               counts and the residual trace of the last
+                               solve, for this Walker
+        store (ResultStore)  : Single-node results that seed sets are
+                               answered from, if attached (see
+                               attach_store)
+        max_operators (int)  : The number of fused operators to keep (see
+                               operator)
+        permc_spec (str)     : The column ordering for sparse LU
+                               factorizations (see Factorization.factorize),
+                               or None for the default
     """
 
-    def __init__(self, original_ppi, low_list, remove_nodes=[]):
-        self._build_matrices(original_ppi, low_list, remove_nodes)
+    def __init__(self, original_ppi, low_list, remove_nodes=[], sparse=False,
+                 cache=None, dtype=np.float64, max_operators=MAX_OPERATORS):
+        """ Build (or load) the matrices for each graph.
 
-    def run_exp(self, source, restart_prob, og_prob, node_list=[]):
+        If cache (a GraphCache) is given, the compiled graph is loaded from
+        the cache when the same inputs have been seen before, and stored in
+        it otherwise. The matrices are normalized in float64, then stored as
+        dtype.
+        """
+        self.sparse = sparse
+        self.dtype = np.dtype(dtype)
+        self.max_operators = max_operators
+        self.permc_spec = None
+        # fused iteration operators (see operator), least recently used
+        # first, and LU factorizations for the direct solver, both keyed by
+        # (restart_prob, og_prob)
+        self._operators = OrderedDict()
+        self._factorizations = {}
+        self.metrics = Metrics()
+        self.store = None
+        # kept for update_edges, which needs the low list to mask new nodes,
+        # and has to ignore changes to removed nodes
+        self._low_list = low_list
+        self._removed = set(remove_nodes)
+        # the inputs, and their hash (computed when first needed, see
+        # input_digest)
+        self._inputs = (original_ppi, low_list, list(remove_nodes))
+        self._input_digest = None
+        # CSC copies of the graph matrices (and their row maxima), for
+        # forward push
+        self._push_csc = None
+        # the largest connected component of the graph, and the size of the
+        # next largest (computed when first needed, see knockout_mask)
+        self._components = None
+
+        if cache is None:
+            self._build_matrices(original_ppi, low_list, remove_nodes)
+        else:
+            self._load_matrices(cache, original_ppi, low_list, remove_nodes)
+
+        self.metrics.record('nodes', len(self.nodes))
+        self.metrics.record_matrix('og_matrix', self.og_matrix)
+        self.metrics.record_matrix('tsg_matrix', self.tsg_matrix)
+
+    def run_exp(self, source, restart_prob, og_prob, node_list=[],
+                solver='power', top_k=None, exclude_seeds=False):
         """ Run a multi-graph random walk experiment, and print results.
 
         Parameters:
@@ -49,170 +127,1127 @@ class Walker:
                                   gene IDs)
             restart_prob (float): As above
             og_prob (float):      As above
+            solver (str):         'power' to iterate to convergence, one of
+                                  the accelerated schemes in solvers.SCHEMES
+                                  ('gauss-seidel', 'anderson', 'gmres' or
+                                  'bicgstab'), or 'direct' to solve the
+                                  equivalent linear system with a cached LU
+                                  factorization
+            top_k (int):          If given, only print the top_k nodes of the
+                                  rank list
+            exclude_seeds (bool): If True, leave the source nodes out of the
+                                  rank list
+        """
+        p_t = self.solve(source, restart_prob, og_prob, solver)
+
+        # now, generate and print a rank list from the final prob vector
+        exclude = source if exclude_seeds else []
+        with self.metrics.phase('output'):
+            self.write_results(p_t, sys.stdout, node_list, top_k, exclude)
+
+    def solve(self, source, restart_prob, og_prob, solver='power'):
+        """ Run a multi-graph random walk experiment, and return the final
+        probability vector (in the order of self.nodes).
+
+        Parameters are as in run_exp.
         """
         self.restart_prob = restart_prob
         self.og_prob = og_prob
 
         # set up the starting probability vector
         p_0 = self._set_up_p0(source)
-        diff_norm = 1
-        # this needs to be a deep copy, since we're reusing p_0 later
-        p_t = np.copy(p_0)
 
-        while (diff_norm > CONV_THRESHOLD):
-            # first, calculate p^(t + 1) from p^(t)
-            p_t_1 = self._calculate_next_p(p_t, p_0)
+        if self._store_matches(restart_prob, og_prob):
+            return self._store_solve(p_0[:, np.newaxis])[:, 0]
 
-            # calculate L1 norm of difference between p^(t + 1) and p^(t),
-            # for checking the convergence condition
-            diff_norm = np.linalg.norm(np.subtract(p_t_1, p_t), 1)
+        if solver == 'direct':
+            self.iterations = 0
+            return self._direct_solve(p_0)
 
-            # then, set p^(t) = p^(t + 1), and loop again if necessary
-            # no deep copy necessary here, we're just renaming p
-            p_t = p_t_1
+        operator = self.operator(restart_prob, og_prob)
+        restart = p_0 * restart_prob
+        self.metrics.residuals = []
+        with self.metrics.phase('iterate'):
+            p_t, self.iterations = SCHEMES[solver](operator, restart, p_0,
+                                                   self.metrics.residuals)
+        self.metrics.record('iterations', self.iterations)
+        return p_t
 
-        # now, generate and print a rank list from the final prob vector
+    def run_push(self, source, restart_prob, og_prob, node_list=[],
+                 tolerance=PUSH_TOLERANCE, top_k=None, exclude_seeds=False):
+        """ Run an approximate random walk experiment by forward push (see
+        approximate), and print results.
+
+        Output is as for run_exp (ranked by the estimates), with a third
+        column holding an upper bound on each node's probability (the
+        second column, the estimate, is a lower bound). Returns True if the
+        bounds show that the top_k nodes (if top_k is given) are the top_k
+        nodes of the exact walk.
+        """
+        estimate, upper = self.approximate(source, restart_prob, og_prob,
+                                           tolerance)
+
+        exclude = source if exclude_seeds else []
+        with self.metrics.phase('output'):
+            if node_list:
+                results = self._generate_prob_list(estimate, node_list)
+            else:
+                results = self._generate_rank_list(estimate, top_k, exclude)
+            results = list(results)
+            sys.stdout.write(''.join('{}\t{:.10f}\t{:.10f}\n'.format(
+                                     node, prob, upper[self.node_index[node]])
+                                     for node, prob in results))
+
+        if node_list or top_k is None:
+            return True
+        # the top_k is certain if no other node could overtake the last of
+        # them, even at its upper bound
+        others = np.ones(len(self.nodes), dtype=bool)
+        others[[self.node_index[node] for node, _ in results]] = False
+        others[[self.node_index[node] for node in exclude
+                if node in self.node_index]] = False
+        return (not others.any() or
+                results[-1][1] >= upper[others].max())
+
+    def approximate(self, source, restart_prob, og_prob,
+                    tolerance=PUSH_TOLERANCE):
+        """ Approximate the final probability vector by forward push (see
+        push.py), which only explores the neighbourhood of the source nodes
+        instead of iterating over the whole graph.
+
+        Parameters:
+        -----------
+            source (list):        As in run_exp
+            restart_prob (float): As above
+            og_prob (float):      As above
+            tolerance (float):    Residual probability below which nodes are
+                                  not pushed; smaller is more accurate, but
+                                  explores further
+
+        Returns:
+        --------
+            The estimated probability vector (in the order of self.nodes),
+            which is a lower bound on each node's probability, and a vector
+            of upper bounds.
+        """
+        self.restart_prob = restart_prob
+        self.og_prob = og_prob
+        p_0 = self._set_up_p0(source)
+
+        if self._push_csc is None:
+            # (matrix, largest entry of each row) for each graph
+            self._push_csc = []
+            for matrix in (self.og_matrix, self.tsg_matrix):
+                if matrix is not None:
+                    matrix = sp.csc_matrix(matrix)
+                    self._push_csc.append((matrix, matrix.max(axis=1)
+                                           .toarray().ravel()))
+        if len(self._push_csc) == 1:
+            weights = [1.0]
+        else:
+            weights = [og_prob, 1 - og_prob]
+        matrices = [(weight, matrix) for weight, (matrix, _)
+                    in zip(weights, self._push_csc)]
+        row_max = sum(weight * rows for weight, (_, rows)
+                      in zip(weights, self._push_csc))
+
+        with self.metrics.phase('push'):
+            estimate, residual, self.iterations = forward_push(
+                    matrices, restart_prob, p_0, tolerance)
+        self.metrics.record('pushes', self.iterations)
+        self.metrics.record('residual', float(residual.sum()))
+        return estimate, upper_bound(estimate, residual, restart_prob,
+                                     row_max)
+
+    def run_batch(self, sources, restart_prob, og_prob, solver='power'):
+        """ Run a random walk experiment for many seed sets at once.
+
+        The starting vectors for each seed set are stacked into the columns
+        of a single matrix, and iterated together using matrix-matrix
+        products (see solvers.power_iteration_block). Other iterative
+        schemes solve the seed sets one at a time.
+
+        Parameters:
+        -----------
+            sources (list):       A list of seed sets, each of which is a list
+                                  of source nodes as in run_exp
+            restart_prob (float): As above
+            og_prob (float):      As above
+            solver (str):         As in run_exp
+
+        Returns:
+        --------
+            A (number of nodes) x len(sources) array, where column i is the
+            final probability vector for seed set i. Pass each column to
+            write_results to output it.
+        """
+        self.restart_prob = restart_prob
+        self.og_prob = og_prob
+
+        p_0 = np.column_stack([self._set_up_p0(source) for source in sources])
+        if self._store_matches(restart_prob, og_prob):
+            p_t = self._store_solve(p_0)
+            self.iterations = np.zeros(len(sources), dtype=int)
+            return p_t
+
+        if solver == 'direct':
+            self.iterations = np.zeros(len(sources), dtype=int)
+            return self._direct_solve(p_0)
+
+        operator = self.operator(restart_prob, og_prob)
+        restart = p_0 * restart_prob
+        with self.metrics.phase('iterate'):
+            if solver == 'power':
+                p_t, self.iterations = power_iteration_block(operator,
+                                                             restart, p_0)
+            else:
+                p_t = np.empty_like(p_0)
+                self.iterations = np.zeros(len(sources), dtype=int)
+                for idx in xrange(len(sources)):
+                    p_t[:, idx], self.iterations[idx] = SCHEMES[solver](
+                            operator, restart[:, idx], p_0[:, idx])
+        self.metrics.record('iterations', self.iterations)
+        return p_t
+
+    def run_sweep(self, source, params, solver='power'):
+        """ Run a random walk experiment for a list of parameter points.
+
+        Each point is solved iteratively, warm-started from the
+        converged vector of the nearest point solved so far (by Euclidean
+        distance in (restart_prob, og_prob)), rather than from p_0. The
+        matrices are only built once, and the fused operator for each point
+        is discarded once that point is solved.
+
+        Parameters:
+        -----------
+            source (list): As in run_exp
+            params (list): A list of (restart_prob, og_prob) pairs
+            solver (str):  Any of the iterative schemes in run_exp
+
+        Returns:
+        --------
+            A (number of nodes) x len(params) array, where column i is the
+            final probability vector for params[i], and a list of the number
+            of iterations each point took.
+        """
+        p_0 = self._set_up_p0(source)
+        results = np.empty((len(self.nodes), len(params)),
+                           dtype=self.dtype)
+        iterations = []
+
+        for idx, (restart_prob, og_prob) in enumerate(params):
+            self.restart_prob = restart_prob
+            self.og_prob = og_prob
+
+            if idx:
+                distances = [np.hypot(restart_prob - r, og_prob - o)
+                             for r, o in params[:idx]]
+                p_init = results[:, int(np.argmin(distances))]
+            else:
+                p_init = p_0
+
+            operator = self.operator(restart_prob, og_prob, cache=False)
+            with self.metrics.phase('iterate'):
+                p_t, num_iterations = SCHEMES[solver](operator,
+                                                      p_0 * restart_prob,
+                                                      p_init)
+            results[:, idx] = p_t
+            iterations.append(num_iterations)
+
+        self.metrics.record('iterations', iterations)
+        return results, iterations
+
+    def run_tissues(self, sources, low_lists, restart_prob, og_prob):
+        """ Run a random walk experiment for every combination of seed set
+        and tissue, in one pass.
+
+        Every tissue shares the original graph matrix: each is represented
+        by a node mask and a vector of column scales (see tissue_mask), so
+        memory grows with (tissues x nodes) rather than (tissues x nodes^2).
+        Each result is the same as building a Walker with that low list.
+
+        Parameters:
+        -----------
+            sources (list):       A list of seed sets, as in run_batch
+            low_lists (list):     A list of low list files, one per tissue
+            restart_prob (float): As above
+            og_prob (float):      As above
+
+        Returns:
+        --------
+            A (number of nodes) x len(sources) x len(low_lists) array, where
+            [:, i, t] is the final probability vector for seed set i in
+            tissue t.
+        """
+        self.restart_prob = restart_prob
+        self.og_prob = og_prob
+
+        with self.metrics.phase('tsg'):
+            masks = np.column_stack([self.tissue_mask(low_list)
+                                     for low_list in low_lists])
+            # a tissue's column sums, with unexpressed nodes removed, are the
+            # mask times the original graph matrix (whose columns sum to 1)
+            column_sums = np.asarray(self.og_matrix.T.dot(masks))
+            with np.errstate(divide='ignore', invalid='ignore'):
+                scales = np.where(column_sums > 0, masks / column_sums, 0)
+            masks = masks.astype(self.dtype)
+            scales = scales.astype(self.dtype)
+
+        operator = self._prepare_operator(self._fuse_operator(
+                self.og_matrix, None, restart_prob, og_prob))
+
+        # columns are ordered seed set first, then tissue
+        p_0 = np.column_stack([self._set_up_p0(source) for source in sources])
+        p_0 = np.repeat(p_0, len(low_lists), axis=1)
+        tissues = np.tile(np.arange(len(low_lists)), len(sources))
+
+        with self.metrics.phase('iterate'):
+            p_t, self.iterations = power_iteration_tissues(
+                    operator, og_prob, masks, scales, tissues,
+                    p_0 * restart_prob, p_0)
+        self.metrics.record('iterations', self.iterations)
+        return p_t.reshape(len(self.nodes), len(sources), len(low_lists))
+
+    def tissue_mask(self, low_list):
+        """ Return a 0/1 mask over self.nodes, which is 0 for the nodes
+        marked unexpressed (NA) in low_list.
+        """
+        mask = np.ones(len(self.nodes))
+        mask[read_low_list(low_list, self.node_index)] = 0
+        return mask
+
+    def run_knockouts(self, source, knockouts, restart_prob, og_prob,
+                      solver='power'):
+        """ Run a random walk experiment once for each of a list of node
+        knockouts, without rebuilding the graph.
+
+        Each knockout patches the base operator in place (see
+        _knockout_columns), and gives the same walk as building the Walker
+        with remove_nodes set to the knockout. Each knockout is warm-started
+        from the solution on the base graph, with the knocked-out nodes
+        zeroed.
+
+        Parameters:
+        -----------
+            source (list):    As in run_exp. Seed nodes that are knocked out
+                              (or fall outside the LCC) are dropped from the
+                              seed for that knockout
+            knockouts (list): A list of knockouts, each of which is a list
+                              of nodes to remove together
+            solver (str):     Any of the iterative schemes in run_exp
+
+        Returns:
+        --------
+            A (number of nodes) x len(knockouts) array, where column i is the
+            final probability vector for knockouts[i] (in the order of
+            self.nodes, with zeros for removed nodes), a list of the number
+            of iterations each knockout took, and a boolean array of the
+            same shape as the results, marking the nodes kept by each
+            knockout.
+        """
+        self.restart_prob = restart_prob
+        self.og_prob = og_prob
+
+        p_0 = self._set_up_p0(source)
+        base = self.solve(source, restart_prob, og_prob, solver)
+        operator = self.operator(restart_prob, og_prob)
+        if self.sparse:
+            # the position in operator.data of each entry, in CSC order, so
+            # the entries of a few columns can be found without a search
+            positions = sp.csr_matrix(
+                    (np.arange(1, operator.nnz + 1), operator.indices,
+                     operator.indptr), shape=operator.shape).tocsc()
+        else:
+            positions = None
+        results = np.zeros((len(self.nodes), len(knockouts)),
+                           dtype=self.dtype)
+        kept = np.zeros((len(self.nodes), len(knockouts)), dtype=bool)
+        iterations = []
+
+        for idx, knockout in enumerate(knockouts):
+            with self.metrics.phase('knockout'):
+                keep = self.knockout_mask(knockout)
+                where, values = self._knockout_columns(
+                        keep, restart_prob, og_prob, positions)
+            kept[:, idx] = keep
+
+            # drop seeds that were removed, keeping the rest equally weighted
+            p_0_ko = p_0 * keep
+            if not p_0_ko.any():
+                sys.stderr.write("No seed nodes are left after knocking out "
+                                 "{}\n".format(knockout))
+                iterations.append(0)
+                continue
+            p_0_ko /= p_0_ko.sum()
+
+            # not renormalized: the tissue-specific walk loses mass at
+            # unexpressed nodes, so the base solution is already at the
+            # right scale
+            p_init = base * keep
+            if not p_init.any():
+                p_init = p_0_ko
+            values = self._swap_entries(operator, where, values)
+            try:
+                with self.metrics.phase('iterate'):
+                    results[:, idx], num_iterations = SCHEMES[solver](
+                            operator, p_0_ko * restart_prob, p_init)
+            finally:
+                # restore the base operator, which may be cached
+                self._swap_entries(operator, where, values)
+            iterations.append(num_iterations)
+
+        self.metrics.record('iterations', iterations)
+        return results, iterations, kept
+
+    def knockout_mask(self, knockout):
+        """ Return a boolean mask over self.nodes of the nodes left after
+        removing the nodes in knockout and taking the largest connected
+        component of what remains (as remove_nodes does when building the
+        Walker). Nodes that are not in the graph are ignored.
+
+        The components of the graph are only found once. A knockout leaves
+        the rest of the largest component connected if the neighbours of
+        the removed nodes can still reach each other, which a local search
+        usually confirms quickly; otherwise the components are found again.
+        """
+        keep = np.ones(len(self.nodes), dtype=bool)
+        for node in knockout:
+            if node in self.node_index:
+                keep[self.node_index[node]] = False
+
+        # every edge is in both directions, so the original graph matrix has
+        # the same pattern as the adjacency matrix
+        with self.metrics.phase('lcc'):
+            if self._components is None:
+                _, labels = connected_components(self.og_matrix,
+                                                 directed=False)
+                sizes = np.sort(np.bincount(labels))
+                self._components = (labels == np.argmax(np.bincount(labels)),
+                                    sizes[-2] if len(sizes) > 1 else 0)
+            largest, runner_up = self._components
+
+            remaining = largest & keep
+            removed = np.flatnonzero(largest & ~keep)
+            if remaining.sum() > runner_up:
+                if not len(removed):
+                    return remaining
+                around = neighbours(self.og_matrix, removed)
+                if connects(self.og_matrix, around[remaining[around]],
+                            remaining):
+                    return remaining
+            return largest_component(self.og_matrix, keep)
+
+    def attach_store(self, store):
+        """ Answer solves from a result store of single-node walks (e.g. one
+        written by run_all_pairs.py), with one row per node, named by node.
+
+        The walk is linear in p_0, so the result for any seed set is the
+        weighted sum of the results for its single nodes, and solve and
+        run_batch just sum rows of the store whenever the restart and
+        original graph probabilities match the store's. Rows that have not
+        been filled yet are solved when first needed, and written back if
+        the store is open for writing (mode 'r+').
+
+        The store must have been computed on the same graph, i.e. from the
+        same input graph, low list and removed nodes (see input_digest).
+        """
+        if store.nodes != [str(n) for n in self.nodes]:
+            sys.exit("Result store {} has a different node order than the "
+                     "input graph. Exiting.".format(store.path))
+        self._check_store_inputs(store)
+        self.store = store
+        # row of the store for each node index
+        row_index = dict((name, idx)
+                         for idx, name in enumerate(store.row_names))
+        try:
+            self._store_rows = np.array([row_index[str(node)]
+                                         for node in self.nodes])
+        except KeyError as e:
+            sys.exit("Node {} has no row in result store {}. "
+                     "Exiting.".format(e, store.path))
+
+    def input_digest(self):
+        """ Return a hash of the contents of the inputs the graph was built
+        from (see graph_cache.input_digest), as recorded by result stores,
+        so a store is only used with the graph it was computed on. Edge
+        updates change it (see update_edges).
+        """
+        if self._input_digest is None:
+            self._input_digest = input_digest(*self._inputs)
+        return self._input_digest
+
+    def update_edges(self, changes, release=None):
+        """ Apply edge insertions, deletions and weight changes to the
+        graph, without rebuilding it.
+
+        changes is a list of (node, node, weight) triples, each setting the
+        weight of an (undirected) edge: a new edge is inserted, and a weight
+        of 0 deletes the edge. The last change to an edge wins. Nodes that
+        are not in the graph are appended to self.nodes, unless they were
+        removed with remove_nodes (changes to their edges are ignored).
+        Nodes that lose all their edges are kept, with no edges.
+
+        Only the columns of nodes whose edges changed are renormalized: each
+        is scaled back to adjacency weights by the node's degree, updated,
+        and divided by its new degree, which gives the same matrices as
+        building the Walker from the updated network. Cached operators and
+        factorizations are dropped, and an attached store is detached if
+        nodes were added (see update_store).
+
+        The graph's input_digest is updated to cover the changes. If
+        release is given (the file of the whole updated network, whose
+        differences from the input graph are the changes), and building a
+        Walker from release gives the same node order, it is set to the
+        digest of that Walker instead, so stores built either way match.
+        The node order can differ, e.g. if a node lost all its edges or a
+        removal left a different largest component, and then a warning is
+        written and the digest of the changes is kept.
+
+        Returns the indices of the renormalized columns.
+        """
+        edges = OrderedDict()
+        for node_a, node_b, weight in changes:
+            if node_a in self._removed or node_b in self._removed:
+                continue
+            edges[tuple(sorted((node_a, node_b)))] = float(weight)
+
+        with self.metrics.phase('update'):
+            # new nodes, in the order their first (non-deletion) edge appears
+            new_nodes = []
+            for (node_a, node_b), weight in edges.iteritems():
+                for node in (node_a, node_b):
+                    if (weight and node not in self.node_index and
+                            node not in new_nodes):
+                        new_nodes.append(node)
+            if new_nodes:
+                self._add_nodes(new_nodes)
+            edges = [(edge, weight) for edge, weight in edges.iteritems()
+                     if edge[0] in self.node_index and
+                     edge[1] in self.node_index]
+            if not edges:
+                return np.array([], dtype=int)
+
+            rows = np.array([self.node_index[a] for (a, _), _ in edges])
+            cols = np.array([self.node_index[b] for (_, b), _ in edges])
+            weights = np.array([weight for _, weight in edges])
+
+            # change in adjacency weight of each edge, in both directions
+            # (the current weight of an edge is W_ij * d_j)
+            delta = weights - self._edge_weights(rows, cols)
+            changed = delta != 0
+            rows, cols, delta = rows[changed], cols[changed], delta[changed]
+            if not changed.any():
+                return np.array([], dtype=int)
+            both = rows != cols
+            num_nodes = len(self.nodes)
+            delta = sp.csc_matrix(
+                    (np.concatenate((delta, delta[both])),
+                     (np.concatenate((rows, cols[both])),
+                      np.concatenate((cols, rows[both])))),
+                    shape=(num_nodes, num_nodes))
+            columns = np.unique(np.concatenate((rows, cols)))
+
+            adjacency = (self._adjacency_columns(columns) +
+                         delta[:, columns]).tocsc()
+            self._degrees[columns] = np.asarray(adjacency.sum(axis=0)).ravel()
+            self.og_matrix = self._replace_columns(
+                    self.og_matrix, columns,
+                    normalize_columns(adjacency))
+
+            if self.tsg_matrix is not None:
+                # zero the rows and columns of unexpressed nodes, as
+                # _tsg_matrix does, before normalizing
+                mask = self.tissue_mask(self._low_list)
+                masked = sp.diags(mask).dot(adjacency).dot(
+                        sp.diags(mask[columns]))
+                self.tsg_matrix = self._replace_columns(
+                        self.tsg_matrix, columns,
+                        normalize_columns(masked))
+
+        if release and self._release_nodes(release) == self.nodes:
+            self._input_digest = input_digest(release, self._low_list,
+                                              self._removed)
+        else:
+            if release:
+                sys.stderr.write("Warning: building a Walker from {} gives "
+                                 "a different node order than updating "
+                                 "this one, so result stores of one will not "
+                                 "match the other.\n".format(release))
+            self._input_digest = changes_digest(
+                    self.input_digest(),
+                    [(a, b, weight) for (a, b), weight in edges])
+        self._operators = OrderedDict()
+        self._factorizations = {}
+        self._push_csc = None
+        self._components = None
+        self.metrics.record('updated_columns', len(columns))
+        return columns
+
+    def update_store(self, store, output=None, batch_size=64):
+        """ Re-solve the filled rows of an all-pairs result store (one row
+        per node, named by node) for the current graph, e.g. after
+        update_edges, warm-starting each row from its previous vector, so a
+        small change to the network takes a few iterations per row.
+
+        The store is updated in place (so it must be open for writing),
+        unless output is given. If nodes were added since the store was
+        written, output is required, and a new store is written there with
+        the current node order, and an unfilled row for each new node (to be
+        solved when first needed, see attach_store).
+
+        Returns the updated store, and the number of iterations each
+        re-solved row took. The updated store records the current
+        input_digest, so it matches this (updated) graph.
+        """
+        restart_prob = store.params.get('restart_prob')
+        og_prob = store.params.get('original_graph_prob')
+        nodes = [str(n) for n in self.nodes]
+        params = dict(store.params, input_digest=self.input_digest())
+
+        if store.nodes == nodes and output is None:
+            if store.mode != 'r+':
+                sys.exit("Result store {} is not open for writing. "
+                         "Exiting.".format(store.path))
+            target = store
+        elif output is None:
+            sys.exit("Nodes were added to the graph, so result store {} "
+                     "needs an output store. Exiting.".format(store.path))
+        else:
+            old_rows = set(store.row_names)
+            target = ResultStore.create(
+                    output, nodes,
+                    store.row_names + [n for n in nodes if n not in old_rows],
+                    params, store.rows.dtype)
+
+        try:
+            seeds = np.array([self.node_index[name]
+                              for name in store.row_names])
+            # the column of the old store for each node (new nodes last)
+            old_columns = np.array([self.node_index[node]
+                                    for node in store.nodes])
+        except KeyError as e:
+            sys.exit("Node {} of result store {} is not in the graph. "
+                     "Exiting.".format(e, store.path))
+        target_index = dict((name, idx)
+                            for idx, name in enumerate(target.row_names))
+        target_rows = np.array([target_index[name]
+                                for name in store.row_names])
+
+        if target is store:
+            # until every row is re-solved, the store matches neither the old
+            # graph nor the new one
+            target.set_params(dict(params, input_digest=None))
+
+        operator = self.operator(restart_prob, og_prob)
+        filled = np.flatnonzero(store.filled)
+        iterations = np.zeros(len(filled), dtype=int)
+        for start in xrange(0, len(filled), batch_size):
+            rows = filled[start:start + batch_size]
+            p_init = np.zeros((len(nodes), len(rows)), dtype=self.dtype)
+            p_init[old_columns] = store.rows[rows].T
+            p_0 = np.zeros((len(nodes), len(rows)))
+            p_0[seeds[rows], np.arange(len(rows))] = 1
+
+            with self.metrics.phase('iterate'):
+                p_t, iterations[start:start + len(rows)] = \
+                        power_iteration_block(operator, p_0 * restart_prob,
+                                              p_init)
+            target.write_rows(target_rows[rows], p_t.T)
+
+        if target is store:
+            target.set_params(params)
+        self.metrics.record('iterations', iterations)
+        return target, iterations
+
+    def save_factorization(self, filename, restart_prob, og_prob):
+        """ Factorize the system for the given parameters (if not already
+        cached), and write the factorization to disk.
+        """
+        self._get_factorization(restart_prob, og_prob).save(filename)
+
+    def load_factorization(self, filename):
+        """ Load a factorization written by save_factorization.
+
+        The factorization is checked against this graph, then cached for
+        the restart_prob and og_prob it was built with.
+        """
+        # imported here, as it imports scipy.linalg, which only the direct
+        # solver needs (and which slows down the start of every run)
+        from factorization import Factorization
+        factorization = Factorization.load(filename)
+        system_matrix = self._system_matrix(factorization.restart_prob,
+                                            factorization.og_prob)
+        checksum = float(abs(system_matrix).sum())
+        if (factorization.nodes != [str(n) for n in self.nodes] or
+                not np.isclose(factorization.checksum, checksum)):
+            sys.exit("Factorization {} does not match the input graph. "
+                     "Exiting.".format(filename))
+
+        key = (factorization.restart_prob, factorization.og_prob)
+        self._factorizations[key] = factorization
+        return factorization
+
+    def operator(self, restart_prob, og_prob, cache=True):
+        """ Return the fused iteration operator for the given parameters.
+
+        This is (1 - r)(og_prob * og_matrix + (1 - og_prob) * tsg_matrix),
+        or (1 - r) * og_matrix without a low list, so each iteration is a
+        single matrix product. Operators are cached per parameter pair,
+        unless cache is False. Each operator is as large as the graph
+        matrices, so only the max_operators most recently used are kept.
+        """
+        key = (restart_prob, og_prob)
+        if key in self._operators:
+            # mark it as the most recently used
+            operator = self._operators.pop(key)
+            self._operators[key] = operator
+            return operator
+
+        with self.metrics.phase('operator'):
+            operator = self._prepare_operator(
+                    self._build_operator(restart_prob, og_prob))
+        if cache and self.max_operators > 0:
+            self._operators[key] = operator
+            while len(self._operators) > self.max_operators:
+                self._operators.popitem(last=False)
+        return operator
+
+    def write_results(self, p_t, out_fp, node_list=[], top_k=None,
+                      exclude=[]):
+        """ Write a final probability vector to out_fp, in a single write.
+
+        If node_list is given, probabilities are written in that order;
+        otherwise a rank list is written, from highest to lowest probability,
+        leaving out the nodes in exclude and stopping after top_k nodes (if
+        top_k is given).
+        """
         if node_list:
-            for node, prob in self._generate_prob_list(p_t, node_list):
-                print '{}\t{:.10f}'.format(node, prob)
+            results = self._generate_prob_list(p_t, node_list)
         else:
-            for node, prob in self._generate_rank_list(p_t):
-                print '{}\t{:.10f}'.format(node, prob)
+            results = self._generate_rank_list(p_t, top_k, exclude)
+        out_fp.write(''.join('{}\t{:.10f}\n'.format(node, prob)
+                             for node, prob in results))
 
     def _generate_prob_list(self, p_t, node_list):
-        gene_probs = dict(zip(self.OG.nodes(), p_t.tolist()))
+        gene_probs = dict(zip(self.nodes, p_t.tolist()))
         for node in node_list:
             yield node, gene_probs[node]
 
-    def _generate_rank_list(self, p_t):
+    def _generate_rank_list(self, p_t, top_k=None, exclude=[]):
         """ Return a rank list, generated from the final probability vector.
 
-        Gene rank list is ordered from highest to lowest probability.
+        Gene rank list is ordered from highest to lowest probability. Ties
+        are kept in node order, as a stable sort would.
+        """
+        probs = np.array(p_t, dtype=np.float64)
+        candidates = np.arange(len(probs))
+        if exclude:
+            excluded = [self.node_index[node] for node in exclude
+                        if node in self.node_index]
+            candidates = np.delete(candidates, excluded)
+
+        if top_k is not None and top_k < len(candidates):
+            # partial selection of the top_k nodes, so only those get sorted
+            top = np.argpartition(-probs[candidates], top_k - 1)[:top_k]
+            candidates = candidates[top]
+
+        # sort by probability (from largest to smallest), breaking ties by
+        # node index, and generate a sorted list of Entrez IDs
+        order = candidates[np.lexsort((candidates, -probs[candidates]))]
+        for index in order:
+            yield self.nodes[index], probs[index]
+
+
+    def _build_operator(self, restart_prob, og_prob):
+        """ Combine the graph matrices into (1 - r)W, without caching. """
+        return self._fuse_operator(self.og_matrix, self.tsg_matrix,
+                                   restart_prob, og_prob)
+
+
+    def _fuse_operator(self, og_matrix, tsg_matrix, restart_prob, og_prob):
+        """ Combine the given graph matrices into (1 - r)W. """
+        if tsg_matrix is not None:
+            transition = og_matrix * og_prob + tsg_matrix * (1 - og_prob)
+        else:
+            transition = og_matrix
+
+        if self.sparse:
+            return sp.csc_matrix(transition * (1 - restart_prob))
+        return np.asarray(transition) * (1 - restart_prob)
+
+
+    def _prepare_operator(self, operator):
+        """ Convert an operator to the layout the solvers iterate fastest
+        with.
         """
-        gene_probs = zip(self.OG.nodes(), p_t.tolist())
-        # sort by probability (from largest to smallest), and generate a
-        # sorted list of Entrez IDs
-        for s in sorted(gene_probs, key=lambda x: x[1], reverse=True):
-            yield s[0], s[1]
+        if self.sparse:
+            # CSR is the natural format for computing operator * p
+            return sp.csr_matrix(operator)
+        return np.ascontiguousarray(operator)
+
 
+    def _knockout_columns(self, keep, restart_prob, og_prob, positions):
+        """ Find the entries of the fused operator that change when only
+        the nodes in keep (a boolean mask) are left in the graph.
+
+        Every edge is in both directions, so only the columns of removed
+        nodes, and of the kept nodes that lost an edge to them, change: the
+        removed nodes' columns are zeroed, and each of the others loses its
+        rows of removed nodes and is divided by its remaining sum in each
+        graph, which gives the same matrix as normalizing the masked
+        adjacency matrix from scratch.
+
+        Returns where the changed entries are (the changed columns of a
+        dense operator, or positions in the data of a sparse one, given
+        positions as built by run_knockouts) and their new values, for
+        _swap_entries.
+        """
+        removed = np.flatnonzero(~keep)
+        columns = np.union1d(removed, neighbours(self.og_matrix, removed))
+        row_keep = keep.astype(np.float64)
+
+        def renormalized(matrix, weight):
+            # matrix[:, columns], with each column divided by its remaining
+            # sum, and weighted by weight
+            if self.sparse:
+                block = sp.csc_matrix(matrix[:, columns], dtype=np.float64)
+            else:
+                block = np.asarray(matrix[:, columns], dtype=np.float64)
+            remaining = np.asarray(block.T.dot(row_keep)).ravel()
+            with np.errstate(divide='ignore'):
+                scale = np.where(keep[columns] & (remaining > 0),
+                                 weight / remaining, 0)
+            if self.sparse:
+                return block.dot(sp.diags(scale))
+            return block * scale
 
-    def _calculate_next_p(self, p_t, p_0):
-        """ Calculate the next probability vector. """
         if self.tsg_matrix is not None:
-            no_epsilon = np.squeeze(np.asarray(np.dot(self.tsg_matrix, p_t) *
-                                    (1 - self.og_prob)))
-            epsilon = np.squeeze(np.asarray(np.dot(self.og_matrix, p_t) *
-                                      (self.og_prob)))
-            no_restart = np.add(epsilon, no_epsilon) * (1 - self.restart_prob)
+            block = (renormalized(self.og_matrix, og_prob) +
+                     renormalized(self.tsg_matrix, 1 - og_prob))
         else:
-            epsilon = np.squeeze(np.asarray(np.dot(self.og_matrix, p_t)))
-            no_restart = epsilon * (1 - self.restart_prob)
-        restart = p_0 * self.restart_prob
-        return np.add(no_restart, restart)
+            block = renormalized(self.og_matrix, 1)
+
+        if not self.sparse:
+            return columns, ((1 - restart_prob) *
+                             row_keep[:, np.newaxis] * block)
+
+        entries = positions[:, columns]
+        rows = entries.indices
+        local = np.repeat(np.arange(len(columns)), np.diff(entries.indptr))
+        values = np.asarray(sp.csr_matrix(block)[rows, local]).ravel()
+        return entries.data - 1, (1 - restart_prob) * row_keep[rows] * values
+
+
+    def _swap_entries(self, operator, where, values):
+        """ Write values into the entries of operator given by where (as
+        returned by _knockout_columns), and return the values they held, so
+        a second swap restores the operator.
+        """
+        if self.sparse:
+            old = operator.data[where]
+            operator.data[where] = values
+        else:
+            old = operator[:, where]
+            operator[:, where] = values
+        return old
+
+
+    def _edge_weights(self, rows, cols):
+        """ Return the adjacency weights of the given edges (0 for edges
+        that are not in the graph), from the original graph matrix.
+        """
+        if self.sparse:
+            normalized = np.asarray(self.og_matrix[rows, cols]).ravel()
+        else:
+            normalized = np.asarray(self.og_matrix)[rows, cols]
+        return normalized * self._degrees[cols]
+
+
+    def _adjacency_columns(self, columns):
+        """ Return the given columns of the adjacency matrix, as a float64
+        CSC matrix, by scaling columns of the original graph matrix back by
+        each node's degree.
+        """
+        normalized = sp.csc_matrix(self.og_matrix[:, columns],
+                                   dtype=np.float64)
+        return normalized.dot(sp.diags(self._degrees[columns]))
+
+
+    def _replace_columns(self, matrix, columns, new_columns):
+        """ Return matrix with the given columns replaced by the columns of
+        new_columns (a sparse matrix with one column per index in columns).
+        """
+        if not self.sparse:
+            if not matrix.flags.writeable:
+                # loaded read-only from the graph cache
+                matrix = np.array(matrix)
+            matrix[:, columns] = new_columns.toarray()
+            return matrix
+
+        num_nodes = matrix.shape[1]
+        keep = np.ones(num_nodes)
+        keep[columns] = 0
+        # move column k of new_columns to column columns[k]
+        placement = sp.csc_matrix(
+                (np.ones(len(columns)), (np.arange(len(columns)), columns)),
+                shape=(len(columns), num_nodes))
+        replaced = (matrix.dot(sp.diags(keep)) +
+                    new_columns.dot(placement)).tocsc()
+        replaced.eliminate_zeros()
+        return replaced.astype(self.dtype)
+
+
+    def _release_nodes(self, release):
+        """ Return the nodes, in order, of a Walker built from the network
+        file release, with this Walker's removed nodes.
+        """
+        nodes, rows, cols, weights = read_edges(release)
+        if self._removed:
+            adjacency = adjacency_matrix(len(nodes), rows, cols, weights)
+            nodes, _ = without_nodes(nodes, adjacency, self._removed)
+        return nodes
+
+
+    def _add_nodes(self, new_nodes):
+        """ Append nodes with no edges to the graph. """
+        num_old = len(self.nodes)
+        self._set_nodes(self.nodes + new_nodes)
+        num_nodes = len(self.nodes)
+        self._degrees = np.concatenate((self._degrees,
+                                        np.zeros(len(new_nodes))))
+
+        def grow(matrix):
+            if matrix is None:
+                return None
+            if self.sparse:
+                extra = np.repeat(matrix.indptr[-1], len(new_nodes))
+                return sp.csc_matrix((matrix.data, matrix.indices,
+                                      np.concatenate((matrix.indptr, extra))),
+                                     shape=(num_nodes, num_nodes))
+            grown = np.zeros((num_nodes, num_nodes), dtype=self.dtype)
+            grown[:num_old, :num_old] = matrix
+            return grown
+
+        self.og_matrix = grow(self.og_matrix)
+        self.tsg_matrix = grow(self.tsg_matrix)
+        # the store's rows no longer cover every node
+        self.store = None
+
+
+    def _store_matches(self, restart_prob, og_prob):
+        """ Return True if seed sets can be answered from the attached store
+        for these parameters. Exits if the store was not computed on this
+        graph (see _check_store_inputs).
+        """
+        if self.store is None:
+            return False
+        self._check_store_inputs(self.store)
+        params = self.store.params
+        if self.tsg_matrix is None:
+            # without a low list, og_prob has no effect on the walk
+            og_prob = params.get('original_graph_prob')
+        return (params.get('restart_prob') == restart_prob and
+                params.get('original_graph_prob') == og_prob)
+
+
+    def _check_store_inputs(self, store):
+        """ Exit unless store was computed on the same graph as this Walker,
+        i.e. it records the same input_digest.
+        """
+        if store.params.get('input_digest') != self.input_digest():
+            sys.exit("Result store {} was not built from this input graph, "
+                     "low list and removed nodes. Exiting.".format(
+                      store.path))
+
+
+    def _store_solve(self, p_0):
+        """ Combine single-node results from the store into the results for
+        the starting vectors in the columns of p_0, solving any missing
+        single-node results first.
+        """
+        seeds = np.flatnonzero(p_0.any(axis=1))
+        rows = self._store_rows[seeds]
+        with self.metrics.phase('store_lookup'):
+            block = np.array(self.store.rows[rows])
+
+        missing = np.flatnonzero(self.store.filled[rows] == 0)
+        if len(missing):
+            with self.metrics.phase('store_fill'):
+                block[missing] = self._fill_store(seeds[missing])
+        self.metrics.record('store_filled', len(missing))
+
+        # each row is a single-node result, so this sums the results for each
+        # seed node, weighted by its starting probability
+        self.iterations = 0
+        return block.T.dot(p_0[seeds])
+
+
+    def _fill_store(self, nodes):
+        """ Solve the single-node walks for the given node indices, and
+        return them as rows. They are also written to the store, if it is
+        open for writing (otherwise, they are solved again next time).
+        """
+        operator = self.operator(self.restart_prob, self.og_prob)
+        p_0 = np.zeros((len(self.nodes), len(nodes)))
+        p_0[nodes, np.arange(len(nodes))] = 1
+        p_t, _ = power_iteration_block(operator, p_0 * self.restart_prob, p_0)
+
+        if self.store.mode == 'r+':
+            self.store.write_rows(self._store_rows[nodes], p_t.T)
+        return p_t.T
+
+
+    def _direct_solve(self, p_0):
+        """ Solve (I - (1 - r)W) p = r * p_0 directly, for the current
+        restart_prob and og_prob.
+
+        p_0 may be a vector, or a matrix with one starting vector per column.
+        """
+        factorization = self._get_factorization(self.restart_prob,
+                                                self.og_prob)
+        with self.metrics.phase('direct_solve'):
+            return factorization.solve(p_0) * self.restart_prob
+
+
+    def _get_factorization(self, restart_prob, og_prob):
+        """ Return the cached factorization for the given parameters,
+        factorizing the system if necessary.
+        """
+        from factorization import Factorization
+        key = (restart_prob, og_prob)
+        if key not in self._factorizations:
+            with self.metrics.phase('factorize'):
+                self._factorizations[key] = Factorization.factorize(
+                        self._system_matrix(restart_prob, og_prob),
+                        restart_prob, og_prob, self.nodes, self.permc_spec)
+        return self._factorizations[key]
+
+
+    def _system_matrix(self, restart_prob, og_prob):
+        """ Build the matrix (I - (1 - r)W) of the RWR linear system.
+
+        This is always float64, since the factorization is only built once,
+        and its error is not corrected by iterating.
+        """
+        operator = self._build_operator(restart_prob, og_prob).astype(
+                np.float64)
+        if self.sparse:
+            identity = sp.identity(operator.shape[0], format='csc')
+            return sp.csc_matrix(identity - operator)
+        return np.identity(operator.shape[0]) - operator
 
 
     def _set_up_p0(self, source):
         """ Set up and return the 0th probability vector. """
-        p_0 = [0] * self.OG.number_of_nodes()
+        p_0 = [0] * len(self.nodes)
         for source_id in source:
             try:
-                # matrix columns are in the same order as nodes in original nx
-                # graph, so we can get the index of the source node from the OG
-                source_index = self.OG.nodes().index(source_id)
+                # matrix columns are in the same order as self.nodes, so we
+                # can get the index of the source node from the node index
+                source_index = self.node_index[source_id]
                 p_0[source_index] = 1 / float(len(source))
-            except ValueError:
+            except KeyError:
                 sys.exit("Source node {} is not in original graph. Source: {}. Exiting.".format(
                           source_id, source))
         return np.array(p_0)
 
 
+    def _set_nodes(self, nodes):
+        self.nodes = nodes
+        self.node_index = dict((node, idx) for idx, node in enumerate(nodes))
+
+
+    def _load_matrices(self, cache, original_ppi, low_list, remove_nodes):
+        """ Load the matrices from the graph cache, building (and caching)
+        them if they aren't there.
+        """
+        with self.metrics.phase('cache_load'):
+            key = cache.key(original_ppi, low_list, remove_nodes, self.sparse,
+                            self.dtype)
+            entry = cache.load(key)
+        self.metrics.record('cache_hit', entry is not None)
+
+        if entry is not None:
+            nodes, self.og_matrix, self.tsg_matrix, self._degrees = entry
+            self._set_nodes(nodes)
+        else:
+            self._build_matrices(original_ppi, low_list, remove_nodes)
+            with self.metrics.phase('cache_store'):
+                cache.store(key, self.nodes, self.og_matrix, self.tsg_matrix,
+                            self._degrees)
+
+
     def _build_matrices(self, original_ppi, low_list, remove_nodes):
         """ Build column-normalized adjacency matrix for each graph.
 
-        NOTE: these are column-normalized adjacency matrices (not nx
-              graphs), used to compute each p-vector
+        NOTE: these are column-normalized adjacency matrices, used to
+              compute each p-vector
         """
-        original_graph = self._build_og(original_ppi)
+        with self.metrics.phase('parse'):
+            nodes, rows, cols, weights = read_edges(original_ppi)
+        with self.metrics.phase('to_matrix'):
+            og_not_normalized = adjacency_matrix(len(nodes), rows, cols,
+                                                 weights)
 
         if remove_nodes:
             # remove nodes, then get the largest connected component once
             # the nodes are removed
-            original_graph.remove_nodes_from(remove_nodes)
-            original_graph = max(
-                    nx.connected_component_subgraphs(original_graph),
-                    key=len)
+            with self.metrics.phase('lcc'):
+                nodes, og_not_normalized = without_nodes(nodes,
+                                                         og_not_normalized,
+                                                         remove_nodes)
 
-        self.OG = original_graph
-        og_not_normalized = nx.to_numpy_matrix(original_graph)
-        self.og_matrix = self._normalize_cols(og_not_normalized)
+        self._set_nodes(nodes)
+        # weighted degree of each node, to scale columns back to adjacency
+        # weights in update_edges
+        self._degrees = np.asarray(og_not_normalized.sum(axis=0),
+                                   dtype=np.float64).ravel()
+        if not self.sparse:
+            og_not_normalized = og_not_normalized.toarray()
+        with self.metrics.phase('normalize'):
+            self.og_matrix = self._normalize_cols(og_not_normalized)
 
         if low_list:
-            tsg_not_normalized = self._tsg_matrix(original_graph,
-                                                  og_not_normalized, low_list)
-            self.tsg_matrix = self._normalize_cols(tsg_not_normalized)
+            with self.metrics.phase('tsg'):
+                tsg_not_normalized = self._tsg_matrix(og_not_normalized,
+                                                      low_list)
+            with self.metrics.phase('normalize'):
+                self.tsg_matrix = self._normalize_cols(tsg_not_normalized)
         else:
             self.tsg_matrix = None
 
 
-    def _tsg_matrix(self, original_graph, og_matrix, low_list):
-        tsg_matrix = np.copy(og_matrix)
-
+    def _tsg_matrix(self, og_matrix, low_list):
         # find nodes that aren't in the TSG
-        try:
-            list_fp = open(low_list, 'r')
-        except IOError:
-            sys.exit("Could not open file: {}".format(low_list))
-
-        index_list = []
-
-        for line in list_fp.readlines():
-            split_line = map(str.strip, line.split('\t'))
-            if split_line[1] == 'NA' and split_line[0] in original_graph.nodes():
-                index_list.append(original_graph.nodes().index(split_line[0]))
+        index_list = read_low_list(low_list, self.node_index)
 
         # then zero them out
+        if self.sparse:
+            # zero rows and columns by scaling with a diagonal 0/1 mask,
+            # which never densifies the matrix
+            mask = np.ones(og_matrix.shape[0])
+            mask[index_list] = 0
+            mask = sp.diags(mask)
+            tsg_matrix = mask.dot(og_matrix).dot(mask).tocsc()
+            tsg_matrix.eliminate_zeros()
+            return tsg_matrix
+
+        tsg_matrix = np.copy(og_matrix)
         for index in index_list:
             tsg_matrix[index] = np.zeros(tsg_matrix.shape[0])
             tsg_matrix[:, index] = np.zeros(tsg_matrix.shape[1])
 
-        list_fp.close()
-
         return tsg_matrix
 
 
-    def _build_og(self, original_ppi):
-        """ Build the original graph, without any nodes removed. """
-
-        try:
-            graph_fp = open(original_ppi, 'r')
-        except IOError:
-            sys.exit("Could not open file: {}".format(original_ppi))
-
-        G = nx.Graph()
-        edge_list = []
-
-        # parse network input
-        for line in graph_fp.readlines():
-            split_line = line.rstrip().split('\t')
-            if len(split_line) > 3:
-                # assume input graph is in the form of HIPPIE network
-                edge_list.append((split_line[1], split_line[3],
-                                  float(split_line[4])))
-            elif len(split_line) < 3:
-                # assume input graph is a simple edgelist without weights
-                edge_list.append((split_line[0], split_line[1], float(1)))
-            else:
-                # assume input graph is a simple edgelist with weights
-                edge_list.append((split_line[0], split_line[1],
-                                  float(split_line[2])))
-
-        G.add_weighted_edges_from(edge_list)
-        graph_fp.close()
-
-        return G
-
-
     def _normalize_cols(self, matrix):
-        """ Normalize the columns of the adjacency matrix """
-        return normalize(matrix, norm='l1', axis=0)
+        """ Normalize the columns of the adjacency matrix.
+
+        normalize_columns accepts sparse input, and returns a matrix in the
+        same (CSC) format, so this is shared by the dense and sparse paths.
+        """
+        normalized = normalize_columns(matrix)
+        if self.sparse:
+            return sp.csc_matrix(normalized, dtype=self.dtype)
+        return normalized.astype(self.dtype, copy=False)
 
@@ -0,0 +1,62 @@
+"""
+Command line client for walker_server.py
+
+Sends one query to a running server, and writes the result to stdout in the
+same format as run_walker.py.
+
+    python walker_client.py <seed file> [-g <graph name>] [-e 0.7] [-o 0.1]
+
+"""
+import sys
+import json
+import argparse
+import urllib2
+from run_walker import generate_seed_list, get_node_list
+from walker_server import DEFAULT_PORT
+
+def main(argv):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('seed', help='Seed file, to pull start nodes from')
+    parser.add_argument('-g', '--graph', default=None,
+                        help='<Optional> Name of the graph to query (needed if\
+                              the server holds more than one)')
+    parser.add_argument('-e', '--restart_prob', type=float, default=0.7,
+                        help='Restart probability for random walk')
+    parser.add_argument('-o', '--original_graph_prob', type=float, default=0.1,
+                        help='Probability of walking on the original (non-\
+                              tissue specific) graph, if applicable')
+    parser.add_argument('-n', '--node_list', nargs='?', default=None,
+                        help='<Optional> Order of output probs')
+    parser.add_argument('-k', '--top_k', type=int, default=None,
+                        help='<Optional> Only write the top k nodes of the\
+                              rank list (ignored with -n)')
+    parser.add_argument('-x', '--exclude_seeds', action='store_true',
+                        help='Leave the seed nodes out of the rank list')
+    parser.add_argument('--host', default='127.0.0.1',
+                        help='Address of the server')
+    parser.add_argument('-p', '--port', type=int, default=DEFAULT_PORT,
+                        help='Port of the server')
+    opts = parser.parse_args()
+
+    query = {
+        'seed': generate_seed_list(opts.seed),
+        'restart_prob': opts.restart_prob,
+        'original_graph_prob': opts.original_graph_prob,
+        'top_k': opts.top_k,
+        'exclude_seeds': opts.exclude_seeds,
+        'node_list': get_node_list(opts.node_list) if opts.node_list else [],
+    }
+    if opts.graph:
+        query['graph'] = opts.graph
+
+    url = 'http://{}:{}/walk'.format(opts.host, opts.port)
+    try:
+        response = urllib2.urlopen(url, json.dumps(query))
+    except urllib2.HTTPError as e:
+        sys.exit('Query failed: {}'.format(e.read().strip()))
+    except urllib2.URLError as e:
+        sys.exit('Could not connect to {}: {}'.format(url, e.reason))
+    sys.stdout.write(response.read())
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,250 @@
+"""
+Long-lived query server for tissue-specific graph walk experiments.
+
+The server builds one or more Walkers (each a graph, plus an optional low
+list) once, then answers RWR queries over HTTP on a local port. Repeated
+queries against the same interactome therefore skip startup and the matrix
+build. Queries are handled concurrently, one thread per request. Each Walker
+has its own lock, and final probability vectors are kept in a bounded LRU
+cache. A repeated seed set with the same parameters is answered without
+iterating, even with a different top_k or node list.
+
+    python walker_server.py -w <name> <input_graph> [<low_list>] [-w ...]
+
+A query is a POST to /walk, with a JSON body such as:
+
+    {"graph": "<name>", "seed": ["<node>", ...], "restart_prob": 0.7,
+     "original_graph_prob": 0.1, "top_k": 100, "exclude_seeds": false,
+     "node_list": []}
+
+Only seed is required (graph may be left out if a single graph is loaded).
+The response is the result in the format run_walker.py writes to stdout, or
+a 400 error for a malformed query (e.g. a top_k that is not a positive
+integer, or an unknown node). Each Walker keeps the fused operator for only
+one (restart_prob, original_graph_prob) pair, so queries with many different
+probabilities don't grow the server's memory.
+A GET of / lists the loaded graphs as JSON. See walker_client.py for a
+command line client.
+
+"""
+import sys
+import json
+import argparse
+import threading
+from collections import OrderedDict
+from StringIO import StringIO
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+from SocketServer import ThreadingMixIn
+from walker import Walker
+from graph_cache import GraphCache
+
+DEFAULT_PORT = 8642
+
+def _check_nodes(wk, nodes, name):
+    """ Raise ValueError unless nodes is a list of nodes of wk's graph. """
+    if not isinstance(nodes, list) or not all(
+            isinstance(node, (basestring, int, long)) and
+            not isinstance(node, bool) for node in nodes):
+        raise ValueError('{} must be a list of nodes'.format(name))
+    unknown = [str(node) for node in nodes if str(node) not in wk.node_index]
+    if unknown:
+        raise ValueError('Unknown nodes in {}: {}'.format(
+                         name, ', '.join(unknown)))
+
+def _number(query, key, default, low, high):
+    """ Return query[key] (or default) as a float, raising ValueError unless
+    it is a number between low and high.
+    """
+    value = query.get(key, default)
+    if (isinstance(value, bool) or
+            not isinstance(value, (int, long, float)) or
+            not low <= value <= high):
+        raise ValueError('{} must be a number between {} and {}'.format(
+                         key, low, high))
+    return float(value)
+
+class ResultCache:
+    """ Thread-safe, bounded LRU cache of final probability vectors. """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """ Return the cached vector for key (marking it most recently used),
+        or None.
+        """
+        with self._lock:
+            p_t = self._entries.pop(key, None)
+            if p_t is not None:
+                self._entries[key] = p_t
+            return p_t
+
+    def put(self, key, p_t):
+        """ Cache a vector, evicting the least recently used vectors if the
+        cache is full.
+        """
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = p_t
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class WalkerServer(ThreadingMixIn, HTTPServer):
+    """ HTTP server holding the loaded Walkers and the result cache.
+
+    Attributes:
+    -----------
+        walkers (dict)      : Walker for each graph name
+        locks (dict)        : Lock for each graph name, held while solving,
+                              since a Walker is not safe to share between
+                              threads
+        cache (ResultCache) : Final probability vectors of recent queries
+    """
+    daemon_threads = True
+
+    def __init__(self, address, walkers, cache):
+        HTTPServer.__init__(self, address, WalkerHandler)
+        self.walkers = walkers
+        self.locks = dict((name, threading.Lock()) for name in walkers)
+        self.cache = cache
+
+    def query(self, query):
+        """ Answer a query (a dict, as decoded from the request body), and
+        return the output text. Raises ValueError for a malformed query.
+        """
+        if not isinstance(query, dict):
+            raise ValueError('Query must be a JSON object')
+        if 'graph' in query:
+            name = query['graph']
+        elif len(self.walkers) == 1:
+            name = self.walkers.keys()[0]
+        else:
+            raise ValueError('Query must name a graph: {}'.format(
+                             ', '.join(sorted(self.walkers))))
+        if name not in self.walkers:
+            raise ValueError('Unknown graph: {}'.format(name))
+        if not query.get('seed'):
+            raise ValueError('Query has no seed nodes')
+
+        wk = self.walkers[name]
+        _check_nodes(wk, query['seed'], 'seed')
+        _check_nodes(wk, query.get('node_list', []), 'node_list')
+        seed_list = [str(node) for node in query['seed']]
+        restart_prob = _number(query, 'restart_prob', 0.7, 0, 1)
+        if restart_prob == 0:
+            raise ValueError('restart_prob must be greater than 0')
+        og_prob = _number(query, 'original_graph_prob', 0.1, 0, 1)
+        top_k = query.get('top_k')
+        if top_k is not None and (isinstance(top_k, bool) or
+                                  not isinstance(top_k, (int, long)) or
+                                  top_k < 1):
+            raise ValueError('top_k must be a positive integer')
+        if not isinstance(query.get('exclude_seeds', False), bool):
+            raise ValueError('exclude_seeds must be true or false')
+
+        # the starting vector doesn't depend on the order of the seed nodes
+        key = (name, tuple(sorted(seed_list)), restart_prob, og_prob)
+        p_t = self.cache.get(key)
+        if p_t is None:
+            with self.locks[name]:
+                p_t = wk.solve(seed_list, restart_prob, og_prob)
+            self.cache.put(key, p_t)
+
+        out_fp = StringIO()
+        exclude = seed_list if query.get('exclude_seeds') else []
+        wk.write_results(p_t, out_fp,
+                         [str(node) for node in query.get('node_list', [])],
+                         top_k, exclude)
+        return out_fp.getvalue()
+
+
+class WalkerHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path != '/':
+            self._respond(404, 'Not found\n')
+            return
+        graphs = dict((name, {'nodes': len(wk.nodes),
+                              'tissue': wk.tsg_matrix is not None})
+                      for name, wk in self.server.walkers.items())
+        self._respond(200, json.dumps(graphs) + '\n', 'application/json')
+
+    def do_POST(self):
+        if self.path != '/walk':
+            self._respond(404, 'Not found\n')
+            return
+        try:
+            length = int(self.headers.getheader('content-length', 0))
+            query = json.loads(self.rfile.read(length))
+            output = self.server.query(query)
+        except (ValueError, TypeError, AttributeError, KeyError) as e:
+            self._respond(400, '{}\n'.format(e))
+        except SystemExit as e:
+            # Walker reports bad input (e.g. an unknown seed node) by
+            # exiting, which must not take down the server
+            self._respond(400, '{}\n'.format(e))
+        else:
+            self._respond(200, output)
+
+    def _respond(self, code, body, content_type='text/plain'):
+        self.send_response(code)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-w', '--walker', nargs='+', action='append',
+                        required=True,
+                        metavar='ARG',
+                        help='Name, input graph and (optional) low list of a\
+                              graph to serve; may be given more than once')
+    parser.add_argument('--host', default='127.0.0.1',
+                        help='Address to listen on')
+    parser.add_argument('-p', '--port', type=int, default=DEFAULT_PORT,
+                        help='Port to listen on')
+    parser.add_argument('--cache_entries', type=int, default=256,
+                        help='Number of probability vectors to keep in the\
+                              result cache')
+    parser.add_argument('-c', '--cache_dir', default=None,
+                        help='<Optional> Directory to cache compiled graphs\
+                              in, so restarting the server skips building\
+                              the graphs')
+    parser.add_argument('-s', '--sparse', action='store_true',
+                        help='Store the graph matrices in sparse format, for\
+                              large (e.g. whole-proteome) networks')
+    opts = parser.parse_args()
+
+    graph_cache = GraphCache(opts.cache_dir) if opts.cache_dir else None
+    walkers = {}
+    for spec in opts.walker:
+        if len(spec) not in (2, 3):
+            sys.exit('-w takes a name, an input graph and an optional low '
+                     'list. Exiting.')
+        name, input_graph = spec[:2]
+        low_list = spec[2] if len(spec) > 2 else None
+        sys.stderr.write('Loading graph {}\n'.format(name))
+        # queries usually share one parameter pair, and an operator per
+        # pair would grow without bound in a long-running server
+        walkers[name] = Walker(input_graph, low_list, sparse=opts.sparse,
+                               cache=graph_cache, max_operators=1)
+
+    server = WalkerServer((opts.host, opts.port), walkers,
+                          ResultCache(opts.cache_entries))
+    sys.stderr.write('Serving {} on {}:{}\n'.format(
+                     ', '.join(sorted(walkers)), opts.host, opts.port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
+
+if __name__ == '__main__':
+    main(sys.argv)